@@ -8,31 +8,37 @@
 4. 実行ログおよびエラーログは、Logモジュールを通じて記録される。
 
 依存モジュール：
-- Log, SQL, Check, Convert_Date, Row_Number_Func (カスタムモジュール)
+- Log, SQL, Check, Convert_Date (カスタムモジュール)
+- 読み込み位置・最終日時などの実行状態は State_Store (../DataFile/State_Store.sqlite) に保存
 """
 
 import os
 import sys
 import glob
-import shutil
 import logging
 import pandas as pd
 from configparser import ConfigParser, NoSectionError, NoOptionError
-from datetime import datetime, timedelta, date
+from datetime import datetime, date
 
 # カスタムモジュールの読み込み（パスを追加）
 sys.path.append('../MyModule')
 import Log
-import SQL
 import Check
 import Convert_Date
-import Row_Number_Func
+import Incremental_Reader
+import Source_Manifest
+import State_Store
+import Prime_Lookup
+import Xml_Writer
+import Output_Stage
+import Copy_Stage
+import Table_Output
 
 # グローバル変数：ログファイルのパスを記録
 global_log_file = None
 
 ####################################
-# 共通ログおよび実行記録関連関数
+# 共通ログ関連関数
 ####################################
 def setup_logging(log_file_path: str) -> None:
     """ログのフォーマットとファイル設定を行う"""
@@ -43,51 +49,18 @@ def setup_logging(log_file_path: str) -> None:
         print(f"ファイル {log_file_path} のログ設定時にエラーが発生しました: {e}")
         raise
 
-def update_or_create_running_rec(running_rec_path: str, end_date: datetime) -> None:
-    """
-    実行記録ファイルが存在しない場合は作成し、最新の終了日時を記録する
-    （更新と作成の処理を統合）
-    """
-    try:
-        with open(running_rec_path, 'w', encoding='utf-8') as f:
-            f.write(end_date.strftime('%Y-%m-%d %H:%M:%S'))
-        Log.Log_Info(global_log_file, f"実行記録ファイル {running_rec_path} を終了日時 {end_date} で更新しました")
-    except Exception as e:
-        Log.Log_Error(global_log_file, f"実行記録ファイル {running_rec_path} の更新時にエラーが発生しました: {e}")
-
-def read_running_rec(running_rec_path: str) -> datetime:
-    """
-    最後の実行記録を読み取る。ファイルが存在しないまたは不正な場合は
-    30日前の日付を返す。
-    """
-    if not os.path.exists(running_rec_path):
-        with open(running_rec_path, 'w', encoding='utf-8') as f:
-            f.write('')
-        return datetime.today() - timedelta(days=30)
-    
-    try:
-        with open(running_rec_path, 'r', encoding='utf-8') as f:
-            content = f.read().strip()
-            if content:
-                last_run_date = pd.to_datetime(content, errors='coerce')
-                if pd.isnull(last_run_date):
-                    return datetime.today() - timedelta(days=30)
-                return last_run_date
-            else:
-                return datetime.today() - timedelta(days=30)
-    except Exception as e:
-        Log.Log_Error(global_log_file, f"実行記録ファイル {running_rec_path} の読み取り中にエラーが発生しました: {e}")
-        return datetime.today() - timedelta(days=30)
-
 ####################################
 # Excelファイル処理関数（独立関数）
 ####################################
 def process_excel_file(file_path: str, sheet_name: str, data_columns: str,
-                       running_rec: str, output_path: str, fields: dict,
-                       site: str, prod_family: str, oper: str, test_station: str) -> None:
+                       store: State_Store.StateStore, output_path: str, fields: dict,
+                       site: str, prod_family: str, oper: str, test_station: str,
+                       prime: Prime_Lookup.RunConnection, xml_pool: Xml_Writer.WriterPool,
+                       copier: Copy_Stage.CopyStage, table: Table_Output.TableOutput = None) -> None:
     """
     Excelファイルを処理し、データの読み取り、変換、SQLクエリ実行、XML生成を行う。
     必要なパラメータはすべて引数として渡す。
+    読み込み位置・最終日時・内容ハッシュは store に記録し、出力の発行後に main() が確定する。
     """
     Log.Log_Info(global_log_file, f"Excelファイルの処理開始: {file_path}")
     
@@ -101,53 +74,64 @@ def process_excel_file(file_path: str, sheet_name: str, data_columns: str,
         return
     latest_file = sorted(excel_files, key=lambda x: x[1], reverse=True)[0][0]
     
-    dest_dir = '../DataFile/043_LD-SPUT/'
-    os.makedirs(dest_dir, exist_ok=True)
-    dest_path = os.path.join(dest_dir, os.path.basename(latest_file))
-    # コピー先と元が同じ場合はコピーせず、そのまま利用
-    if os.path.abspath(latest_file) == os.path.abspath(dest_path):
-        excel_file = latest_file
-    else:
-        excel_file = shutil.copy(latest_file, dest_dir)
+    # コピー先と元が同じ場合や、同じサイズ・更新日時のファイルが既にある場合はコピーせず、そのまま利用
+    excel_file = copier.copy(latest_file, '../DataFile/043_LD-SPUT/')
+
+    # 前回処理したときと内容が同じファイルは読み込まない
+    source = os.path.basename(latest_file)
+    digest = Source_Manifest.file_hash(excel_file)
+    if store.is_processed(oper, source, sheet_name, digest):
+        Log.Log_Info(global_log_file, f"前回処理時から内容の変更がないためスキップ: {source}")
+        return
 
-    # Excelファイルからデータを読み込む
+    # Excelファイルから前回読み込んだ行以降のデータだけを読み込む（初回は101行目から）
+    reader = Incremental_Reader.IncrementalReader('./Incremental_State.json', scope=oper, store=store)
     try:
-        df = pd.read_excel(excel_file, header=None, sheet_name=sheet_name,
-                           usecols=data_columns, skiprows=100)
-        df['key_SORTNUMBER'] = df.index + 100
+        df = reader.read_new_rows(excel_file, sheet_name, usecols=data_columns, first_row=101)
+        df['key_SORTNUMBER'] = df.index  # 0始まりのシート行番号
     except Exception as e:
         Log.Log_Error(global_log_file, f"Excelファイル {file_path} の読み込み中にエラー: {e}")
         return
+    Log.Log_Info(global_log_file, f"{'全行読み込み' if reader.full_scan else '追加行のみ読み込み'}: {len(df)} 行 (最終行 {reader.last_row})")
 
     df.columns = range(df.shape[1])
     df = df.dropna(subset=[0])  # 0列目がNaNの行を削除
+    if df.empty:
+        Log.Log_Info(global_log_file, "新しい行がありません")
+        reader.commit()
+        store.update(oper, source, sheet_name, content_hash=digest)
+        return
 
     os.makedirs(output_path, exist_ok=True)
-    one_month_ago = read_running_rec(running_rec)
+    # 前回出力した最終日時より新しい行だけを対象にする（記録がなければ30日前から）
+    since = store.last_time(oper, source, sheet_name, default_days=30)
 
     # 「key_Start_Date_Time」に基づいてデータをフィルタリングする
+    # （前回読み込み済みのブロックが編集されて再度返された行は、訂正として日時に関係なく出力する）
     if 'key_Start_Date_Time' in fields:
         start_col = int(fields['key_Start_Date_Time'][0])
-        df = df[df[start_col].apply(pd.to_datetime, errors='coerce') >= one_month_ago]
+        edited = df.index < reader.watermark
+        start_dates = df[start_col].apply(pd.to_datetime, errors='coerce')
+        df = df[(edited & start_dates.notna()) | (start_dates >= since)]
         df[start_col] = df[start_col].apply(lambda x: pd.to_datetime(x).strftime('%Y-%m-%dT%H.%M.%S'))
     else:
         Log.Log_Error(global_log_file, "設定ファイルに key_Start_Date_Time フィールドが見つかりません")
 
     # SQLクエリを使用してデータを更新する
     serial_numbers = df[3]
-    conn, cursor = SQL.connSQL()
+    conn, cursor = prime.get()
     if conn is None:
         Log.Log_Error(global_log_file, f"{serial_numbers} : Primeデータベース接続失敗")
         return
     try:
-        for serial in serial_numbers:
-            part_num, nine_serial = SQL.selectSQL(cursor, serial)
-            df.loc[df[3] == serial, 'Part_Number'] = part_num
-            df.loc[df[3] == serial, 'Nine_Serial_Number'] = nine_serial
+        lookup = Prime_Lookup.bulk_select(cursor, serial_numbers)
+        unmatched = Prime_Lookup.enrich(df, 3, lookup, require_both=False)
+        if unmatched:
+            report = os.path.join(os.path.dirname(global_log_file), Prime_Lookup.UNMATCHED_REPORT)
+            Prime_Lookup.report_unmatched(report, unmatched, oper, file_path)
+            Log.Log_Error(global_log_file, f"Primeに存在しないシリアル番号 {len(unmatched)} 件: {report}")
     except Exception as e:
         Log.Log_Error(global_log_file, f"{serial_numbers} : SQLクエリ失敗: {e}")
-    finally:
-        SQL.disconnSQL(conn, cursor)
     
     df = df.dropna(subset=['Part_Number']).reset_index(drop=True)
     total_rows = len(df)
@@ -155,11 +139,6 @@ def process_excel_file(file_path: str, sheet_name: str, data_columns: str,
 
     while row < total_rows:
         data_dict = {}
-        # 最終行の場合、実行記録ファイルを更新
-        if row == total_rows - 1:
-            latest_date = df[start_col].max()
-            update_or_create_running_rec(running_rec, latest_date)
-        
         # 各フィールド毎にデータ変換を実施
         for key, (col, dtype) in fields.items():
             try:
@@ -203,20 +182,34 @@ def process_excel_file(file_path: str, sheet_name: str, data_columns: str,
 
         if None in data_dict.values():
             Log.Log_Error(global_log_file, f"data_dictにNoneが含まれているため、行 {row} をスキップ")
+        elif table is not None:
+            table.add(table_row(data_dict, site, oper, test_station))
         else:
-            generate_xml(data_dict, output_path, site, prod_family, oper, test_station)
+            generate_xml(data_dict, output_path, site, prod_family, oper, test_station, xml_pool)
         
         row += 1
-        Log.Log_Info(global_log_file, "次の開始行番号を更新")
-        Row_Number_Func.next_start_row_number("LDSOUT_ROW.txt", row)
+
+    # output_mode = csv: このファイルの全行を1つのCSV + ポインタXMLとして出力
+    if table is not None:
+        table.write()
+    # XML書き込み完了を待ってから読み込み位置を保存（失敗時は次回同じ行を再処理）
+    failures = xml_pool.flush()
+    for xml_file, e in failures:
+        Log.Log_Error(global_log_file, f"XMLファイルの書き込みに失敗しました: {xml_file}: {e}")
+    if not failures:
+        reader.commit()
+        # 訂正行だけのときに最終日時が前回より古くならないようにする
+        last_time = State_Store.as_time(df[start_col].max()) if total_rows else None
+        store.update(oper, source, sheet_name, content_hash=digest,
+                     last_time=max(last_time, since) if last_time else None)
 
 ####################################
 # XML生成関数（独立関数）
 ####################################
 def generate_xml(data_dict: dict, output_dir: str, site: str, prod_family: str,
-                 oper: str, test_station: str) -> None:
+                 oper: str, test_station: str, xml_pool: Xml_Writer.WriterPool) -> None:
     """
-    XMLテンプレートを用いてXMLファイルを生成する。
+    XMLを生成し、書き込みをxml_poolのバックグラウンドスレッドに渡す。
     必要なパラメータはすべて引数として渡す。
     """
     xml_filename = (
@@ -226,43 +219,57 @@ def generate_xml(data_dict: dict, output_dir: str, site: str, prod_family: str,
         f"Testdate={data_dict.get('key_Start_Date_Time','Unknown')}.xml"
     )
     xml_filepath = os.path.join(output_dir, xml_filename)
-    xml_template = f'''<?xml version="1.0" encoding="utf-8"?>
-<Results xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xmlns:xsd="http://www.w3.org/2001/XMLSchema">
-   <Result startDateTime="{data_dict["key_Start_Date_Time"].replace(".", ":")}" Result="Passed">
-       <Header SerialNumber="{data_dict["key_Serial_Number"]}" PartNumber="{data_dict["key_Part_Number"]}" Operation="{oper}" TestStation="{test_station}" Operator="{data_dict["key_Operator"]}" StartTime="{data_dict["key_Start_Date_Time"].replace(".", ":")}" Site="{site}" LotNumber="{data_dict["key_Serial_Number"]}"/>
-       <HeaderMisc>
-           <Item Description="Facet Coating"></Item>
-       </HeaderMisc>
-       <TestStep Name="THK_DEP" startDateTime="{data_dict["key_Start_Date_Time"].replace(".", ":")}" Status="Passed">
-           <Data DataType="String" Name="Banchi_ID1" Units="" Value="{data_dict["key_Banchi1"]}"/>
-           <Data DataType="String" Name="Banchi_ID2" Units="" Value="{data_dict["key_Banchi2"]}"/>
-           <Data DataType="String" Name="Banchi_ID3" Units="" Value="{data_dict["key_Banchi3"]}"/>
-           <Data DataType="String" Name="Banchi_ID4" Units="" Value="{data_dict["key_Banchi4"]}"/>
-           <Data DataType="String" Name="Banchi_ID5" Units="" Value="{data_dict["key_Banchi5"]}"/>
-           <Data DataType="Numeric" Name="TR_THK" Units="um" Value="{data_dict["key_THK1"]}"/>
-           <Data DataType="Numeric" Name="TL_THK" Units="um" Value="{data_dict["key_THK2"]}"/>
-           <Data DataType="Numeric" Name="BL_THK" Units="um" Value="{data_dict["key_THK3"]}"/>
-           <Data DataType="Numeric" Name="CE_THK" Units="um" Value="{data_dict["key_THK4"]}"/>
-           <Data DataType="Numeric" Name="BR_THK" Units="um" Value="{data_dict["key_THK5"]}"/>
-           <Data DataType="Numeric" Name="Banchi_THK_AVG" Units="" Value="{data_dict["key_THK_AVG"]}"/>
-       </TestStep>
-       <TestStep Name="SORTED_DATA" startDateTime="{data_dict["key_Start_Date_Time"].replace(".", ":")}" Status="Passed">
-           <Data DataType="Numeric" Name="STARTTIME_SORTED" Units="" Value="{data_dict["key_STARTTIME_SORTED"]}"/>
-           <Data DataType="Numeric" Name="SORTNUMBER" Units="" Value="{data_dict["key_SORTNUMBER"]}"/>
-           <Data DataType="String" Name="LotNumber_5" Value="{data_dict["key_Serial_Number"]}" CompOperation="LOG"/>
-           <Data DataType="String" Name="LotNumber_9" Value="{data_dict["key_LotNumber_9"]}" CompOperation="LOG"/>
-       </TestStep>
-   </Result>
-</Results>
-'''
-    with open(xml_filepath, 'w', encoding='utf-8') as xf:
-        xf.write(xml_template)
-    Log.Log_Info(global_log_file, f"XMLファイルが生成されました: {xml_filepath}")
+    start_time = data_dict["key_Start_Date_Time"].replace(".", ":")
+    w = Xml_Writer.ResultsWriter(indent="   ")
+    w.result({"startDateTime": start_time, "Result": "Passed"})
+    w.header({"SerialNumber": data_dict["key_Serial_Number"], "PartNumber": data_dict["key_Part_Number"],
+              "Operation": oper, "TestStation": test_station, "Operator": data_dict["key_Operator"],
+              "StartTime": start_time, "Site": site, "LotNumber": data_dict["key_Serial_Number"]})
+    w.header_misc([{"Description": "Facet Coating"}])
+    thk_data = [{"DataType": "String", "Name": f"Banchi_ID{i}", "Units": "", "Value": data_dict[f"key_Banchi{i}"]}
+                for i in range(1, 6)]
+    thk_data += [{"DataType": "Numeric", "Name": name, "Units": "um", "Value": data_dict[f"key_THK{i}"]}
+                 for i, name in enumerate(["TR_THK", "TL_THK", "BL_THK", "CE_THK", "BR_THK"], start=1)]
+    thk_data.append({"DataType": "Numeric", "Name": "Banchi_THK_AVG", "Units": "", "Value": data_dict["key_THK_AVG"]})
+    w.test_step({"Name": "THK_DEP", "startDateTime": start_time, "Status": "Passed"}, thk_data)
+    w.test_step({"Name": "SORTED_DATA", "startDateTime": start_time, "Status": "Passed"}, [
+        {"DataType": "Numeric", "Name": "STARTTIME_SORTED", "Units": "", "Value": data_dict["key_STARTTIME_SORTED"]},
+        {"DataType": "Numeric", "Name": "SORTNUMBER", "Units": "", "Value": data_dict["key_SORTNUMBER"]},
+        {"DataType": "String", "Name": "LotNumber_5", "Value": data_dict["key_Serial_Number"], "CompOperation": "LOG"},
+        {"DataType": "String", "Name": "LotNumber_9", "Value": data_dict["key_LotNumber_9"], "CompOperation": "LOG"},
+    ])
+    xml_pool.submit(xml_filepath, w.getvalue())
+    Log.Log_Info(global_log_file, f"XMLファイルを書き込み待ちに追加しました: {xml_filepath}")
+
+def table_row(data_dict: dict, site: str, oper: str, test_station: str) -> dict:
+    """output_mode = csv のときの1行分（generate_xml の Header / Data と同じ項目）。"""
+    row = {
+        "Serial_Number": data_dict["key_Serial_Number"],
+        "Part_Number": data_dict["key_Part_Number"],
+        "Start_Date_Time": data_dict["key_Start_Date_Time"].replace(".", ":"),
+        "Operation": oper,
+        "TestStation": test_station,
+        "Site": site,
+        "Operator": data_dict["key_Operator"],
+    }
+    for i in range(1, 6):
+        row[f"Banchi_ID{i}"] = data_dict[f"key_Banchi{i}"]
+    for i, name in enumerate(["TR_THK", "TL_THK", "BL_THK", "CE_THK", "BR_THK"], start=1):
+        row[name] = data_dict[f"key_THK{i}"]
+    row.update({
+        "Banchi_THK_AVG": data_dict["key_THK_AVG"],
+        "LotNumber_5": data_dict["key_Serial_Number"],
+        "LotNumber_9": data_dict["key_LotNumber_9"],
+        "STARTTIME_SORTED": data_dict["key_STARTTIME_SORTED"],
+        "SORTNUMBER": data_dict["key_SORTNUMBER"],
+    })
+    return row
 
 ####################################
 # .iniファイル処理関数
 ####################################
-def process_ini_file(config_path: str) -> None:
+def process_ini_file(config_path: str, prime: Prime_Lookup.RunConnection,
+                     xml_pool: Xml_Writer.WriterPool, store: State_Store.StateStore) -> None:
     """
     指定された.iniファイルを処理し、設定の読み取りおよびExcel・XML処理を実行する。
     各設定パラメータはファイル内で定義され、各処理関数に渡される。
@@ -292,6 +299,7 @@ def process_ini_file(config_path: str) -> None:
         oper           = config.get('Basic_info', 'Operation')
         test_station   = config.get('Basic_info', 'TestStation')
         file_pattern   = config.get('Basic_info', 'file_name_pattern')
+        Prime_Lookup.configure(config)
     except (NoSectionError, NoOptionError) as e:
         Log.Log_Error(global_log_file, f"設定ファイル {config_path} に必要な設定が不足しています: {e}")
         return
@@ -303,6 +311,12 @@ def process_ini_file(config_path: str) -> None:
     global_log_file = log_file
     setup_logging(global_log_file)
     Log.Log_Info(log_file, f"設定ファイル {config_path} の処理を開始します")
+    # 旧実行記録ファイル (running_rec) は初回だけ状態ストアに取り込む
+    store.import_running_rec(oper, running_rec)
+    # output_mode = csv なら行ごとのXMLではなくファイルごとに1つのCSV + ポインタXML
+    table = Table_Output.from_config(config, site, prod_family, oper, test_station, stage=xml_pool.stage)
+    # ソースファイルのコピー設定 ([Paths] copy_workers / copy_retries / copy_verify_hash)
+    copier = Copy_Stage.from_config(config)
 
     # フィールド設定を解析して辞書に格納
     fields = {}
@@ -321,24 +335,91 @@ def process_ini_file(config_path: str) -> None:
         files = [f for f in files if not os.path.basename(f).startswith('~$')]
         if not files:
             Log.Log_Error(global_log_file, f"{ipath} 内に {file_pattern} に一致するExcelファイルが見つかりません")
-        for file in files:
-            dest_dir = '../DataFile/001_GRATING/'
-            os.makedirs(dest_dir, exist_ok=True)
-            shutil.copy(file, dest_dir)
+        # 並列にコピー（同じサイズ・更新日時のファイルが既にあればコピーしない、失敗時はリトライ）
+        dest_dir = '../DataFile/001_GRATING/'
+        for file, copied_path, error in copier.copy_many(files, dest_dir):
+            if error is not None:
+                Log.Log_Error(global_log_file, f"Excelファイル {file} を {dest_dir} にコピーできませんでした: {error}")
+                continue
             Log.Log_Info(global_log_file, f"Excelファイル {file} を {dest_dir} にコピーしました")
-            copied_path = os.path.join(dest_dir, os.path.basename(file))
-            process_excel_file(copied_path, sheet_name, data_columns, running_rec,
-                               output_path, fields, site, prod_family, oper, test_station)
+            process_excel_file(copied_path, sheet_name, data_columns, store,
+                               output_path, fields, site, prod_family, oper, test_station, prime, xml_pool,
+                               copier, table)
+    Log.Log_Info(global_log_file, copier.summary())
+
+def prefetch_serials() -> list:
+    """
+    次回 main() が Prime に問い合わせるシリアル番号を返す（オーケストレーターの
+    プリフェッチ用、bat/Prefetch.py 参照）。各入力パスの最新ファイルだけを
+    ../DataFile/043_LD-SPUT/ のコピーから読み、前回と内容が同じものは読まない。
+    実行状態は参照するだけで、状態ストアへの取り込み・確定や追加行ウォーターマーク
+    の更新は行わない。書き込みは変更されたファイルのコピーだけで、main() は同じ
+    コピーをそのまま利用する。
+    """
+    serials = []
+    copier = Copy_Stage.CopyStage()
+    store = State_Store.StateStore()  # 読み込み位置を参照するだけ（確定はしない）
+    for ini_file in glob.glob("*.ini"):
+        config = ConfigParser()
+        try:
+            with open(ini_file, 'r', encoding='utf-8') as cf:
+                config.read_file(line for line in cf if not line.strip().startswith('#'))
+            input_paths  = [p.strip() for p in config.get('Paths', 'input_paths').split(',')]
+            sheet_name   = config.get('Excel', 'sheet_name')
+            data_columns = config.get('Excel', 'data_columns')
+            oper         = config.get('Basic_info', 'Operation')
+            file_pattern = config.get('Basic_info', 'file_name_pattern')
+        except Exception as e:
+            logging.warning(f"プリフェッチ: 設定ファイル {ini_file} を読み取れません: {e}")
+            continue
+        # 状態ファイルなし：ウォーターマークは状態ストアから読むだけで、JSONは取り込まない
+        reader = Incremental_Reader.IncrementalReader(None, scope=oper, store=store)
+        for ipath in input_paths:
+            files = [f for f in glob.glob(os.path.join(ipath, file_pattern))
+                     if not os.path.basename(f).startswith('~$') and '$' not in f]
+            if not files:
+                continue
+            latest_file = max(files, key=os.path.getmtime)
+            try:
+                excel_file = copier.copy(latest_file, '../DataFile/043_LD-SPUT/')
+                digest = Source_Manifest.file_hash(excel_file)
+                if store.is_processed(oper, os.path.basename(latest_file), sheet_name, digest):
+                    continue
+                df = reader.read_new_rows(excel_file, sheet_name, usecols=data_columns, first_row=101)
+            except Exception as e:
+                logging.warning(f"プリフェッチ: {latest_file} の読み込みに失敗: {e}")
+                continue
+            df.columns = range(df.shape[1])
+            if df.shape[1] > 3:
+                serials.extend(df.dropna(subset=[0])[3].dropna().tolist())
+    store.close()
+    return serials
 
 ####################################
 # メイン処理
 ####################################
 def main() -> None:
     """すべての.iniファイルをスキャンし、順次処理を実行する"""
-    for ini_file in glob.glob("*.ini"):
-        process_ini_file(ini_file)
+    # Prime接続は実行全体で1本だけ開き、全ファイル・全iniで再利用する
+    # XMLはバックグラウンドのスレッドでローカルの一時フォルダに書き込み（次の行の変換と並行）、
+    # 実行の最後に共有フォルダへまとめて発行する（一時名で転送してからリネーム）
+    with State_Store.StateStore() as store:
+        with Output_Stage.OutputStage('../DataFile/043_LD-SPUT/_staging/') as stage, \
+                Prime_Lookup.RunConnection() as prime, \
+                Xml_Writer.WriterPool(stage=stage) as xml_pool:
+            for ini_file in glob.glob("*.ini"):
+                process_ini_file(ini_file, prime, xml_pool, store)
+        # 読み込み位置などは出力の発行後に確定する。発行できなかったファイルは一時フォルダに残り次回発行されるが、
+        # 一時フォルダから失われたファイルがあれば確定しない（次回同じ行を再処理）
+        if stage.lost:
+            Log.Log_Error(global_log_file, f"一時フォルダから {stage.lost} 件の出力ファイルが失われたため実行状態を確定しません")
+        else:
+            store.commit()
+    for summary in (prime.summary(), xml_pool.summary(), stage.summary(), store.summary()):
+        print(summary)
+        if global_log_file:
+            Log.Log_Info(global_log_file, summary)
 
 if __name__ == '__main__':
     main()
-
-Log.Log_Info(global_log_file, "プログラム終了")
+    Log.Log_Info(global_log_file, "プログラム終了")
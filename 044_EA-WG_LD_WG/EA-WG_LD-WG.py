@@ -7,7 +7,8 @@
 3. 実行記録およびエラーログは、カスタムモジュール Log によって処理される。
 
 依存モジュール：
-- Log, SQL, Check, Convert_Date, Row_Number_Func (全て ../MyModule 内)
+- Log, SQL, Check, Convert_Date (全て ../MyModule 内)
+- 最終出力日時・内容ハッシュは State_Store (../DataFile/State_Store.sqlite) に保存
 """
 
 import os
@@ -17,15 +18,19 @@ import shutil
 import logging
 import pandas as pd
 from configparser import ConfigParser, NoSectionError, NoOptionError
-from datetime import datetime, timedelta, date
+from datetime import datetime, date
 
 # カスタムモジュールのパスを追加し、インポート
 sys.path.append('../MyModule')
 import Log
-import SQL
 import Check
 import Convert_Date
-import Row_Number_Func
+import Source_Manifest
+import State_Store
+import Prime_Lookup
+import Xml_Writer
+import Output_Stage
+import Table_Output
 
 # グローバル変数
 global_log_file = None
@@ -39,48 +44,8 @@ def setup_logging(log_file_path: str) -> None:
         print(f"Error setting up log file {log_file_path}: {e}")
         raise
 
-def update_running_rec(running_rec_path: str, end_date: datetime) -> None:
-    """実行記録ファイルを更新する"""
-    try:
-        with open(running_rec_path, 'w', encoding='utf-8') as f:
-            f.write(end_date.strftime('%Y-%m-%d %H:%M:%S'))
-        Log.Log_Info(global_log_file, f"Running record file {running_rec_path} updated with end date {end_date}")
-    except Exception as e:
-        Log.Log_Error(global_log_file, f"Error updating running record file {running_rec_path}: {e}")
-
-def ensure_running_rec_exists_and_update(running_rec_path: str, end_date: datetime) -> None:
-    """実行記録ファイルが存在しない場合は作成し、更新する"""
-    try:
-        with open(running_rec_path, 'w', encoding='utf-8') as f:
-            f.write(end_date.strftime('%Y-%m-%d %H:%M:%S'))
-        Log.Log_Info(global_log_file, f"Running record file {running_rec_path} confirmed and updated with end date {end_date}")
-    except Exception as e:
-        Log.Log_Error(global_log_file, f"Error processing running record file {running_rec_path}: {e}")
-
-def read_running_rec(running_rec_path: str) -> datetime:
-    """
-    最後の実行記録を読み取る。
-    ファイルが存在しないまたは内容が無効な場合は30日前の日付を返す。
-    """
-    if not os.path.exists(running_rec_path):
-        with open(running_rec_path, 'w', encoding='utf-8') as f:
-            f.write('')
-        return datetime.today() - timedelta(days=30)
-    try:
-        with open(running_rec_path, 'r', encoding='utf-8') as f:
-            content = f.read().strip()
-            if content:
-                last_run_date = pd.to_datetime(content, errors='coerce')
-                if pd.isnull(last_run_date):
-                    return datetime.today() - timedelta(days=30)
-                return last_run_date
-            else:
-                return datetime.today() - timedelta(days=30)
-    except Exception as e:
-        Log.Log_Error(global_log_file, f"Error reading running record file {running_rec_path}: {e}")
-        return datetime.today() - timedelta(days=30)
-
-def generate_xml(data_dict: dict, output_dir: str, site: str, product_family: str, Test_Station: str) -> None:
+def generate_xml(data_dict: dict, output_dir: str, site: str, product_family: str, Test_Station: str,
+                 xml_pool: Xml_Writer.WriterPool) -> None:
     """
     XML テンプレートを用いて XML ファイルを生成する。
     ※ 画面に出力されるテキストは英語で表示される。
@@ -92,41 +57,57 @@ def generate_xml(data_dict: dict, output_dir: str, site: str, product_family: st
         f"Testdate={data_dict.get('key_Start_Date_Time', 'Unknown')}.xml"
     )
     xml_filepath = os.path.join(output_dir, xml_filename)
-    with open(xml_filepath, 'w', encoding='utf-8') as f:
-        f.write('<?xml version="1.0" encoding="utf-8"?>\n')
-        f.write('<Results xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
-                'xmlns:xsd="http://www.w3.org/2001/XMLSchema">\n')
-        f.write(f'       <Result startDateTime="{data_dict["key_Start_Date_Time"].replace(".", ":")}" Result="{data_dict["key_Judge"]}">\n')
-        f.write(f'               <Header SerialNumber="{data_dict["key_Serial_Number"]}" '
-                f'PartNumber="{data_dict["key_Part_Number"]}" Operation="{data_dict["Operation"]}" '
-                f'TestStation="{Test_Station}" Operator="{data_dict.get("key_Operator", "")}" '
-                f'StartTime="{data_dict["key_Start_Date_Time"].replace(".", ":")}" '
-                f'Site="{site}" LotNumber="{data_dict["key_Serial_Number"]}"/>\n')
-        f.write('               <HeaderMisc>\n')
-        f.write('                   <Item Description="Facet Coating"></Item>\n')
-        f.write('               </HeaderMisc>\n')
-        f.write(f'            <TestStep Name="{data_dict["Operation"]}" startDateTime="{data_dict["key_Start_Date_Time"].replace(".", ":")}" Status="{data_dict["key_Judge"]}">\n')
-        f.write(f'              <Data DataType="Numeric" Name="Aa" Units="um" Value="{data_dict["key_Aa"]}"/>\n')
-        f.write(f'              <Data DataType="Numeric" Name="Ah" Units="um" Value="{data_dict["key_Ah"]}"/>\n')
-        f.write(f'              <Data DataType="Numeric" Name="Dh" Units="um" Value="{data_dict["key_Dh"]}"/>\n')
-        f.write(f'              <Data DataType="Numeric" Name="V_Max" Units="um" Value="{data_dict["key_V_Max"]}"/>\n')
-        f.write('               </TestStep>\n')
-        f.write(f'               <TestStep Name="SORTED_DATA" startDateTime="{data_dict["key_Start_Date_Time"].replace(".", ":")}" Status="{data_dict["key_Judge"]}">\n')
-        f.write(f'                   <Data DataType="Numeric" Name="STARTTIME_SORTED" Units="" Value="{data_dict["key_STARTTIME_SORTED"]}"/>\n')
-        f.write(f'                   <Data DataType="Numeric" Name="SORTNUMBER" Units="" Value="{data_dict["key_SORTNUMBER"]}"/>\n')
-        f.write(f'                   <Data DataType="String" Name="LotNumber_5" Value="{data_dict["key_Serial_Number"]}" CompOperation="LOG"/>\n')
-        f.write(f'                   <Data DataType="String" Name="LotNumber_9" Value="{data_dict["key_LotNumber_9"]}" CompOperation="LOG"/>\n')
-        f.write('               </TestStep>\n')
-        f.write('    </Result>\n')
-        f.write('</Results>\n')
-    Log.Log_Info(global_log_file, f"XML File Created: {xml_filepath}")
+    start_time = data_dict["key_Start_Date_Time"].replace(".", ":")
+    judge = data_dict["key_Judge"]
+    w = Xml_Writer.ResultsWriter(indent="    ")
+    w.result({"startDateTime": start_time, "Result": judge})
+    w.header({"SerialNumber": data_dict["key_Serial_Number"], "PartNumber": data_dict["key_Part_Number"],
+              "Operation": data_dict["Operation"], "TestStation": Test_Station,
+              "Operator": data_dict.get("key_Operator", ""), "StartTime": start_time, "Site": site,
+              "LotNumber": data_dict["key_Serial_Number"]})
+    w.header_misc([{"Description": "Facet Coating"}])
+    w.test_step({"Name": data_dict["Operation"], "startDateTime": start_time, "Status": judge},
+                [{"DataType": "Numeric", "Name": name, "Units": "um", "Value": data_dict[f"key_{name}"]}
+                 for name in ("Aa", "Ah", "Dh", "V_Max")])
+    w.test_step({"Name": "SORTED_DATA", "startDateTime": start_time, "Status": judge}, [
+        {"DataType": "Numeric", "Name": "STARTTIME_SORTED", "Units": "", "Value": data_dict["key_STARTTIME_SORTED"]},
+        {"DataType": "Numeric", "Name": "SORTNUMBER", "Units": "", "Value": data_dict["key_SORTNUMBER"]},
+        {"DataType": "String", "Name": "LotNumber_5", "Value": data_dict["key_Serial_Number"], "CompOperation": "LOG"},
+        {"DataType": "String", "Name": "LotNumber_9", "Value": data_dict["key_LotNumber_9"], "CompOperation": "LOG"},
+    ])
+    xml_pool.submit(xml_filepath, w.getvalue())
+    Log.Log_Info(global_log_file, f"XML File Queued: {xml_filepath}")
+
+def table_row(data_dict: dict, site: str, Test_Station: str) -> dict:
+    """output_mode = csv のときの1行分（generate_xml の Header / Data と同じ項目）。"""
+    return {
+        "Serial_Number": data_dict["key_Serial_Number"],
+        "Part_Number": data_dict["key_Part_Number"],
+        "Start_Date_Time": data_dict["key_Start_Date_Time"].replace(".", ":"),
+        "Operation": data_dict["Operation"],
+        "TestStation": Test_Station,
+        "Site": site,
+        "Operator": data_dict.get("key_Operator", ""),
+        "Judge": data_dict["key_Judge"],
+        "Aa": data_dict["key_Aa"],
+        "Ah": data_dict["key_Ah"],
+        "Dh": data_dict["key_Dh"],
+        "V_Max": data_dict["key_V_Max"],
+        "LotNumber_5": data_dict["key_Serial_Number"],
+        "LotNumber_9": data_dict["key_LotNumber_9"],
+        "STARTTIME_SORTED": data_dict["key_STARTTIME_SORTED"],
+        "SORTNUMBER": data_dict["key_SORTNUMBER"],
+    }
 
 def process_excel_file(file_path: str, sheet_name: str, data_columns: list,
-                       running_rec: str, output_path: str, fields: dict,
+                       store: State_Store.StateStore, output_path: str, fields: dict,
                        site: str, product_family: str, operation1: str, operation2: str,
-                       Test_Station: str) -> None:
+                       Test_Station: str, prime: Prime_Lookup.RunConnection,
+                       xml_pool: Xml_Writer.WriterPool, tables: dict = None) -> None:
     """
     Excel ファイルを処理し、データの読み込み、変換、SQL クエリの実行、XML ファイルの生成を行う。
+    最終出力日時と内容ハッシュは store に記録し、出力の発行後に main() が確定する
+    (EA / LD は同じ列から出力されるので Operation1 で記録)。
     """
     Log.Log_Info(global_log_file, f"Processing Excel File: {file_path}")
     
@@ -149,6 +130,15 @@ def process_excel_file(file_path: str, sheet_name: str, data_columns: list,
     else:
         Excel_File = shutil.copy(latest_file, dest_dir)
 
+    # 前回処理したときと内容が同じファイルは読み込まない
+    source = os.path.basename(latest_file)
+    digest = Source_Manifest.file_hash(Excel_File)
+    if store.is_processed(operation1, source, sheet_name, digest):
+        Log.Log_Info(global_log_file, f"Source unchanged since it was last processed, skipped: {source}")
+        return
+    # 前回出力した最終日時以降の列だけを対象にする（記録がなければ31日前から）
+    since = store.last_time(operation1, source, sheet_name, default_days=31)
+
     try:
         # Excel のデータを読み込み、最終有効列を判定する
         df_temp = pd.read_excel(Excel_File, header=None, sheet_name=sheet_name, nrows=2)
@@ -165,7 +155,7 @@ def process_excel_file(file_path: str, sheet_name: str, data_columns: list,
         df = df.dropna(axis=1, how='all')
         df['key_SORTNUMBER'] = df.index + 1
         df = df.drop(columns=df.columns[3:12])
-        df = df[pd.to_datetime(df.iloc[:, 0], errors='coerce') >= (datetime.today() - timedelta(days=31))]
+        df = df[pd.to_datetime(df.iloc[:, 0], errors='coerce') >= since]
         df.rename(columns={df.columns[3]: 'Aa_EA'}, inplace=True)
         df.rename(columns={df.columns[4]: 'Aa_LD'}, inplace=True)
         df.rename(columns={df.columns[5]: 'Ah_EA'}, inplace=True)
@@ -196,34 +186,32 @@ def process_excel_file(file_path: str, sheet_name: str, data_columns: list,
         return
 
     Serial_Number = df['SerialNumber'].tolist()
-    conn, cursor = SQL.connSQL()
+    conn, cursor = prime.get()
     if conn is None:
         Log.Log_Error(global_log_file, "Connection with Prime Failed for Serial Numbers: " + str(Serial_Number))
         return
     try:
-        for serial in Serial_Number:
-            part_number, nine_serial_number = SQL.selectSQL(cursor, serial)
-            df.loc[df['SerialNumber'] == serial, 'Part_Number'] = part_number
-            df.loc[df['SerialNumber'] == serial, 'Nine_Serial_Number'] = nine_serial_number
+        lookup = Prime_Lookup.bulk_select(cursor, Serial_Number)
+        unmatched = Prime_Lookup.enrich(df, 'SerialNumber', lookup, require_both=False)
+        if unmatched:
+            report = os.path.join(os.path.dirname(global_log_file), Prime_Lookup.UNMATCHED_REPORT)
+            Prime_Lookup.report_unmatched(report, unmatched, operation1, file_path)
+            Log.Log_Error(global_log_file, f"{len(unmatched)} serial number(s) not found in database, see {report}")
     except Exception as e:
         Log.Log_Error(global_log_file, f"SQL query failed for Serial Numbers {Serial_Number}: {e}")
-    finally:
-        SQL.disconnSQL(conn, cursor)
     
     df = df.dropna(subset=['Part_Number']).reset_index(drop=True)
     row_end = len(df)
     row_number = 0
 
+    try:
+        latest_date = df.iloc[:, start_date_col].max() if row_end else None
+    except KeyError as e:
+        Log.Log_Error(global_log_file, f"KeyError processing start_date_col: {e}")
+        return
+
     while row_number < row_end:
         data_dict = {}
-        if row_number == row_end - 1:
-            try:
-                latest_date = df.iloc[:, start_date_col].max()
-                update_running_rec(running_rec, latest_date)
-            except KeyError as e:
-                Log.Log_Error(global_log_file, f"KeyError processing start_date_col: {e}")
-                return
-            
         for key, (col, dtype) in fields.items():
             try:
                 value = df.iloc[row_number, int(col)]
@@ -298,14 +286,26 @@ def process_excel_file(file_path: str, sheet_name: str, data_columns: list,
 
         if None in data_dict.values():
             Log.Log_Error(global_log_file, f"Skipping row {row_number} due to None values in data_dict")
+        elif tables is not None:
+            for row_dict in (data_dict_EA, data_dict_LD):
+                tables[row_dict["Operation"]].add(table_row(row_dict, site, Test_Station))
         else:
-            generate_xml(data_dict_EA, output_path, site, product_family, Test_Station)
-            generate_xml(data_dict_LD, output_path, site, product_family, Test_Station)
+            generate_xml(data_dict_EA, output_path, site, product_family, Test_Station, xml_pool)
+            generate_xml(data_dict_LD, output_path, site, product_family, Test_Station, xml_pool)
         row_number += 1
-        Log.Log_Info(global_log_file, "Write the next starting line number")
-        Row_Number_Func.next_start_row_number("EA-WG_LD-WG_StartROW.txt", row_number)
+    # output_mode = csv: EA / LD それぞれ1つのCSV + ポインタXMLとして出力
+    if tables is not None:
+        for table in tables.values():
+            table.write()
+    # このファイル分のXML書き込み完了を待ち、成功したときだけ状態を記録する
+    failures = xml_pool.flush()
+    for xml_file, e in failures:
+        Log.Log_Error(global_log_file, f"Failed to write XML file {xml_file}: {e}")
+    if not failures:
+        store.update(operation1, source, sheet_name, content_hash=digest, last_time=latest_date)
 
-def process_ini_file(config_path: str) -> None:
+def process_ini_file(config_path: str, prime: Prime_Lookup.RunConnection,
+                     xml_pool: Xml_Writer.WriterPool, store: State_Store.StateStore) -> None:
     """
     指定された .ini ファイルを処理し、設定情報を読み込んで Excel および XML の処理を実行する。
     """
@@ -332,6 +332,7 @@ def process_ini_file(config_path: str) -> None:
         operation2 = config.get('Basic_info', 'Operation2')
         Test_Station = config.get('Basic_info', 'TestStation')
         file_name_pattern = config.get('Basic_info', 'file_name_pattern')
+        Prime_Lookup.configure(config)
     except NoSectionError as e:
         Log.Log_Error(global_log_file, f"Missing section in config file {config_path}: {e}")
         return
@@ -348,6 +349,15 @@ def process_ini_file(config_path: str) -> None:
 
     setup_logging(global_log_file)
     Log.Log_Info(log_file, f"Program Start for config {config_path}")
+    # 旧実行記録ファイル (running_rec) は初回だけ状態ストアに取り込む
+    store.import_running_rec(operation1, running_rec)
+    # output_mode = csv なら行ごとのXMLではなく、Operation ごとに1つのCSV + ポインタXML
+    tables = None
+    if Table_Output.output_mode(config) == "csv":
+        tables = {op: Table_Output.from_config(config, site, product_family, op, Test_Station, stage=xml_pool.stage)
+                  for op in (operation1, operation2)}
+        if None in tables.values():
+            tables = None
 
     # フィールド設定を辞書に解析する
     fields = {}
@@ -371,14 +381,47 @@ def process_ini_file(config_path: str) -> None:
             shutil.copy(file, dest_dir)
             Log.Log_Info(global_log_file, f"Copy excel file {file} to ../DataFile/044_EA-WG_LD_WG/")
             copied_file_path = os.path.join(dest_dir, os.path.basename(file))
-            process_excel_file(copied_file_path, sheet_name, data_columns, running_rec,
-                               output_path, fields, site, product_family, operation1, operation2, Test_Station)
+            process_excel_file(copied_file_path, sheet_name, data_columns, store,
+                               output_path, fields, site, product_family, operation1, operation2, Test_Station, prime, xml_pool, tables)
+
+def read_staging_path(ini_files: list) -> str:
+    """
+    ini ファイルの [Paths] staging_path を返す（一時フォルダは実行全体で1つなので、最初に設定している ini の値）。
+    空の場合は一時フォルダを使わず直接書き込む。
+    """
+    for ini_file in ini_files:
+        config = ConfigParser()
+        try:
+            with open(ini_file, 'r', encoding='utf-8') as config_file:
+                config.read_file(line for line in config_file if not line.strip().startswith('#'))
+        except Exception:
+            continue
+        if config.has_option('Paths', 'staging_path'):
+            return config.get('Paths', 'staging_path').strip()
+    return '../DataFile/044_EA-WG_LD_WG/_staging/'
 
 def main() -> None:
     """全ての .ini ファイルをスキャンして処理を実行する"""
     ini_files = glob.glob("*.ini")
-    for ini_file in ini_files:
-        process_ini_file(ini_file)
+    # Prime接続は実行全体で1本だけ開き、全ファイル・全iniで再利用する
+    # XMLはバックグラウンドのスレッドでローカルの一時フォルダに書き込み（次の行の変換と並行）、
+    # 実行の最後に共有フォルダへまとめて発行する（一時名で転送してからリネーム）
+    with State_Store.StateStore() as store:
+        with Output_Stage.OutputStage(read_staging_path(ini_files)) as stage, \
+                Prime_Lookup.RunConnection() as prime, \
+                Xml_Writer.WriterPool(stage=stage) as xml_pool:
+            for ini_file in ini_files:
+                process_ini_file(ini_file, prime, xml_pool, store)
+        # 最終出力日時などは出力の発行後に確定する。発行できなかったファイルは一時フォルダに残り次回発行されるが、
+        # 一時フォルダから失われたファイルがあれば確定しない（次回同じ列を再処理）
+        if stage.lost:
+            Log.Log_Error(global_log_file, f"{stage.lost} staged output file(s) lost, run state not committed")
+        else:
+            store.commit()
+    for summary in (prime.summary(), xml_pool.summary(), stage.summary(), store.summary()):
+        print(summary)
+        if global_log_file:
+            Log.Log_Info(global_log_file, summary)
 
 if __name__ == '__main__':
     main()
@@ -2,30 +2,27 @@
 import os
 import sys
 import glob
-import shutil
 import logging
 import pandas as pd
 from configparser import ConfigParser, NoSectionError, NoOptionError
-from datetime import datetime, timedelta, date
+from datetime import datetime
 
 # カスタムモジュール
 sys.path.append('../MyModule')
 import Log
-import SQL
 import Check
 import Convert_Date
-import Row_Number_Func
+import Incremental_Reader
+import Source_Manifest
+import State_Store
+import Prime_Lookup
+import Copy_Stage
+import Xml_Writer
+import Output_Stage
 
 # ログファイルのグローバル変数
 global_log_file = None
 
-########## Logの設定 ##########
-Log_Folder_Name = str(date.today())
-if not os.path.exists("../Log/" + Log_Folder_Name):
-    os.makedirs("../Log/" + Log_Folder_Name)
-Log_File = '../Log/' + Log_Folder_Name + '/045_Ru_AFM.log'
-Log.Log_Info(Log_File, 'Program Start')
-
 # ログ設定の構成
 def setup_logging(log_file_path):
     try:
@@ -35,47 +32,8 @@ def setup_logging(log_file_path):
         print(f"ファイル {log_file_path} でのログ設定エラー: {e}")
         raise
 
-# 実行記録ファイルを更新
-def update_running_rec(running_rec_path, end_date):
-    try:
-        with open(running_rec_path, 'w', encoding='utf-8') as f:
-            f.write(end_date.strftime('%Y-%m-%d %H:%M:%S'))
-        Log.Log_Info(global_log_file, f"実行記録ファイル {running_rec_path} を終了日 {end_date} で更新しました")
-    except Exception as e:
-        Log.Log_Error(global_log_file, f"実行記録ファイル {running_rec_path} の更新エラー: {e}")
-
-# 実行記録ファイルが存在することを確認し、必要に応じて更新
-def ensure_running_rec_exists_and_update(running_rec_path, end_date):
-    try:
-        with open(running_rec_path, 'w', encoding='utf-8') as f:
-            f.write(end_date.strftime('%Y-%m-%d %H:%M:%S'))
-        Log.Log_Info(global_log_file, f"実行記録ファイル {running_rec_path} を終了日 {end_date} で確認および更新しました")
-    except Exception as e:
-        Log.Log_Error(global_log_file, f"実行記録ファイル {running_rec_path} の処理エラー: {e}")
-
-# 最後の実行記録を読み取る
-def read_running_rec(running_rec_path):
-    if not os.path.exists(running_rec_path):
-        with open(running_rec_path, 'w', encoding='utf-8') as f:
-            f.write('')
-        return datetime.today() - timedelta(days=10)
-    
-    try:
-        with open(running_rec_path, 'r', encoding='utf-8') as f:
-            content = f.read().strip()
-            if content:
-                last_run_date = pd.to_datetime(content, errors='coerce')
-                if pd.isnull(last_run_date):
-                    return datetime.today() - timedelta(days=10)
-                return last_run_date
-            else:
-                return datetime.today() - timedelta(days=10)
-    except Exception as e:
-        Log.Log_Error(global_log_file, f"Error reading running_rec file {running_rec_path}: {e}")
-        return datetime.today() - timedelta(days=10)
-
 # 指定された.iniファイルを処理する関数
-def process_ini_file(config_path):
+def process_ini_file(config_path, prime, xml_pool, store):
     global global_log_file
     config = ConfigParser()
     try:
@@ -99,6 +57,7 @@ def process_ini_file(config_path):
         operation = config.get('Basic_info', 'Operation')
         Test_Station = config.get('Basic_info', 'TestStation')
         file_name_pattern = config.get('Basic_info', 'file_name_pattern')
+        Prime_Lookup.configure(config)
     except NoSectionError as e:
         Log.Log_Error(global_log_file, f"Missing section in config file {config_path}: {e}")
         return
@@ -111,12 +70,14 @@ def process_ini_file(config_path):
     log_folder_path = os.path.join(log_path, log_folder_name)
     if not os.path.exists(log_folder_path):
         os.makedirs(log_folder_path)
-    log_file = os.path.join(log_folder_path, '043_LD-SPUT.log')
+    log_file = os.path.join(log_folder_path, '045_Ru_AFM.log')
     global_log_file = log_file
 
     # ログ設定を行う
     setup_logging(global_log_file)
     Log.Log_Info(log_file, f'Program Start for config {config_path}')
+    # 旧実行記録ファイル (running_rec) は初回だけ状態ストアに取り込む
+    store.import_running_rec(operation, running_rec)
 
     # フィールド設定を辞書に解析
     fields = {}
@@ -125,6 +86,9 @@ def process_ini_file(config_path):
             key, col, dtype = field.split(':')
             fields[key.strip()] = (col.strip(), dtype.strip())
 
+    # DataFileへのコピー：同じサイズ・更新日時のファイルがあればコピーしない（並列・リトライ付き）
+    copier = Copy_Stage.from_config(config)
+
     def process_excel_file(file_path):
         Log.Log_Info(global_log_file, f'Processing Excel File: {file_path}')
         Excel_file_list = []
@@ -134,38 +98,54 @@ def process_ini_file(config_path):
                 Excel_file_list.append([file, dt])
                 
         Excel_file_list = sorted(Excel_file_list, key=lambda x: x[1], reverse=True)
-        Excel_File = shutil.copy(Excel_file_list[0][0], '../DataFile/045_Ru_AFM/')
-        
+        Excel_File = copier.copy(Excel_file_list[0][0], '../DataFile/045_Ru_AFM/')
+
+        # 前回処理したときと内容が同じファイルは読み込まない
+        source = os.path.basename(Excel_file_list[0][0])
+        digest = Source_Manifest.file_hash(Excel_File)
+        if store.is_processed(operation, source, sheet_name, digest):
+            Log.Log_Info(global_log_file, f'Unchanged since the last run, skipped: {source}')
+            return
+
+        # 前回読み込んだ行以降だけを読み取る（初回は101行目から）、読み込み位置は状態ストアに記録
+        reader = Incremental_Reader.IncrementalReader('./Incremental_State.json', scope=operation, store=store)
         try:
             # Excelデータを読み取る
-            df = pd.read_excel(Excel_File, header=None, sheet_name=sheet_name, usecols=data_columns, skiprows=100)
-            df['key_SORTNUMBER'] = df.index + 100
+            df = reader.read_new_rows(Excel_File, sheet_name, usecols=data_columns, first_row=101)
+            df['key_SORTNUMBER'] = df.index  # 0始まりのシート行番号
 
         except Exception as e:
             Log.Log_Error(global_log_file, f'Error reading Excel file {file_path}: {e}')
             return
+        Log.Log_Info(global_log_file, f"{'Full scan' if reader.full_scan else 'Tail read'}: {len(df)} new rows, last row {reader.last_row}")
         
         # 列番号を設定
         df.columns = range(df.shape[1])
         df = df.dropna(subset=[0])  # df[0]がNaNの行を削除
+        if df.empty:
+            Log.Log_Info(global_log_file, 'No new rows')
+            reader.commit()
+            store.update(operation, source, sheet_name, content_hash=digest)
+            return
 
-        # 出力XMLディレクトリが存在しない場合は作成
-        if not os.path.exists(output_path):
-            os.makedirs(output_path)
-            
-        # 処理日付範囲を設定（一ヶ月以内）
-        one_month_ago = read_running_rec(running_rec)
+        # 前回出力した最終日時以降の行だけを対象にする（記録がなければ10日前から）
+        one_month_ago = store.last_time(operation, source, sheet_name, default_days=10)
 
         # key_Start_Date_Timeが一ヶ月前または最後の実行記録日より古い行をフィルタリング
+        # （前回読み込み済みのブロックが編集されて再度返された行は、訂正として日時に関係なく出力する）
+        edited = df.index < reader.watermark
         if 'key_Start_Date_Time' in fields:
             start_date_col = int(fields['key_Start_Date_Time'][0])
-            df = df[df[start_date_col].apply(pd.to_datetime, errors='coerce') >= one_month_ago]
+            start_dates = df[start_date_col].apply(pd.to_datetime, errors='coerce')
+            df = df[(edited & start_dates.notna()) | (start_dates >= one_month_ago)]
+            edited = df.index < reader.watermark
             df[start_date_col] = df[start_date_col].apply(lambda x: pd.to_datetime(x).strftime('%Y-%m-%dT%H.%M.%S'))
         else:
             Log.Log_Error(global_log_file, 'key_Start_Date_Time not found in fields configuration')
         if 'key_AFM_Start_Date_Time' in fields:
             start_AFM_date_col = int(fields['key_AFM_Start_Date_Time'][0])
-            df = df[df[start_AFM_date_col].apply(pd.to_datetime, errors='coerce') >= one_month_ago]
+            afm_dates = df[start_AFM_date_col].apply(pd.to_datetime, errors='coerce')
+            df = df[(edited & afm_dates.notna()) | (afm_dates >= one_month_ago)]
             df[start_AFM_date_col] = df[start_AFM_date_col].apply(lambda x: pd.to_datetime(x).strftime('%Y-%m-%dT%H.%M.%S'))
         else:
             Log.Log_Error(global_log_file, 'key_Start_Date_Time not found in fields configuration') 
@@ -175,22 +155,19 @@ def process_ini_file(config_path):
         #    df.loc[df[int(fields['key_Serial_Number'][0])] == serial, 'Part_Number'] = 'HL13B5-BT20'                 #----REmove
         #    df.loc[df[int(fields['key_Serial_Number'][0])] == serial, 'Nine_Serial_Number'] = '24LFD1AUL'            #----REmove
 
-        conn, cursor = SQL.connSQL()
+        conn, cursor = prime.get()
         if conn is None:
             Log.Log_Error(global_log_file, 'Connection with Prime Failed')
             return
         try:
-            for serial in Serial_Number:
-                part_number, nine_serial_number = SQL.selectSQL(cursor, serial)
-                if part_number and nine_serial_number:
-                    df.loc[df[int(fields['key_Serial_Number'][0])] == serial, 'Part_Number'] = part_number
-                    df.loc[df[int(fields['key_Serial_Number'][0])] == serial, 'Nine_Serial_Number'] = nine_serial_number
-            else:
-                Log.Log_Error(global_log_file, f'Serial number {serial} not found in database')
+            lookup = Prime_Lookup.bulk_select(cursor, Serial_Number)
+            unmatched = Prime_Lookup.enrich(df, int(fields['key_Serial_Number'][0]), lookup)
+            if unmatched:
+                report = os.path.join(os.path.dirname(global_log_file), Prime_Lookup.UNMATCHED_REPORT)
+                Prime_Lookup.report_unmatched(report, unmatched, operation, file_path)
+                Log.Log_Error(global_log_file, f'{len(unmatched)} serial number(s) not found in database, see {report}')
         except Exception as e:
             Log.Log_Error(global_log_file, f'SQL query failed: {e}')
-        finally:
-            SQL.disconnSQL(conn, cursor)
 
         # Drop rows where 'Part_Number' is NaN
         df = df.dropna(subset=['Part_Number'])
@@ -203,11 +180,6 @@ def process_ini_file(config_path):
         while row_number < row_end:
             data_dict = {}
             # データ変換処理
-            # 最新のkey_Start_Date_Timeで実行記録を更新
-            if row_number == row_end - 1:
-                latest_date = df[start_date_col].max()
-                update_running_rec(running_rec, latest_date)
-                
             for key, (col, dtype) in fields.items():
                 try:
                     # dfデータを処理
@@ -255,38 +227,45 @@ def process_ini_file(config_path):
             else:
                 generate_xml(data_dict)
             row_number += 1
-            Log.Log_Info(Log_File, 'Write the next starting line number')
-            Row_Number_Func.next_start_row_number("Ru_AFM_StartROW.txt", row_number)
 
-    def generate_xml(data_dict):   
+        # このファイル分のXML書き込み完了を待ってから読み込み位置・最終日時・内容ハッシュを状態ストアに渡す
+        # （確定は出力の発行後、main() の store.commit()。書き込みに失敗したら次回同じ行を再処理）
+        failures = xml_pool.flush()
+        for xml_file, e in failures:
+            Log.Log_Error(global_log_file, f"Failed to write XML file {xml_file}: {e}")
+        if failures:
+            return
+        reader.commit()
+        # 訂正行だけのときに最終日時が前回より古くならないようにする
+        last_time = State_Store.as_time(df[start_date_col].max()) if row_end else None
+        store.update(operation, source, sheet_name, content_hash=digest,
+                     last_time=max(last_time, one_month_ago) if last_time else None)
+
+    def generate_xml(data_dict):
         print(data_dict.get('key_Start_Date_Time', ''))
         xml_filename = f"Site={site},ProductFamily={product_family},Operation={operation},PartNumber={data_dict.get('key_Part_Number', 'Unknown')},SerialNumber={data_dict.get('key_Serial_Number', 'Unknown')},Testdate ={data_dict.get('key_Start_Date_Time','Unkonow')}.xml"
         xml_filepath = os.path.join(output_path, xml_filename)
-        with open(xml_filepath, 'w', encoding='utf-8') as f:
-            f.write('<?xml version="1.0" encoding="utf-8"?>\n')
-            f.write('<Results xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xmlns:xsd="http://www.w3.org/2001/XMLSchema">\n')
-            f.write(f'    <Result startDateTime="{data_dict["key_Start_Date_Time"].replace(".", ":")}" Result="Passed">\n')
-            f.write(f'        <Header SerialNumber="{data_dict["key_Serial_Number"]}" PartNumber="{data_dict["key_Part_Number"]}" Operation="{operation}" TestStation="{Test_Station}" Operator="{data_dict["key_Operator"]}" StartTime="{data_dict["key_Start_Date_Time"].replace(".", ":")}" Site="{site}" LotNumber="{data_dict["key_Serial_Number"]}"/>\n')
-            f.write('        <HeaderMisc>\n')
-            f.write('            <Item Description="AFM_Step_Height"></Item>\n')
-            f.write('        </HeaderMisc>\n')
-            f.write(f'        <TestStep Name="{data_dict["key_Operation"]}" startDateTime="{data_dict["key_Start_Date_Time"].replace(".", ":")}" Status="Passed">\n')
-            
-            for key in ["key_Ah_L1", "key_Ah_L2", "key_Ah_R1", "key_Ah_R2", "key_Da_L1", "key_Da_L2", "key_Da_R1", "key_Da_R2", "key_Dh_L1", "key_Dh_L2", "key_Dh_R1", "key_Dh_R2"]:
-                f.write(f'            <Data DataType="Numeric" Name="{key.split("_")[1]}_{key.split("_")[2]}" Units="um" Value="{data_dict[key]}"/>\n')
-            f.write('        </TestStep>\n')
-            f.write(f'        <TestStep Name="SORTED_DATA" startDateTime="{data_dict["key_Start_Date_Time"].replace(".", ":")}" Status="Passed">\n')
-            f.write(f'            <Data DataType="Numeric" Name="STARTTIME_SORTED" Units="" Value="{data_dict["key_STARTTIME_SORTED"]}"/>\n')
-            f.write(f'            <Data DataType="Numeric" Name="SORTNUMBER" Units="" Value="{data_dict["key_SORTNUMBER"]}"/>\n')
-            f.write(f'            <Data DataType="String" Name="LotNumber_5" Value="{data_dict["key_Serial_Number"]}" CompOperation="LOG"/>\n')
-            f.write(f'            <Data DataType="String" Name="LotNumber_9" Value="{data_dict["key_LotNumber_9"]}" CompOperation="LOG"/>\n')
-            f.write('        </TestStep>\n')
-            f.write('        <TestEquipment>\n')
-            f.write(f'            <Item DeviceName="MOCVD" DeviceSerialNumber="{data_dict["key_Equipment"]}"></Item> \n ')
-            f.write('        </TestEquipment>\n') 
-            f.write('    </Result>\n')
-            f.write('</Results>\n')
-        Log.Log_Info(global_log_file, f'XML File Created: {xml_filepath}')
+        start_time = data_dict["key_Start_Date_Time"].replace(".", ":")
+        w = Xml_Writer.ResultsWriter(indent="    ")
+        w.result({"startDateTime": start_time, "Result": "Passed"})
+        w.header({"SerialNumber": data_dict["key_Serial_Number"], "PartNumber": data_dict["key_Part_Number"],
+                  "Operation": operation, "TestStation": Test_Station, "Operator": data_dict["key_Operator"],
+                  "StartTime": start_time, "Site": site, "LotNumber": data_dict["key_Serial_Number"]})
+        w.header_misc([{"Description": "AFM_Step_Height"}])
+        w.test_step({"Name": data_dict["key_Operation"], "startDateTime": start_time, "Status": "Passed"}, [
+            {"DataType": "Numeric", "Name": f'{key.split("_")[1]}_{key.split("_")[2]}', "Units": "um", "Value": data_dict[key]}
+            for key in ["key_Ah_L1", "key_Ah_L2", "key_Ah_R1", "key_Ah_R2", "key_Da_L1", "key_Da_L2", "key_Da_R1", "key_Da_R2",
+                        "key_Dh_L1", "key_Dh_L2", "key_Dh_R1", "key_Dh_R2"]])
+        w.test_step({"Name": "SORTED_DATA", "startDateTime": start_time, "Status": "Passed"}, [
+            {"DataType": "Numeric", "Name": "STARTTIME_SORTED", "Units": "", "Value": data_dict["key_STARTTIME_SORTED"]},
+            {"DataType": "Numeric", "Name": "SORTNUMBER", "Units": "", "Value": data_dict["key_SORTNUMBER"]},
+            {"DataType": "String", "Name": "LotNumber_5", "Value": data_dict["key_Serial_Number"], "CompOperation": "LOG"},
+            {"DataType": "String", "Name": "LotNumber_9", "Value": data_dict["key_LotNumber_9"], "CompOperation": "LOG"},
+        ])
+        w.test_equipment([{"DeviceName": "MOCVD", "DeviceSerialNumber": data_dict["key_Equipment"]}])
+        # 書き込みはxml_poolのバックグラウンドスレッドでローカルの一時フォルダへ（共有フォルダへは main() の最後にまとめて発行）
+        xml_pool.submit(xml_filepath, w.getvalue())
+        Log.Log_Info(global_log_file, f'XML File Queued: {xml_filepath}')
 
     # 入力パスに基づいてExcelファイルを処理
     for input_path in input_paths:
@@ -294,23 +273,38 @@ def process_ini_file(config_path):
         files = [file for file in files if not os.path.basename(file).startswith('~$')]
         if not files:
             Log.Log_Error(global_log_file, f"Can't find Excel file in {input_path} with pattern {file_name_pattern}")
-        for file in files:
-            if not os.path.basename(file).startswith('~$'):
-                destination_dir = '../DataFile/044_/Ru_AFM//'
-                if not os.path.exists(destination_dir):
-                    os.makedirs(destination_dir)
-                shutil.copy(file, destination_dir)
-                Log.Log_Info(global_log_file, f"Copy excel file {file} to ../DataFile/044_/Ru_AFM/")
-                copied_file_path = os.path.join(destination_dir, os.path.basename(file))
-                process_excel_file(copied_file_path)
+        destination_dir = '../DataFile/044_/Ru_AFM//'
+        for file, copied_file_path, error in copier.copy_many(files, destination_dir):
+            if error is not None:
+                Log.Log_Error(global_log_file, f"Copy excel file {file} to {destination_dir} failed: {error}")
+                continue
+            Log.Log_Info(global_log_file, f"Copy excel file {file} to ../DataFile/044_/Ru_AFM/")
+            process_excel_file(copied_file_path)
+    Log.Log_Info(global_log_file, copier.summary())
 
 # すべての.iniファイルをスキャンして処理するメイン関数
 def main():
     ini_files = glob.glob("*.ini")
-    for ini_file in ini_files:
-        process_ini_file(ini_file)
+    # Prime接続は実行全体で1本だけ開き、全ファイル・全iniで再利用する
+    # XMLはバックグラウンドのスレッドでローカルの一時フォルダに書き込み（次の行の変換と並行）、
+    # 実行の最後に共有フォルダへまとめて発行する（一時名で転送してからリネーム）
+    # 読み込み位置・最終日時・内容ハッシュは状態ストア (../DataFile/State_Store.sqlite) にまとめ、出力の発行後に確定する
+    with State_Store.StateStore() as store:
+        with Output_Stage.OutputStage('../DataFile/045_Ru_AFM/_staging/') as stage, \
+                Prime_Lookup.RunConnection() as prime, \
+                Xml_Writer.WriterPool(stage=stage) as xml_pool:
+            for ini_file in ini_files:
+                process_ini_file(ini_file, prime, xml_pool, store)
+        # 一時フォルダから失われた出力ファイルがあれば確定しない（次回同じ行を再処理）
+        if stage.lost:
+            Log.Log_Error(global_log_file, f"{stage.lost} staged output file(s) lost, run state not committed")
+        else:
+            store.commit()
+    for summary in (prime.summary(), xml_pool.summary(), stage.summary(), store.summary()):
+        print(summary)
+        if global_log_file:
+            Log.Log_Info(global_log_file, summary)
 
 if __name__ == '__main__':
     main()
-
-Log.Log_Info(global_log_file, 'Program End')
+    Log.Log_Info(global_log_file, 'Program End')
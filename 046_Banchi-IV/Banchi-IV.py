@@ -2,15 +2,14 @@
 import os
 import sys
 import glob
-import shutil
 import logging
 import pandas as pd
 from configparser import ConfigParser, NoSectionError, NoOptionError
-from datetime import datetime, timedelta
+from datetime import datetime
 
 # カスタムモジュールのインポート
 sys.path.append('../MyModule')
-import Log, SQL, Check, Convert_Date, Row_Number_Func
+import Log, Check, Convert_Date, Prime_Lookup, Xml_Writer, Output_Stage, Table_Output, Source_Manifest, State_Store
 from openpyxl import load_workbook
 import random
 import logging
@@ -28,19 +27,8 @@ def setup_logging(log_file_path):
         Log.Log_Error(global_log_file, f"Error setting up logging: {e}")
         raise
 
-# 実行記録ファイルを更新する関数
-def update_running_rec(running_rec_path, end_date):
-    try:
-        with open(running_rec_path, 'w', encoding='utf-8') as f:
-            end_date = end_date.replace('.', ':').replace('T', ' ')
-            end_date_dt = datetime.strptime(end_date, '%Y-%m-%d %H:%M:%S')
-            f.write(end_date_dt.strftime('%Y-%m-%d %H:%M:%S'))
-        Log.Log_Info(global_log_file, f"実行記録ファイル {running_rec_path} を終了日 {end_date} で更新しました")
-    except Exception as e:
-        Log.Log_Error(global_log_file, f"実行記録ファイル {running_rec_path} の更新エラー: {e}")
-
 # XMLファイルを生成する関数
-def generate_xml(data_dict):
+def generate_xml(data_dict, xml_pool):
     try:
         start_date_time = data_dict.get('key_Start_Date_Time', '')
         if start_date_time:
@@ -52,37 +40,52 @@ def generate_xml(data_dict):
         xml_filename = f"Site={site},ProductFamily={product_family},Operation={operation},PartNumber={data_dict.get('key_Part_Number', 'Unknown')},SerialNumber={data_dict.get('key_Serial_Number', 'Unknown')},Testdate={data_dict.get('key_Start_Date_Time', 'Unknown')}.xml"
         xml_filepath = os.path.join(output_path, xml_filename)
 
-        with open(xml_filepath, 'w', encoding='utf-8') as f:
-            f.write('<?xml version="1.0" encoding="utf-8"?>\n')
-            f.write('<Results xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xmlns:xsd="http://www.w3.org/2001/XMLSchema">\n')
-            f.write(f'    <Result startDateTime="{data_dict["key_Start_Date_Time"].replace(".", ":")}" Result="Passed">\n')
-            f.write(f'        <Header SerialNumber="{data_dict["key_Serial_Number"]}" PartNumber="{data_dict["key_Part_Number"]}" Operation="{operation}" TestStation="{Test_Station}" Operator="{data_dict["key_Operator"]}" StartTime="{data_dict["key_Start_Date_Time"].replace(".", ":")}" Site="{site}" LotNumber="{data_dict["key_Serial_Number"]}"/>\n')
-            f.write('        <HeaderMisc>\n')
-            f.write(f'            <Item Description="{operation}"/>\n')
-            f.write('        </HeaderMisc>\n')
-            f.write(f'        <TestStep Name="{data_dict["key_Operation"]}" startDateTime="{data_dict["key_Start_Date_Time"].replace(".", ":")}" Status="Passed">\n')
-            f.write(f'            <Data DataType="String" Name="Banchi_ID" Value="{data_dict["key_Banchi_ID"]}"/>\n')
-            f.write(f'            <Data DataType="Numeric" Name="Current" Units="uA" Value="{data_dict["key_Current"]}"/>\n')
-            f.write(f'            <Data DataType="Numeric" Name="Voltage" Units="V" Value="{data_dict["key_Voltage"]}"/>\n')
-            f.write(f'            <Data DataType="Numeric" Name="{data_dict["key_Banchi_ID"]}" Units="uA" Value="{data_dict["key_Current"]}"/>\n')
-            f.write('        </TestStep>\n')
-            f.write(f'        <TestStep Name="SORTED_DATA" startDateTime="{data_dict["key_Start_Date_Time"].replace(".", ":")}" Status="Passed">\n')
-            f.write(f'            <Data DataType="Numeric" Name="STARTTIME_SORTED" Value="{data_dict["key_STARTTIME_SORTED"]}"/>\n')
-            f.write(f'            <Data DataType="String" Name="LotNumber_5" Value="{data_dict["key_Serial_Number"]}" CompOperation="LOG"/>\n')
-            f.write(f'            <Data DataType="String" Name="LotNumber_9" Value="{data_dict["key_LotNumber_9"]}" CompOperation="LOG"/>\n')
-            f.write('        </TestStep>\n')
-            f.write('        <TestEquipment>\n')
-            f.write(f'            <Item DeviceName="MOCVD" DeviceSerialNumber="{data_dict["Tool_ID"]}"/>\n')
-            f.write('        </TestEquipment>\n')
-            f.write('    </Result>\n')
-            f.write('</Results>\n')
+        start_time = data_dict["key_Start_Date_Time"].replace(".", ":")
+        w = Xml_Writer.ResultsWriter(indent="    ")
+        w.result({"startDateTime": start_time, "Result": "Passed"})
+        w.header({"SerialNumber": data_dict["key_Serial_Number"], "PartNumber": data_dict["key_Part_Number"],
+                  "Operation": operation, "TestStation": Test_Station, "Operator": data_dict["key_Operator"],
+                  "StartTime": start_time, "Site": site, "LotNumber": data_dict["key_Serial_Number"]})
+        w.header_misc([{"Description": operation}])
+        w.test_step({"Name": data_dict["key_Operation"], "startDateTime": start_time, "Status": "Passed"}, [
+            {"DataType": "String", "Name": "Banchi_ID", "Value": data_dict["key_Banchi_ID"]},
+            {"DataType": "Numeric", "Name": "Current", "Units": "uA", "Value": data_dict["key_Current"]},
+            {"DataType": "Numeric", "Name": "Voltage", "Units": "V", "Value": data_dict["key_Voltage"]},
+            {"DataType": "Numeric", "Name": data_dict["key_Banchi_ID"], "Units": "uA", "Value": data_dict["key_Current"]},
+        ])
+        w.test_step({"Name": "SORTED_DATA", "startDateTime": start_time, "Status": "Passed"}, [
+            {"DataType": "Numeric", "Name": "STARTTIME_SORTED", "Value": data_dict["key_STARTTIME_SORTED"]},
+            {"DataType": "String", "Name": "LotNumber_5", "Value": data_dict["key_Serial_Number"], "CompOperation": "LOG"},
+            {"DataType": "String", "Name": "LotNumber_9", "Value": data_dict["key_LotNumber_9"], "CompOperation": "LOG"},
+        ])
+        w.test_equipment([{"DeviceName": "MOCVD", "DeviceSerialNumber": data_dict["Tool_ID"]}])
+        xml_pool.submit(xml_filepath, w.getvalue())
 
-        Log.Log_Info(global_log_file, f'XML File Created: {xml_filepath}')
+        Log.Log_Info(global_log_file, f'XML File Queued: {xml_filepath}')
     except Exception as e:
         Log.Log_Error(global_log_file, f"Failed to create XML file for SerialNumber={data_dict.get('key_Serial_Number', 'Unknown')}: {e}")
 
-# Excelファイルを処理する関数
-def process_excel_file(file_path):
+# output_mode = csv のときの1行分（XMLのHeader / Dataと同じ項目）
+def table_row(data_dict):
+    return {
+        'Serial_Number': data_dict['key_Serial_Number'],
+        'Part_Number': data_dict['key_Part_Number'],
+        'Start_Date_Time': data_dict['key_Start_Date_Time'].replace('.', ':'),
+        'Operation': operation,
+        'TestStation': Test_Station,
+        'Site': site,
+        'Operator': data_dict['key_Operator'],
+        'Banchi_ID': data_dict['key_Banchi_ID'],
+        'Current': data_dict['key_Current'],
+        'Voltage': data_dict['key_Voltage'],
+        'MOCVD_DeviceSerialNumber': data_dict['Tool_ID'],
+        'LotNumber_5': data_dict['key_Serial_Number'],
+        'LotNumber_9': data_dict['key_LotNumber_9'],
+        'STARTTIME_SORTED': data_dict['key_STARTTIME_SORTED'],
+    }
+
+# Excelファイルを処理する関数（出力まで成功したら True）
+def process_excel_file(file_path, prime, xml_pool, table=None):
     workbook = load_workbook(file_path, data_only=True)
     if sheet_name not in workbook.sheetnames:
         Log.Log_Error(global_log_file, f"Sheet '{sheet_name}' not found in the workbook. Skipping file: {file_path}")
@@ -138,31 +141,19 @@ def process_excel_file(file_path):
     complete_df['Part_Number'] = None  # 'Part_Number'列を確保
     Serial_Number = complete_df['Serial_Number'].tolist()
 
-    conn, cursor = SQL.connSQL()
+    conn, cursor = prime.get()
     if conn is None:
         Log.Log_Error(global_log_file, 'Connection with Prime Failed')
         return
     try:
-        for serial in Serial_Number:
-            part_number, nine_serial_number = SQL.selectSQL(cursor, serial)
-            if part_number and nine_serial_number:
-                complete_df.loc[complete_df['Serial_Number'] == serial, 'Part_Number'] = part_number
-                complete_df.loc[complete_df['Serial_Number'] == serial, 'Nine_Serial_Number'] = nine_serial_number
-            else:
-                Log.Log_Error(global_log_file, f'Serial number {serial} not found in database')
-   
+        lookup = Prime_Lookup.bulk_select(cursor, Serial_Number)
+        unmatched = Prime_Lookup.enrich(complete_df, 'Serial_Number', lookup)
+        if unmatched:
+            report = os.path.join(os.path.dirname(global_log_file), Prime_Lookup.UNMATCHED_REPORT)
+            Prime_Lookup.report_unmatched(report, unmatched, operation, file_path)
+            Log.Log_Error(global_log_file, f'{len(unmatched)} serial number(s) not found in database, see {report}')
     except Exception as e:
         Log.Log_Error(global_log_file, f'SQL query failed: {e}')
-    finally:
-        SQL.disconnSQL(conn, cursor)
-    
-    try:
-        with open(running_rec, 'a', encoding='utf-8') as f:
-            print(f"{file_path}\n")
-            f.write(f"{file_path}\n")
-        Log.Log_Info(global_log_file, f"Appended processed file path to running_rec: {file_path}")
-    except Exception as e:
-        Log.Log_Error(global_log_file, f"Error appending file path to running_rec: {e}")
     
         # 'Part_Number'がNaNの行を削除
     complete_df = complete_df.dropna(subset=['Part_Number'])
@@ -170,13 +161,6 @@ def process_excel_file(file_path):
     complete_df = complete_df.reset_index(drop=True)
     row_number = 0        
     Log.Log_Info(global_log_file, f'Processing dataframe {len(complete_df)} rows')
-    # 成功したファイルのパスと名前をBanchi-IV_StartRow.txtに追加
-    try:
-        with open('./Banchi-IV_StartRow.txt', 'a', encoding='utf-8') as f:
-            f.write(f"{file_path}\n")
-        Log.Log_Info(global_log_file, f"Appended processed file path to Banchi-IV_StartRow.txt: {file_path}")
-    except Exception as e:
-        Log.Log_Error(global_log_file, f"Error appending file path to Banchi-IV_StartRow.txt: {e}")
 
         # データ処理
     for row_number in range(len(complete_df)):
@@ -185,7 +169,6 @@ def process_excel_file(file_path):
             # 最新のkey_Start_Date_Timeで実行記録を更新
         
         latest_date = complete_df['Start_date_time'].max()
-        #update_running_rec(running_rec, latest_date)
         data_dict["key_Start_Date_Time"]=latest_date                
         data_dict['key_Operation'] = operation
         date = datetime.strptime(str(data_dict["key_Start_Date_Time"]).replace('T', ' ').replace('.', ':'), "%Y-%m-%d %H:%M:%S")
@@ -208,11 +191,21 @@ def process_excel_file(file_path):
             # XMLファイルを生成
         if None in data_dict.values():
             Log.Log_Error(global_log_file, f"Skipping row {row_number} due to None values in data_dict")
+        elif table is not None:
+            table.add(table_row(data_dict))
         else:
-            generate_xml(data_dict)
+            generate_xml(data_dict, xml_pool)
+    # output_mode = csv: このファイルの全行を1つのCSV + ポインタXMLとして出力
+    if table is not None:
+        table.write()
+    # このファイル分のXML書き込み完了を待つ
+    failures = xml_pool.flush()
+    for xml_file, e in failures:
+        Log.Log_Error(global_log_file, f"Failed to write XML file {xml_file}: {e}")
+    return not failures
 
 
-def process_ini_file(config_path):
+def process_ini_file(config_path, prime, xml_pool, store):
     global global_log_file
     config = ConfigParser()
     try:
@@ -240,6 +233,7 @@ def process_ini_file(config_path):
         Title_Row = config.getint('Excel', 'Title_Row')
         Data_Row = config.getint('Excel', 'Data_Row')
         Tool_ID = config.get('Excel','Tool')
+        Prime_Lookup.configure(config)
     except NoSectionError as e:
         Log.Log_Error(global_log_file, f"Missing section in config file {config_path}: {e}")
         return
@@ -258,6 +252,10 @@ def process_ini_file(config_path):
     # ログ設定を行う
     setup_logging(global_log_file)
     Log.Log_Info(log_file, f'Program Start for config {config_path}')
+    # 旧実行記録ファイル (処理済みファイルの一覧) は初回だけ状態ストアに取り込む
+    store.import_running_rec(operation, running_rec)
+    # output_mode = csv なら行ごとのXMLではなくファイルごとに1つのCSV + ポインタXML
+    table = Table_Output.from_config(config, site, product_family, operation, Test_Station, stage=xml_pool.stage)
     
     #file_name_pattern='*.xlsx'
     Log.Log_Info(log_file, 'Searching Banchi IV file')
@@ -272,17 +270,38 @@ def process_ini_file(config_path):
                     file_path = os.path.join(root, file)
                     file_mod_time = datetime.fromtimestamp(os.path.getmtime(file_path))
                     if (datetime.now() - file_mod_time).days <= 10:  # Setting data retrieval date
+                        # 同じ内容で処理済みのファイルは読み込まない（同名ファイルが多いのでパスで記録）
+                        digest = Source_Manifest.file_hash(file_path)
+                        if store.is_processed(operation, file_path, sheet_name, digest):
+                            Log.Log_Info(log_file, f'Already processed with the same content, skipped: {file_path}')
+                            continue
                         Log.Log_Info(log_file, f'Processing file {file_path}')
-                        process_excel_file(file_path)
+                        if process_excel_file(file_path, prime, xml_pool, table):
+                            store.update(operation, file_path, sheet_name, content_hash=digest, last_time=file_mod_time)
 
                 
 # すべての.iniファイルをスキャンして処理するメイン関数
 def main():
     ini_files = glob.glob("*.ini")
-    for ini_file in ini_files:
-        process_ini_file(ini_file)
+    # Prime接続は実行全体で1本だけ開き、全ファイル・全iniで再利用する
+    # XMLはバックグラウンドのスレッドでローカルの一時フォルダに書き込み（次の行の変換と並行）、
+    # 実行の最後に共有フォルダへまとめて発行する（一時名で転送してからリネーム）
+    # 処理済みファイル（パス + 内容ハッシュ）は出力の発行後に確定する（一時フォルダから失われた出力があれば確定しない）
+    with State_Store.StateStore() as store:
+        with Output_Stage.OutputStage('../DataFile/046_Banchi-IV/_staging/') as stage, \
+                Prime_Lookup.RunConnection() as prime, \
+                Xml_Writer.WriterPool(stage=stage) as xml_pool:
+            for ini_file in ini_files:
+                process_ini_file(ini_file, prime, xml_pool, store)
+        if stage.lost:
+            Log.Log_Error(global_log_file, f"{stage.lost} staged output file(s) lost, run state not committed")
+        else:
+            store.commit()
+    for summary in (prime.summary(), xml_pool.summary(), stage.summary(), store.summary()):
+        print(summary)
+        if global_log_file:
+            Log.Log_Info(global_log_file, summary)
 
 if __name__ == '__main__':
     main()
-
-Log.Log_Info(global_log_file, 'Program End')
+    Log.Log_Info(global_log_file, 'Program End')
@@ -5,15 +5,16 @@
 This program's functionality:
 1. Reads all .ini files, processes Excel file data according to the configuration, and generates XML files. # Explains the program's purpose
 2. Running records and error logs are output by the custom module Log. # Explains the logging method
+3. --force-emit (or [Options] force_emit = true) outputs every row of the last Running_date days again, also from unchanged workbooks. # Explains what a forced run re-emits
 
 Dependent Modules:
-- Log, SQL, Check, Convert_Date, Row_Number_Func (all in ../MyModule) # Lists the dependent custom modules
+- Log, SQL, Check, Convert_Date (all in ../MyModule) # Lists the dependent custom modules
+- The last output time is kept in State_Store (../DataFile/State_Store.sqlite), the previous sheet snapshot in Snapshot_Diff # Explains where the run state is stored
 """  # Multi-line comment: Program description
 
 import os  # Imports the os module for operating system related operations
 import sys  # Imports the sys module to interact with the Python interpreter
 import glob  # Imports the glob module for file path matching
-import shutil  # Imports the shutil module for file copying and moving operations
 import logging  # Imports the logging module for logging
 import pandas as pd  # Imports the pandas module, aliased as pd, for data processing
 import random 
@@ -25,7 +26,13 @@ import Log  # Imports the custom Log module for logging
 import SQL  # Imports the custom SQL module for database operations
 import Check  # Imports the custom Check module
 import Convert_Date  # Imports the custom Convert_Date module
-import Row_Number_Func  # Imports the custom Row_Number_Func module for handling row numbers
+import Source_Manifest  # Imports the custom Source_Manifest module to skip unchanged source files
+import Incremental_Reader  # Imports the custom Incremental_Reader module to stream the sheet with openpyxl
+import State_Store  # Imports the custom State_Store module holding the read position / last output time
+import Emit_Index  # Imports the custom Emit_Index module to drop rows that were already uploaded
+import Snapshot_Diff  # Imports the custom Snapshot_Diff module to find the inserted / corrected rows
+import Copy_Stage  # Imports the custom Copy_Stage module to copy only changed source files
+import Output_Stage  # Imports the custom Output_Stage module to stage CSV/XML locally and publish them in one batch
 
 global_log_file = None  # Defines a global variable global_log_file, initialized to None
 
@@ -38,51 +45,12 @@ def setup_logging(log_file_path: str) -> None:  # Defines the setup_logging func
         print(f"Error setting up log file {log_file_path}: {e}")  # Prints the error message to the console
         raise  # Re-raises the exception
 
-def update_running_rec(running_rec_path: str, end_date: datetime) -> None:  # Defines the update_running_rec function to update the running record file
-    """Updates the running record file."""  # Function description: Writes the latest end date to the running record file
-    try:  # Tries to execute the following code
-        with open(running_rec_path, 'w', encoding='utf-8') as f:  # Opens the running record file in write mode
-            f.write(end_date.strftime('%Y-%m-%d %H:%M:%S'))  # Formats the date and writes it to the file
-        Log.Log_Info(global_log_file, f"Running record file {running_rec_path} updated with end date {end_date}")  # Logs the successful update message
-    except Exception as e:  # Catches all exceptions
-        Log.Log_Error(global_log_file, f"Error updating running record file {running_rec_path}: {e}")  # Logs the error message
-
-def ensure_running_rec_exists_and_update(running_rec_path: str, end_date: datetime) -> None:  # Defines the ensure_running_rec_exists_and_update function to ensure the running record file exists and update it
-    """Creates and updates the running record file if it does not exist."""  # Function description: Checks if the running record file exists, creates it if not, then updates it
-    try:  # Tries to execute the following code
-        with open(running_rec_path, 'w', encoding='utf-8') as f:  # Opens (or creates) the running record file in write mode
-            f.write(end_date.strftime('%Y-%m-%d %H:%M:%S'))  # Writes the end date to the file
-        Log.Log_Info(global_log_file, f"Running record file {running_rec_path} confirmed and updated with end date {end_date}")  # Logs the successful update message
-    except Exception as e:  # Catches all exceptions
-        Log.Log_Error(global_log_file, f"Error processing running record file {running_rec_path}: {e}")  # Logs the error message
-
-def read_running_rec(running_rec_path: str) -> datetime:  # Defines the read_running_rec function to read the running record file
-    """
-    Reads the last run record.
-    If the file does not exist or the content is invalid, it returns the date 30 days ago.
-    """  # Function description: Tries to read the run record file, returns a default date on failure
-    if not os.path.exists(running_rec_path):  # If the file does not exist
-        with open(running_rec_path, 'w', encoding='utf-8') as f:  # Creates an empty file
-            f.write('')  # Writes an empty string
-        return datetime.today() - timedelta(days= 30 )  # Returns the date 30 days ago
-    try:  # Tries to read the file content
-        with open(running_rec_path, 'r', encoding='utf-8') as f:  # Opens the file in read mode
-            content = f.read().strip()  # Reads the content and removes leading/trailing whitespace
-            if content:  # If the content is not empty
-                last_run_date = pd.to_datetime(content, errors='coerce')  # Converts to datetime format
-                if pd.isnull(last_run_date):  # If the conversion result is invalid
-                    return datetime.today() - timedelta(days=30)  # Returns the date 30 days ago
-                return last_run_date  # Returns the converted date
-            else:  # If the content is empty
-                return datetime.today() - timedelta(days=30)  # Returns the date 30 days ago
-    except Exception as e:  # Catches all exceptions
-        Log.Log_Error(global_log_file, f"Error reading running record file {running_rec_path}: {e}")  # Logs the error message
-        return datetime.today() - timedelta(days=30)  # Returns the date 30 days ago
-
-def process_excel_file(file_path: str, sheet_name: str, data_columns, running_rec: str,
+def process_excel_file(file_path: str, sheet_name: str, data_columns, store: State_Store.StateStore,
                        output_path: str, fields: dict, site: str, product_family: str,
-                       operation: str, Test_Station: str, config: ConfigParser) -> None:  # Defines the process_excel_file function to process Excel files
-    """Processes Excel files, reads data, transforms it, and generates XML files."""  # Function description: Reads and processes Excel data based on configuration, then generates XML files
+                       operation: str, Test_Station: str, config: ConfigParser,
+                       emitted: Emit_Index.EmitIndex, diff: Snapshot_Diff.SnapshotDiff,
+                       stage: Output_Stage.OutputStage) -> bool:  # Defines the process_excel_file function to process Excel files
+    """Processes Excel files, reads data, transforms it, and generates XML files. Returns True on success."""  # Function description: Reads and processes Excel data based on configuration, then generates XML files
     Log.Log_Info(global_log_file, f"Processing Excel File: {file_path}")  # Logs the start of Excel file processing
     Excel_file_list = []  # Initializes an empty list to store files and their modification times
     for file in glob.glob(file_path):  # Iterates through all files matching file_path
@@ -91,32 +59,53 @@ def process_excel_file(file_path: str, sheet_name: str, data_columns, running_re
             Excel_file_list.append([file, dt])  # Adds the file path and modification time to the list
     if not Excel_file_list:  # If the list is empty
         Log.Log_Error(global_log_file, f"Excel file not found: {file_path}")  # Logs an error
-        return  # Exits the function
+        return False  # Exits the function
     Excel_file_list = sorted(Excel_file_list, key=lambda x: x[1], reverse=True)  # Sorts files by modification time (newest first)
     Excel_File = Excel_file_list[0][0]  # Gets the path and name of the latest file
     
+    source = os.path.basename(Excel_File)  # State store / snapshot key of this workbook
     try:  # Tries to read Excel data
-        # Reads Excel data, skipping the first 1000 rows, and only reading specified columns
-        df = pd.read_excel(Excel_File, header=None, sheet_name=sheet_name, usecols=data_columns, skiprows=1000)
-        df['key_SORTNUMBER'] = df.index + 1000  # Adds a 'key_SORTNUMBER' column with the value of index + 1000
+        # Reads the whole copied snapshot (from row 1001, only the specified columns), so the diff sees corrections to any row
+        workbook = Incremental_Reader.open_workbook(Excel_File)
+        try:
+            df = Incremental_Reader.read_sheet(workbook, sheet_name, usecols=data_columns, excel_path=Excel_File)
+        finally:
+            if workbook is not None:
+                workbook.close()
+        df = df.iloc[1000:].dropna(how='all')  # Data rows start at row 1001; empty rows are skipped
+        df['key_SORTNUMBER'] = df.index  # Adds a 'key_SORTNUMBER' column with the 0-based sheet row
 
     except Exception as e:  # If reading fails
         Log.Log_Error(global_log_file, f"Error reading Excel file {file_path}: {e}")  # Logs an error
-        return  # Exits the function
+        return False  # Exits the function
+    Log.Log_Info(global_log_file, f"Read {len(df)} rows from {source}")
+    if df.empty:  # No data rows in the sheet
+        return True
     df.columns = range(df.shape[1])  # Renames DataFrame columns to 0, 1, 2, ...     
     df = df.dropna(subset=[2])  # Deletes rows where the third column (index 2) is NaN
 
-    if not os.path.exists(output_path):  # If the output directory does not exist
-        os.makedirs(output_path)  # Creates the output directory
-        
-    one_month_ago = read_running_rec(running_rec)  # Gets the date from 30 days ago based on the running record
     if 'key_Start_Date_Time' in fields:  # If the configuration contains the key_Start_Date_Time field
         start_date_col = int(fields['key_Start_Date_Time'][0])  # Gets the column number for this field
         #print(start_date_col,df[start_date_col])  # Prints the column number for this field
         running_date = config.get('Basic_info', 'Running_date')  # Gets the Running_date value from the ini file
-        one_month_ago = datetime.today() - timedelta(days=int(running_date))  # Calculates the date from `running_date` days ago
-        df = df[df[start_date_col].apply(pd.to_datetime, errors='coerce') >= one_month_ago]  # Filters for rows with dates greater than or equal to `one_month_ago`
-        df[start_date_col] = df[start_date_col].apply(lambda x: pd.to_datetime(x).strftime('%Y-%m-%d %H:%M:%S'))  # Formats the date in this column
+        first_snapshot = not diff.has_snapshot(source)  # No previous snapshot: every row counts as inserted
+        named = df.rename(columns={int(col): key for key, (col, _) in fields.items()})  # Field names in the change log
+        inserted, changed = diff.compare(source, named, key_columns=['key_Start_Date_Time', 'key_Serial_Number'],
+                                         value_columns=[key for key in fields if key != 'key_SORTNUMBER'])  # Diff against the previous snapshot of the whole sheet
+        is_new = df.index.isin(inserted.index)  # Rows whose key is new, including corrected keys (any date)
+        start_dates = df[start_date_col].apply(pd.to_datetime, errors='coerce')  # Non-date cells become NaT
+        if emitted.force or first_snapshot:  # Inserted rows limited to a window: --force-emit the last `running_date` days,
+            # the first snapshot the rows after the last output time (old running record) or `running_date` days
+            since = (datetime.now() - timedelta(days=int(running_date)) if emitted.force
+                     else store.last_time(operation, source, sheet_name, default_days=int(running_date)))
+            is_new &= (start_dates > since).to_numpy()
+        keep = is_new | df.index.isin(changed.index)  # Keeps those plus the corrected rows (any date)
+        not_dated = keep & start_dates.isna().to_numpy()  # Inserted / corrected rows without a readable start date
+        if not_dated.any():
+            Log.Log_Error(global_log_file, f"{source}: {int(not_dated.sum())} row(s) skipped, start date not readable "
+                                           f"(sheet rows {', '.join(str(i + 1) for i in df.index[not_dated])})")
+        df = df[keep & ~not_dated]
+        df[start_date_col] = start_dates[df.index].apply(lambda x: x.strftime('%Y-%m-%d %H:%M:%S'))  # Formats the date in this column
     else:  # If the field is not in the configuration
         Log.Log_Error(global_log_file, "key_Start_Date_Time not found in fields configuration")  # Logs an error
         # Extract values from the DataFrame based on the fields configuration
@@ -142,7 +131,7 @@ def process_excel_file(file_path: str, sheet_name: str, data_columns, running_re
         df1.columns = list(extracted_values.keys())  # Sets the column names to the keys of extracted_values
     else:
         Log.Log_Error(global_log_file, "Required fields are missing in the fields configuration")  # Logs an error
-        return
+        return False
     df1 = df1.reset_index(drop=True)
 
     # Split the 'key_Serial_Number' column by '/' and generate new rows
@@ -185,6 +174,9 @@ def process_excel_file(file_path: str, sheet_name: str, data_columns, running_re
         # Adds corresponding columns and puts values into the DataFrame
     # Drop rows with any NaN values in df1
     df1 = df1.dropna().reset_index(drop=True)
+    if df1.empty:  # Nothing left to output from the new rows
+        Log.Log_Info(global_log_file, "No valid rows in the new data, CSV/XML not created")
+        return True
     # Save df1 to a CSV file in the specified output path
 
     df1.rename(columns={'key_Start_Date_Time': 'Start_Date_Time'}, inplace=True)
@@ -202,18 +194,25 @@ def process_excel_file(file_path: str, sheet_name: str, data_columns, running_re
     df1.rename(columns={'key_Coating_Type': 'Coating_Type'}, inplace=True)
     df1.rename(columns={'key_Reflectivity': 'Reflectivity'}, inplace=True)
     df1.rename(columns={'key_SORTNUMBER': 'SORTNUMBER'}, inplace=True)
+    df1 = emitted.filter_new(df1, key_columns=['Serial_Number', 'Start_Date_Time'], ignore_columns=['SORTNUMBER'])  # Drops the rows an earlier CSV already contained
+    if df1.empty:  # Every row was uploaded before
+        Log.Log_Info(global_log_file, "All rows were already emitted, CSV/XML not created")
+        return True
     
     current_time = datetime.now().strftime("%Y%m%d%H%M")  # Gets the current time and formats it as YYYYMMDDHHMM
     random_suffix = f"{random.randint(0, 60):02}"  # Generate a random number between 0 and 60, formatted as two digits
     current_time = current_time + random_suffix  # Append the random number to the current_time string
     csv_output_path = os.path.join(config.get('Paths', 'CSV_path'), f"TAK_SPC_{current_time}.csv")
-    df1.to_csv(csv_output_path, index=False, encoding='utf-8-sig')
-    Log.Log_Info(global_log_file, f"CSV file saved at {csv_output_path}")
-    generate_xml(output_path, site, product_family, operation, Test_Station, current_time, config,csv_output_path)  # Calls generate_xml to generate the XML file
-    Log.Log_Info(global_log_file, "Write the next starting line number")  # Logs the message for the next starting line number
+    df1.to_csv(stage.path(csv_output_path), index=False, encoding='utf-8-sig')  # Written to the local staging folder
+    Log.Log_Info(global_log_file, f"CSV file staged for {csv_output_path}")
+    generate_xml(output_path, site, product_family, operation, Test_Station, current_time, config, csv_output_path, stage)  # Calls generate_xml to generate the XML file
+    emitted.record(df1)  # Remembers the fingerprints of the written rows
+    store.update(operation, source, sheet_name, last_time=df1['Start_Date_Time'].max())  # Records the newest output time
+    return True
 
 def generate_xml(output_path: str, site: str, product_family: str,
-                 operation: str, Test_Station: str, current_time: str, config: ConfigParser, csv_output_path:str ) -> None:  # Defines the generate_xml function to generate XML files
+                 operation: str, Test_Station: str, current_time: str, config: ConfigParser, csv_output_path: str,
+                 stage: Output_Stage.OutputStage) -> None:  # Defines the generate_xml function to generate XML files
     """Generates an XML file."""  # Function description: Generates an XML file based on the passed data
     from datetime import datetime  # Imports the datetime module
     # Store current time in two different formats
@@ -232,7 +231,7 @@ def generate_xml(output_path: str, site: str, product_family: str,
     ).replace(':', '.').replace('/', '-').replace('\\', '-')
     xml_filepath = os.path.join(output_path, xml_filename)  # Constructs the full path for the XML file
 
-    with open(xml_filepath, 'w', encoding='utf-8') as f:  # Opens the XML file in write mode
+    with open(stage.path(xml_filepath, after=csv_output_path), 'w', encoding='utf-8') as f:  # Opens the staged XML file, published after its CSV
         f.write('<?xml version="1.0" encoding="utf-8"?>\n')  # Writes the XML declaration
         f.write('<Results xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xmlns:xsd="http://www.w3.org/2001/XMLSchema">\n')  # Writes the root element start tag
         f.write(f'    <Result startDateTime="{current_time_iso}" endDateTime="{current_time_iso}" Result="Passed">\n')  # Writes the Result element and its attributes
@@ -245,9 +244,9 @@ def generate_xml(output_path: str, site: str, product_family: str,
         f.write('        </TestStep>\n')  # Writes the TestStep element end tag
         f.write('    </Result>\n')  # Writes the Result element end tag
         f.write('</Results>\n')  # Writes the root element end tag
-    Log.Log_Info(global_log_file, f"XML File Created: {xml_filepath}")  # Logs the successful creation of the XML file
+    Log.Log_Info(global_log_file, f"XML File staged for: {xml_filepath}")  # Logs the successful creation of the XML file
 
-def process_ini_file(config_path: str) -> None:  # Defines the process_ini_file function to handle .ini configuration files
+def process_ini_file(config_path: str, store: State_Store.StateStore) -> None:  # Defines the process_ini_file function to handle .ini configuration files
     """Reads the specified .ini file and performs Excel and XML processing."""  # Function description: Executes relevant processing based on the configuration file
     global global_log_file  # Uses the global variable global_log_file
     config = ConfigParser()  # Creates a ConfigParser object to parse the configuration file
@@ -261,7 +260,7 @@ def process_ini_file(config_path: str) -> None:  # Defines the process_ini_file
     try:  # Tries to get various configurations from the config file
         input_paths = [path.strip() for path in config.get('Paths', 'input_paths').splitlines() if path.strip() and not path.strip().startswith('#')]  # Gets the list of input paths, filtering out empty and comment lines
         output_path = config.get('Paths', 'output_path')  # Gets the output path
-        running_rec = config.get('Paths', 'running_rec')  # Gets the running record file path
+        running_rec = config.get('Paths', 'running_rec')  # Gets the old running record file path (imported into the state store once)
         sheet_name = config.get('Excel', 'sheet_name')  # Gets the Excel sheet name
         data_columns = config.get('Excel', 'data_columns')  # Gets the data columns to be read
         log_path = config.get('Logging', 'log_path')  # Gets the log storage path
@@ -271,6 +270,8 @@ def process_ini_file(config_path: str) -> None:  # Defines the process_ini_file
         operation = config.get('Basic_info', 'Operation')  # Gets the operation name
         Test_Station = config.get('Basic_info', 'TestStation')  # Gets the test station information
         file_name_pattern = config.get('Basic_info', 'file_name_pattern')  # Gets the file name matching pattern
+        running_date = config.getint('Basic_info', 'Running_date')  # Gets the output window in days (also the emit index retention)
+        change_log = config.get('Paths', 'change_log', fallback='./Change_Log.csv')  # Gets the change log of the corrected rows
 
     except NoSectionError as e:  # If a section is missing in the configuration
         Log.Log_Error(global_log_file, f"Missing section in config file {config_path}: {e}")  # Logs an error
@@ -287,6 +288,7 @@ def process_ini_file(config_path: str) -> None:  # Defines the process_ini_file
     global_log_file = log_file  # Updates the global variable global_log_file
     setup_logging(global_log_file)  # Calls setup_logging to configure logging
     Log.Log_Info(log_file, f"Program Start for config {config_path}")  # Logs the program start message
+    store.import_running_rec(operation, running_rec)  # Imports the old running record once
 
     fields = {}  # Initializes the field configuration dictionary
     for field in fields_config:  # Iterates through each line of the field configuration
@@ -294,28 +296,74 @@ def process_ini_file(config_path: str) -> None:  # Defines the process_ini_file
             key, col, dtype = field.split(':')  # Splits the line to get the key, column number, and data type
             fields[key.strip()] = (col.strip(), dtype.strip())  # Stores the configuration in the dictionary
 
+    manifest = Source_Manifest.SourceManifest(  # Manifest of already processed source files (size, mtime, hash)
+        config.get('Paths', 'source_manifest', fallback='./Source_Manifest.json'),
+        scope=os.path.basename(config_path),
+        force_refresh=Source_Manifest.force_refresh_requested(config))
+    emitted = Emit_Index.EmitIndex(  # Fingerprints of the rows already uploaded (--force-emit emits all rows again)
+        config.get('Paths', 'emit_index', fallback=Emit_Index.DEFAULT_PATH),
+        scope=os.path.basename(config_path), retention_days=running_date,
+        force=Emit_Index.force_emit_requested(config))
+    copier = Copy_Stage.from_config(config)  # Copies the sources into DataFile (identical copies are skipped)
+    diff = Snapshot_Diff.SnapshotDiff(  # Previous snapshot of the rows read from every workbook
+        config.get('Paths', 'snapshot_diff', fallback=Snapshot_Diff.DEFAULT_PATH),
+        scope=os.path.basename(config_path), change_log=change_log,
+        force=Emit_Index.force_emit_requested(config))
+    stage = Output_Stage.OutputStage(  # CSV/XML are written to a local staging folder and published to the share in one batch
+        config.get('Paths', 'staging_path',
+                   fallback=os.path.join(config.get('Paths', 'copy_destination_path').strip(), '_staging')),
+        workers=config.getint('Paths', 'publish_workers', fallback=4))
+
     for input_path in input_paths:  # Iterates through all input paths
         print(input_path)  # Prints the currently processed input path,
         files = glob.glob(os.path.join(input_path, file_name_pattern))  # Gets the file list based on the matching pattern
         files = [file for file in files if not os.path.basename(file).startswith('~$')]  # Filters out temporary files
         if not files:  # If no files are found
             Log.Log_Error(global_log_file, f"Can't find Excel file in {input_path} with pattern {file_name_pattern}")  # Logs an error
+        changed_files = []  # Files modified since the last successful run
         for file in files:  # Iterates through each matched file
-            if not os.path.basename(file).startswith('~$'):  # If the filename does not start with '~$'
-                destination_dir = config.get('Paths', 'copy_destination_path')  # Gets the destination directory from the [Paths] section of the ini file
-                if not os.path.exists(destination_dir):  # If the destination directory does not exist
-                    os.makedirs(destination_dir)  # Creates the destination directory
-                shutil.copy(file, destination_dir)  # Copies the file to the destination directory
-                Log.Log_Info(global_log_file, f"Copy excel file {file} to ../DataFile/047_TAK_SPC/")  # Logs the file copy message
-                copied_file_path = os.path.join(destination_dir, os.path.basename(file))  # Constructs the full path of the copied file
-                process_excel_file(copied_file_path, sheet_name, data_columns, running_rec,
-                                   output_path, fields, site, product_family, operation, Test_Station, config)  # Processes the Excel file
+            if manifest.is_unchanged(file) and not emitted.force:  # Source not modified since the last successful run (--force-emit parses it anyway)
+                Log.Log_Info(global_log_file, f"Source unchanged, skip copy and parse: {file}")
+                continue
+            changed_files.append(file)
+        destination_dir = config.get('Paths', 'copy_destination_path')  # Gets the destination directory from the [Paths] section of the ini file
+        for file, copied_file_path, error in copier.copy_many(changed_files, destination_dir):  # Copies the files concurrently, skipping identical copies
+            if error is not None:  # Copy failed after the retries
+                Log.Log_Error(global_log_file, f"Copy excel file {file} to {destination_dir} failed: {error}")
+                continue
+            Log.Log_Info(global_log_file, f"Copy excel file {file} to {destination_dir}")  # Logs the file copy message
+            if process_excel_file(copied_file_path, sheet_name, data_columns, store,
+                                  output_path, fields, site, product_family, operation, Test_Station, config,
+                                  emitted, diff, stage):  # Processes the Excel file
+                manifest.record(file, local_copy=copied_file_path, stat=copier.source_stat(copied_file_path))  # Remembers the source state from when it was copied
+            else:  # Outputs not written
+                diff.rollback(os.path.basename(file))  # Keeps the previous snapshot of this workbook
+    for final, error in stage.publish():  # CSVs first, then their XMLs (temp name + rename); failed files stay staged for the next run
+        Log.Log_Error(global_log_file, f"Publishing {final} failed, kept for the next run: {error}")
+    Log.Log_Info(global_log_file, stage.summary())  # Logs the published / failed file counts
+    if stage.lost:  # A staged file disappeared: its rows are output again by the next run, so no state is saved
+        Log.Log_Error(global_log_file, f"{stage.lost} staged file(s) lost, run state of {config_path} not saved")
+        store.rollback()
+        emitted.rollback()
+        diff.rollback()
+    else:
+        manifest.save()  # Persists the manifest
+        store.commit()  # Commits the last output times of this ini in one transaction (outputs are published)
+        emitted.commit()  # Stores the fingerprints of the written rows and evicts the ones older than Running_date
+        diff.commit()  # Stores the new snapshots and appends the change log
+    Log.Log_Info(global_log_file, emitted.summary())  # Logs the emitted / dropped row counts
+    emitted.close()  # Closes the emit index
+    Log.Log_Info(global_log_file, diff.summary())  # Logs the inserted / changed / deleted row counts
+    diff.close()  # Closes the snapshot store
+    Log.Log_Info(global_log_file, copier.summary())  # Logs the copied / skipped files and the copy times
 
 def main() -> None:  # Defines the main function
     """Scans all .ini files and executes processing."""  # Function description: Iterates through all .ini files in the current directory and processes them according to the configuration
     ini_files = glob.glob("*.ini")  # Gets a list of all .ini files in the current directory
-    for ini_file in ini_files:  # Iterates through each .ini file
-        process_ini_file(ini_file)  # Processes the .ini file
+    with State_Store.StateStore() as store:  # Opens the shared state store (../DataFile/State_Store.sqlite)
+        for ini_file in ini_files:  # Iterates through each .ini file
+            process_ini_file(ini_file, store)  # Processes the .ini file
+        Log.Log_Info(global_log_file, store.summary())  # Logs how many state entries were committed
 
 if __name__ == '__main__':  # If this module is run as the main program
     main()  # Calls the main function
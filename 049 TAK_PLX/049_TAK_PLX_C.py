@@ -1,14 +1,3 @@
-好的，完全理解。
-
-這個要求很合理，可以將「給開發者看的註解」和「程式執行時給使用者看的訊息」兩者分開。
-
-我將修改上一版的程式碼，**僅將 `logging` 和 `print` 函數中的訊息改回英文**，同時**完整保留為了程式碼交接所寫的繁體中文註解**。
-
-這樣一來，程式碼本身的可讀性（中文註解）和執行日誌的標準化（英文輸出）都能兼顧。
-
-以下是修改後的最終版本：
-
-```python
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 """
@@ -20,16 +9,21 @@ Serial_Number_a/b/c 以及 AssignRate_a/b/c，並以 Excel 區段 Data_Row 動
 import os
 import sys
 import glob
-import shutil
 import logging
 import random
-import xml.etree.ElementTree as ET
-from xml.dom import minidom
 from datetime import datetime, timedelta
 from configparser import ConfigParser, NoSectionError, NoOptionError
 from typing import List, Dict, Any
 import pandas as pd
 
+sys.path.append('../MyModule')
+import Source_Manifest  # 記錄已處理過的來源檔 (size / mtime / hash)，未變更則略過
+import Xml_Writer  # 單次輸出、已跳脫與縮排的 Results XML
+import Output_Stage  # CSV / XML 先寫入本機暫存，再批次發佈 (暫存名 + rename) 到共用資料夾
+import Emit_Index  # 已上傳資料列的指紋索引，避免每次重複輸出同一段期間的資料
+import Snapshot_Diff  # 與活頁簿上一次的快照依列鍵比對，找出新增 / 修正的資料列
+import Copy_Stage  # 來源檔複製：略過目的地已有的相同檔案，平行複製並重試
+
 # ---------------------------------------------------------------------------
 # 公用函式
 # ---------------------------------------------------------------------------
@@ -73,9 +67,13 @@ def process_excel_file(
     operation: str,
     test_station: str,
     running_date: int,
-) -> None:
+    stage: Output_Stage.OutputStage,
+    emitted: Emit_Index.EmitIndex,
+    diff: Snapshot_Diff.SnapshotDiff,
+) -> bool:
     """
     核心處理函式：依設定讀取 Excel、清理與轉換資料、轉存 CSV，並產生對應的 XML。
+    讀取失敗時回傳 False；處理完成 (包含無新資料) 時回傳 True。
     """
 
     logging.info(f"Processing Excel file: {excel_file}")
@@ -98,7 +96,7 @@ def process_excel_file(
         df["key_SORTNUMBER"] = df.index + data_row
     except Exception as e:
         logging.error(f"Error reading {excel_file}: {e}")
-        return # 發生錯誤，中斷此檔案的處理
+        return False # 發生錯誤，中斷此檔案的處理
 
     # -------------------------------------------------------------------
     # 1.1) 篩選與格式化 Part_Number
@@ -126,7 +124,7 @@ def process_excel_file(
     # 如果篩選後沒有任何資料，則記錄日誌並跳過此檔案
     if df.empty:
         logging.info(f"No valid data rows left in {excel_file} after filtering for 'QJ' Part_Number. Skipping file.")
-        return
+        return True
 
     # -------------------------------------------------------------------
     # 2) 動態欄位對應
@@ -173,7 +171,7 @@ def process_excel_file(
     # 如果清理後已無資料，則跳過此檔案
     if df1.empty:
         logging.info(f"No data left for {excel_file} after type validation. Skipping file.")
-        return
+        return True
 
     # 依需求，處理 Serial_Number 欄位，只保留 '(' 前的內容
     serial_cols = [col for col in df1.columns if col.startswith("key_Serial_Number_")]
@@ -226,7 +224,7 @@ def process_excel_file(
     # 如果轉換後沒有任何有效的紀錄，則跳過此檔案
     if not melted_rows:
         logging.info(f"No valid serial numbers found in {excel_file} to melt. Skipping file.")
-        return
+        return True
 
     # 將轉換後的長表資料 list of dicts 轉回 DataFrame
     df_final = pd.DataFrame(melted_rows)
@@ -240,17 +238,25 @@ def process_excel_file(
     # 移除無法成功轉換的日期 (結果會是 NaT - Not a Time)
     df_final.dropna(subset=["Start_Date_Time"], inplace=True)
 
+    # 與此活頁簿上一次的快照依列鍵比對：新增的資料列仍依 Running_date 過濾，
+    # 被修正的資料列不論日期都輸出 (修正內容記錄於 change log)
+    df_final, changed = diff.compare(
+        os.path.basename(excel_file), df_final,
+        key_columns=["Start_Date_Time", "Serial_Number", "Location"], ignore_columns=["SORTNUMBER"],
+    )
+
     # 根據 ini 中的 running_date 設定進行日期過濾
     if running_date > 0:
         # 計算截止日期
         cutoff_date = datetime.now() - timedelta(days=running_date)
         # 只保留大於等於截止日期的資料
         df_final = df_final[df_final["Start_Date_Time"].dt.date >= cutoff_date.date()]
+    df_final = pd.concat([df_final, changed]).sort_index()
 
     # 檢查過濾後是否還有資料
     if df_final.empty:
-        logging.info(f"No data left for {excel_file} after date filtering. Skipping file.")
-        return
+        logging.info(f"No inserted or changed rows left for {excel_file} after date filtering. Skipping file.")
+        return True
 
     # -------------------------------------------------------------------
     # 4.2) 最終格式化
@@ -260,6 +266,14 @@ def process_excel_file(
     # 增加 PL_Tool 固定欄位
     df_final["PL_Tool"] = pl_tool
 
+    # 只保留先前 CSV 未上傳過的資料列 (依 Emit_Index 指紋)
+    df_final = emitted.filter_new(
+        df_final, key_columns=["Serial_Number", "Start_Date_Time", "Location"], ignore_columns=["SORTNUMBER"]
+    )
+    if df_final.empty:
+        logging.info(f"All rows of {excel_file} were already emitted. Skipping file.")
+        return True
+
     # -------------------------------------------------------------------
     # 5) 輸出 CSV
     # -------------------------------------------------------------------
@@ -267,17 +281,18 @@ def process_excel_file(
     ts = datetime.now().strftime("%Y%m%d%H%M") + f"{random.randint(0,60):02}"
     csv_name = f"TAK_PLX_{ts}.csv"
     csv_path = os.path.join(csv_base_path, csv_name)
-    # 確保 CSV 輸出目錄存在
-    os.makedirs(os.path.dirname(csv_path), exist_ok=True)
-    # 將最終的 DataFrame 寫入 CSV 檔案
-    df_final.to_csv(csv_path, index=False, encoding="utf-8-sig") # index=False 不寫入索引欄
+    # 將最終的 DataFrame 寫入 CSV 的本機暫存檔 (發佈時才放到 csv_path)
+    df_final.to_csv(stage.path(csv_path), index=False, encoding="utf-8-sig") # index=False 不寫入索引欄
     logging.info(f"CSV saved: {csv_path}")
 
     # -------------------------------------------------------------------
     # 6) 產生 XML
     # -------------------------------------------------------------------
     # 呼叫 XML 生成函式
-    generate_xml(output_path, site, product_family, operation, test_station, ts, csv_path)
+    generate_xml(output_path, site, product_family, operation, test_station, ts, csv_path, stage)
+    # 記錄已輸出資料列的指紋，發佈後才寫入索引
+    emitted.record(df_final)
+    return True
 
 
 # ---------------------------------------------------------------------------
@@ -292,10 +307,9 @@ def generate_xml(
     test_station: str,
     serial_no: str, # 這裡的 serial_no 來自上面產生的時間戳 ts
     csv_path: str,
+    stage: Output_Stage.OutputStage,
 ) -> None:
-    """根據傳入的參數，產生標準格式的 XML 檔案。"""
-    # 確保 XML 輸出目錄存在
-    os.makedirs(output_path, exist_ok=True)
+    """根據傳入的參數，產生標準格式的 XML 檔案 (寫入暫存，發佈順序在其 CSV 之後)。"""
     # 獲取當前時間的 ISO 格式字串
     now_iso = datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
     # 組合 XML 檔名，並將檔名中的 ':' 替換為 '.' 以符合某些系統規範
@@ -304,41 +318,21 @@ def generate_xml(
         f"Site={site},ProductFamily={product_family},Operation={operation},Serialnumber={serial_no},Testdate={now_iso}.xml".replace(":", ".")
     )
 
-    # 使用 xml.etree.ElementTree 建立 XML 結構
-    # 根節點
-    results = ET.Element("Results")
-    # 子節點 Result
-    result = ET.SubElement(
-        results, "Result", startDateTime=now_iso, endDateTime=now_iso, Result="Passed"
-    )
-    # Header 節點
-    ET.SubElement(
-        result,
-        "Header",
-        SerialNumber=serial_no,
-        PartNumber="UNKNOWNPN",
-        Operation=operation,
-        TestStation=test_station,
-        Operator="NA",
-        Site=site,
-    )
-    # HeaderMisc 節點
-    header_misc = ET.SubElement(result, "HeaderMisc")
-    ET.SubElement(header_misc, "Item", Description="")
-    # TestStep 節點
-    test_step = ET.SubElement(
-        result, "TestStep", Name=operation, startDateTime=now_iso, endDateTime=now_iso, Status="Passed"
-    )
-    # Data 節點，其 Value 指向剛才生成的 CSV 檔案路徑
-    ET.SubElement(
-        test_step, "Data", DataType="Table", Name=f"tbl_{operation.upper()}", Value=csv_path, CompOperation="LOG"
+    # 以 Xml_Writer 單次輸出 XML (Header / HeaderMisc / 指向 CSV 的 TestStep)，不經 minidom 美化
+    header = {
+        "SerialNumber": serial_no,
+        "PartNumber": "UNKNOWNPN",
+        "Operation": operation,
+        "TestStation": test_station,
+        "Operator": "NA",
+        "Site": site,
+    }
+    xml_bytes = Xml_Writer.pointer_document(
+        header, operation, csv_path, now_iso,
+        header_misc=[{"Description": ""}], namespaces=False, indent="   ",
     )
-
-    # 使用 xml.dom.minidom 將產生的 XML 字串進行美化 (縮排)
-    xml_str = minidom.parseString(ET.tostring(results)).toprettyxml(indent="   ", encoding="utf-8")
-    # 將美化後的 XML 內容以二進位模式寫入檔案
-    with open(xml_file, "wb") as f:
-        f.write(xml_str)
+    # 將 XML 內容以二進位模式寫入暫存檔；after=csv_path 確保 CSV 先發佈
+    Xml_Writer.write_file(stage.path(xml_file, after=csv_path), xml_bytes)
 
     logging.info(f"XML saved: {xml_file}")
 
@@ -397,19 +391,60 @@ def process_ini_file(config_path: str) -> None:
         key, col, dtype = (s.strip() for s in line.split(":"))
         fields_cfg[key] = (col, dtype)
 
+    # 來源檔 manifest：來源未變更時連複製與讀取都略過
+    # 強制重新處理：命令列加上 --force-refresh 或 [Options] force_refresh = true
+    manifest = Source_Manifest.SourceManifest(
+        cfg.get("Paths", "source_manifest", fallback="./Source_Manifest.json"),
+        scope=os.path.basename(config_path),
+        force_refresh=Source_Manifest.force_refresh_requested(cfg),
+    )
+
+    # 本機暫存資料夾 (staging_path 留空則直接寫入共用資料夾)
+    stage = Output_Stage.OutputStage(
+        cfg.get("Paths", "staging_path",
+                fallback=os.path.join(cfg.get("Paths", "copy_destination_path", fallback="../DataFile/049/TAK_PLX/").strip(), "_staging")),
+        workers=cfg.getint("Paths", "publish_workers", fallback=4),
+    )
+
+    # 已上傳資料列的指紋索引；保留天數與 Running_date 相同
+    # 強制全部重新輸出：命令列加上 --force-emit 或 [Options] force_emit = true
+    emitted = Emit_Index.EmitIndex(
+        cfg.get("Paths", "emit_index", fallback=Emit_Index.DEFAULT_PATH),
+        scope=os.path.basename(config_path),
+        retention_days=running_date,
+        force=Emit_Index.force_emit_requested(cfg),
+    )
+    # 每個活頁簿上一次的快照 (../DataFile/Snapshot_Diff.sqlite)，修正內容寫入 change_log
+    diff = Snapshot_Diff.SnapshotDiff(
+        cfg.get("Paths", "snapshot_diff", fallback=Snapshot_Diff.DEFAULT_PATH),
+        scope=os.path.basename(config_path),
+        change_log=cfg.get("Paths", "change_log", fallback="./Change_Log.csv"),
+        force=Emit_Index.force_emit_requested(cfg),
+    )
+
+    # 來源檔複製：大小與修改時間 (copy_verify_hash = true 時含雜湊) 相同的檔案不再複製
+    copier = Copy_Stage.from_config(cfg)
+
     # 處理所有設定的輸入路徑
     for ipath in input_paths:
         # 根據檔案名稱模式搜尋符合的檔案
         matched_files = glob.glob(os.path.join(ipath, file_pattern))
+        changed_files = []
         for f in matched_files:
+            if manifest.is_unchanged(f):
+                logging.info(f"Source unchanged since last run, skipped: {f}")
+                continue
+            changed_files.append(f)
+        # 平行複製檔案到指定的備份/處理目錄 (目的地已有相同檔案則略過，失敗會重試)
+        dst_dir = cfg.get("Paths", "copy_destination_path")
+        for f, copied, error in copier.copy_many(changed_files, dst_dir):
+            if error is not None:
+                logging.error(f"Copying {f} to {dst_dir} failed: {error}")
+                continue
             try:
-                # 複製檔案到指定的備份/處理目錄
-                dst_dir = cfg.get("Paths", "copy_destination_path")
-                os.makedirs(dst_dir, exist_ok=True)
-                copied = shutil.copy(f, dst_dir)
                 logging.info(f"Copied file {f} -> {copied}")
-                # 呼叫核心函式來處理這個複製後的檔案
-                process_excel_file(
+                # 呼叫核心函式來處理這個複製後的檔案，成功後才記錄到 manifest
+                ok = process_excel_file(
                     copied,
                     sheet_name,
                     data_columns,
@@ -423,10 +458,37 @@ def process_ini_file(config_path: str) -> None:
                     operation,
                     test_station,
                     running_date,
+                    stage,
+                    emitted,
+                    diff,
                 )
+                if ok:
+                    manifest.record(f, local_copy=copied, stat=copier.source_stat(copied))
+                else:
+                    diff.rollback(os.path.basename(f))
             except Exception as e:
+                diff.rollback(os.path.basename(f))
                 logging.error(f"An unexpected error occurred while processing file {f}: {e}")
                 # 即使單一檔案出錯，也繼續處理下一個檔案
+    logging.info(copier.summary())
+
+    # 批次發佈：先 CSV 再 XML；失敗的檔案留在暫存，下次執行再發佈
+    for final, error in stage.publish():
+        logging.error(f"Publish failed, kept for the next run: {final}: {error}")
+    logging.info(stage.summary())
+
+    # 暫存檔遺失時不記錄 manifest、指紋與快照 (這些來源與資料列下次重新輸出)；其餘發佈失敗的檔案仍在暫存中
+    if stage.lost:
+        emitted.rollback()
+        diff.rollback()
+    else:
+        manifest.save()
+        emitted.commit()
+        diff.commit()
+    logging.info(emitted.summary())
+    logging.info(diff.summary())
+    emitted.close()
+    diff.close()
 
 def main() -> None:
     """程式主進入點。"""
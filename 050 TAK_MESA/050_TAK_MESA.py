@@ -1,8 +1,8 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 """
-Version: 1.1.0
-Last Modified: 2025-07-18
+Version: 1.6.0
+Last Modified: 2026-10-16
 
 Description:
 A generic script to process specific data ranges from Excel files based on configurations
@@ -10,6 +10,11 @@ provided in INI files. The script is designed to be modular, processing each INI
 found in its directory as a separate task.
 
 Changelog:
+[V1.6.0]: Stage the CSV/XML locally and publish them to the share in one batch, CSV before its XML (Output_Stage).
+[V1.5.0]: Write the pointer XML with the shared single-pass writer (Xml_Writer).
+[V1.4.0]: Copy the sources concurrently and skip copies identical to the source (Copy_Stage).
+[V1.3.0]: Output only the rows inserted or corrected since the previous snapshot of the workbook (Snapshot_Diff).
+[V1.2.0]: Skip source files that are unchanged since the last successful run (Source_Manifest).
 [V1.1.0]: Re-implemented the Running_date filter to retain only recent data.
 [V1.0.0]: Initial stable release with English comments and all features.
 """
@@ -17,19 +22,24 @@ Changelog:
 import os
 import sys
 import glob
-import shutil
 import logging
 import random
 import re
 import traceback
 import numpy as np
-import xml.etree.ElementTree as ET
-from xml.dom import minidom
 from datetime import datetime, timedelta
 from configparser import ConfigParser, NoSectionError, NoOptionError
 from typing import List, Dict, Any, Optional, Tuple
 import pandas as pd
 
+sys.path.append('../MyModule')
+import Source_Manifest
+import Xml_Writer
+import Output_Stage
+import Emit_Index
+import Snapshot_Diff
+import Copy_Stage
+
 # ---------------------------------------------------------------------------
 # Utility Functions
 # ---------------------------------------------------------------------------
@@ -92,10 +102,14 @@ def process_excel_file(
     source_config: Dict[str, Any],
     fields_config: Dict[str, Tuple[str, str]],
     basic_info: Dict[str, Any],
-    paths: Dict[str, str]
-) -> None:
+    paths: Dict[str, str],
+    stage: Output_Stage.OutputStage,
+    diff: Snapshot_Diff.SnapshotDiff
+) -> bool:
     """
     Reads data from a single source within an Excel file, processes it, and generates outputs.
+    Returns False when the file could not be read or sliced, True otherwise (also when
+    no rows were left to output).
     """
     sheet_pattern = source_config['sheet_pattern']
     output_prefix = source_config['output_prefix']
@@ -108,7 +122,7 @@ def process_excel_file(
         target_sheet = find_latest_sheet(all_sheets, sheet_pattern)
 
         if not target_sheet:
-            return
+            return False
 
         df_full = pd.read_excel(xls, sheet_name=target_sheet, header=None)
     except Exception as e:
@@ -116,7 +130,7 @@ def process_excel_file(
         print(f"\nERROR: {error_msg}")
         traceback.print_exc()
         logging.error(error_msg, exc_info=True)
-        return
+        return False
 
     try:
         start_cell = source_config['start_cell']
@@ -138,7 +152,7 @@ def process_excel_file(
 
         if df_sliced.empty:
             logging.warning(f"No data found in the specified range for sheet '{target_sheet}'.")
-            return
+            return True
 
         df_processed = df_sliced.T if should_transpose else df_sliced
 
@@ -148,7 +162,7 @@ def process_excel_file(
             error_msg = f"Column count mismatch. Expected {len(fields_config.keys())} columns but got {len(df_processed.columns)} for sheet '{target_sheet}'."
             print(f"\nERROR: {error_msg}")
             logging.error(error_msg)
-            return
+            return False
         
         first_col_name = list(fields_config.keys())[0]
         if first_col_name in df_processed.columns:
@@ -161,11 +175,11 @@ def process_excel_file(
         print(f"\nERROR: {error_msg}")
         traceback.print_exc()
         logging.error(error_msg, exc_info=True)
-        return
+        return False
 
     if df_processed.empty:
         logging.info(f"No valid data rows after initial processing for '{output_prefix}'. Skipping.")
-        return
+        return True
 
     # Perform strict data type validation for numeric columns.
     numeric_columns = []
@@ -183,9 +197,15 @@ def process_excel_file(
 
     if df_processed.empty:
         logging.info(f"No valid data rows left after strict type validation for '{output_prefix}'. Skipping.")
-        return
+        return True
+
+    # Compare with the previous snapshot of the workbook by row key. Only inserted rows
+    # (within Running_date) and corrected rows (any date) are output.
+    key_columns = [k.strip() for k in source_config.get('row_key', 'key_start_date_time, key_serial_number').split(',')
+                   if k.strip() in df_processed.columns]
+    df_processed, changed = diff.compare(os.path.basename(excel_file_path), df_processed, key_columns)
 
-    # Filter data based on Running_date from INI.
+    # Filter the inserted rows based on Running_date from INI.
     running_date = int(basic_info.get('running_date', 0))
     date_col_key = 'key_start_date_time'
     
@@ -211,9 +231,10 @@ def process_excel_file(
         if dropped_rows > 0:
             logging.info(f"Dropped {dropped_rows} rows older than {running_date} days or with invalid date format.")
 
+    df_processed = pd.concat([df_processed, changed]).sort_index()
     if df_processed.empty:
-        logging.info(f"No data left after date filtering for '{output_prefix}'. Skipping.")
-        return
+        logging.info(f"No inserted or changed rows left after date filtering for '{output_prefix}'. Skipping.")
+        return True
         
     # Custom transformation - Add 'X' prefix to specific part numbers.
     part_number_col_key = 'key_part_number'
@@ -234,9 +255,8 @@ def process_excel_file(
     ts = datetime.now().strftime("%Y%m%d%H%M") + f"{random.randint(10,99)}"
     csv_name = f"TAK_CVD_{output_prefix}_{ts}.csv"
     csv_path = os.path.join(paths['csv_path'], csv_name)
-    os.makedirs(os.path.dirname(csv_path), exist_ok=True)
-    df_processed.to_csv(csv_path, index=False, encoding="utf-8-sig")
-    logging.info(f"CSV for '{output_prefix}' saved to: {csv_path}")
+    df_processed.to_csv(stage.path(csv_path), index=False, encoding="utf-8-sig")
+    logging.info(f"CSV for '{output_prefix}' staged for: {csv_path}")
 
     # Generate the corresponding XML metadata file.
     part_number_col_clean = 'part_number'
@@ -246,17 +266,18 @@ def process_excel_file(
         serial_no=ts,
         part_number="UNKNOWPN",
         prefix=output_prefix,
-        basic_info=basic_info
+        basic_info=basic_info,
+        stage=stage
     )
+    return True
 
 # ---------------------------------------------------------------------------
 # XML Generation
 # ---------------------------------------------------------------------------
 def generate_xml(
     output_path: str, csv_path: str, serial_no: str, part_number: str,
-    prefix: str, basic_info: Dict[str, Any]
+    prefix: str, basic_info: Dict[str, Any], stage: Output_Stage.OutputStage
 ) -> None:
-    os.makedirs(output_path, exist_ok=True)
     now_iso = datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
     xml_file_name = (
         f"Site={basic_info['site']},"
@@ -267,23 +288,19 @@ def generate_xml(
         f"Testdate={now_iso}.xml"
     ).replace(":", ".")
     xml_file_path = os.path.join(output_path, xml_file_name)
-    results = ET.Element("Results", {"xmlns:xsi": "http://www.w3.org/2001/XMLSchema-instance", "xmlns:xsd": "http://www.w3.org/2001/XMLSchema"})
-    result = ET.SubElement(results, "Result", startDateTime=now_iso, endDateTime=now_iso, Result="Passed")
-    ET.SubElement(
-        result, "Header",
-        SerialNumber=serial_no, PartNumber=part_number,
-        Operation=f"{basic_info.get('operation', 'NA')}",
-        TestStation=basic_info.get('teststation', 'NA'),
-        Operator="NA", StartTime=now_iso, Site=basic_info.get('site', 'NA'),
-        LotNumber="", Quantity="",
-    )
-    ET.SubElement(result, "HeaderMisc").append(ET.Element("Item", Description=""))
-    test_step = ET.SubElement(result, "TestStep", Name=f"{basic_info.get('operation', 'NA')}", startDateTime=now_iso, endDateTime=now_iso, Status="Passed")
-    ET.SubElement(test_step, "Data", DataType="Table", Name=f"tbl_{prefix.upper()}", Value=csv_path, CompOperation="LOG")
-    xml_str = minidom.parseString(ET.tostring(results)).toprettyxml(indent="  ", encoding="utf-8")
-    with open(xml_file_path, "wb") as f:
-        f.write(xml_str)
-    logging.info(f"XML for '{prefix}' saved to: {xml_file_path}")
+    operation = f"{basic_info.get('operation', 'NA')}"
+    header = {
+        "SerialNumber": serial_no, "PartNumber": part_number,
+        "Operation": operation,
+        "TestStation": basic_info.get('teststation', 'NA'),
+        "Operator": "NA", "StartTime": now_iso, "Site": basic_info.get('site', 'NA'),
+        "LotNumber": "", "Quantity": "",
+    }
+    # Staged after its CSV, so the pointer never reaches the share before the data
+    Xml_Writer.write_file(stage.path(xml_file_path, after=csv_path), Xml_Writer.pointer_document(
+        header, operation, csv_path, now_iso,
+        table_name=f"tbl_{prefix.upper()}", header_misc=[{"Description": ""}]))
+    logging.info(f"XML for '{prefix}' staged for: {xml_file_path}")
 
 # ---------------------------------------------------------------------------
 # INI Processing & Main Program
@@ -332,24 +349,76 @@ def run_process_from_ini(config_path: str) -> None:
         logging.error("No input_paths defined in the INI file.")
         print("ERROR: No input_paths defined in the INI file. Processing stopped.")
         return
-        
+
+    # Unchanged sources are skipped before copy/parse; --force-refresh or
+    # [Options] force_refresh = true processes them anyway.
+    manifest = Source_Manifest.SourceManifest(
+        paths.get("source_manifest", "./Source_Manifest.json"),
+        scope=os.path.basename(config_path),
+        force_refresh=Source_Manifest.force_refresh_requested(cfg),
+    )
+
+    # CSV / XML are written to a local staging folder and published to the share in one batch
+    stage = Output_Stage.OutputStage(
+        paths.get("staging_path", os.path.join(paths.get("copy_destination_path", "./copied_files/").strip(), "_staging")),
+        workers=int(paths.get("publish_workers", 4)))
+
+    # Previous snapshot of every workbook; corrections are written to the change log.
+    # --force-emit or [Options] force_emit = true outputs every row again.
+    diff = Snapshot_Diff.SnapshotDiff(
+        paths.get("snapshot_diff", Snapshot_Diff.DEFAULT_PATH),
+        scope=os.path.basename(config_path),
+        change_log=paths.get("change_log", "./Change_Log.csv"),
+        force=Emit_Index.force_emit_requested(cfg),
+    )
+
+    # Source copies into copy_destination_path ([Paths] copy_workers / copy_retries / copy_verify_hash)
+    copier = Copy_Stage.from_config(cfg)
+
     for ipath in input_paths:
         matched_files = glob.glob(os.path.join(ipath, file_pattern))
         logging.info(f"Found {len(matched_files)} files matching '{file_pattern}' in '{ipath}'.")
+        changed_files = []
         for f in matched_files:
+            if manifest.is_unchanged(f):
+                logging.info(f"Source unchanged since last run, skipped: {f}")
+                continue
+            changed_files.append(f)
+        # Copied concurrently; a destination identical to its source is not copied again
+        dst_dir = paths.get("copy_destination_path", "./copied_files/")
+        for f, copied_path, error in copier.copy_many(changed_files, dst_dir):
+            if error is not None:
+                logging.error(f"Copying {f} to {dst_dir} failed: {error}")
+                continue
             try:
-                dst_dir = paths.get("copy_destination_path", "./copied_files/")
-                os.makedirs(dst_dir, exist_ok=True)
-                copied_path = shutil.copy(f, dst_dir)
                 logging.info(f"Copied {f} -> {copied_path}")
 
-                process_excel_file(copied_path, source_config, fields_config, basic_info, paths)
+                if process_excel_file(copied_path, source_config, fields_config, basic_info, paths, stage, diff):
+                    manifest.record(f, local_copy=copied_path, stat=copier.source_stat(copied_path))
+                else:
+                    diff.rollback(os.path.basename(f))
             
             except Exception as e:
+                diff.rollback(os.path.basename(f))
                 error_msg = f"A critical error occurred while processing file {f}: {e}"
                 print(f"\nERROR: {error_msg}")
                 traceback.print_exc()
                 logging.error(error_msg, exc_info=True)
+    logging.info(copier.summary())
+
+    # CSVs first, then their XMLs (temp name + rename); failed files stay staged for the next run
+    for final, error in stage.publish():
+        logging.error(f"Publishing {final} failed, kept for the next run: {error}")
+    logging.info(stage.summary())
+
+    # A lost staged file is output again next run, so neither the manifest nor its snapshot is stored
+    if stage.lost:
+        diff.rollback()
+    else:
+        manifest.save()
+        diff.commit()
+    logging.info(diff.summary())
+    diff.close()
 
 def main() -> None:
     try:
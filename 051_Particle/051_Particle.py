@@ -5,15 +5,25 @@ import os
 import re
 import glob
 import logging
-import shutil
+import time
 from pathlib import Path
 from datetime import datetime, date
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from configparser import ConfigParser
 import sys
 
+import numpy as np
 import pandas as pd
-import xml.etree.ElementTree as ET
-from xml.dom import minidom
+
+sys.path.append('../MyModule')
+import Parse_Cache
+import Xml_Writer
+import Output_Stage
+import Copy_Stage
+import Blob_Store
+
+BACKFILL_ARG = "--backfill"
 
 EXPECTED_HEADERS = [
     "No","tNo","ResTime","SenID","SenName","PtNo","PtName",
@@ -77,9 +87,6 @@ def _sanitize_filename_component(s: str, fallback: str) -> str:
     s2 = re.sub(r'[<>:"/\\|?*\x00-\x1F]', '_', s)
     return s2 if s2.strip('_ ').strip() else fallback
 
-def _prettify(elem: ET.Element) -> bytes:
-    return minidom.parseString(ET.tostring(elem)).toprettyxml(indent="  ", encoding="utf-8")
-
 def generate_pointer_xml(
     output_path: Path,
     csv_path: Path,
@@ -90,12 +97,15 @@ def generate_pointer_xml(
     serial_no: str,   # already generated <Prefix><YYMMDD>
     part_no: str,
     result_value: str,
-    teststep_status_value: str
+    teststep_status_value: str,
+    stage: Output_Stage.OutputStage = None
 ) -> Path:
     """
     Create XML (Results/Result/Header/TestStep/Data), where Data.Value points to the CSV path.
     Windows-safe filename: sanitize illegal characters; fallback to UNKNOWPN/NA when PN/SN are blank or illegal.
-    XML content still uses provided SN/PN (ElementTree escapes content).
+    XML content still uses provided SN/PN (Xml_Writer escapes content).
+    With a stage the file is written to the staging folder and published after the CSV;
+    the returned path is the final one.
     """
     now = datetime.now()
     now_iso_content = now.strftime("%Y-%m-%dT%H:%M:%S")  # Format for XML content
@@ -111,30 +121,15 @@ def generate_pointer_xml(
     xml_name = re.sub(r'[<>:"/\\|?*\x00-\x1F]', '_', raw_name)
     xml_fp = Path(output_path) / xml_name
 
-    results = ET.Element("Results", {
-        "xmlns:xsi": "http://www.w3.org/2001/XMLSchema-instance",
-        "xmlns:xsd": "http://www.w3.org/2001/XMLSchema"
-    })
-    result = ET.SubElement(results, "Result", startDateTime=now_iso_content, endDateTime=now_iso_content, Result=result_value)
-    ET.SubElement(
-        result, "Header",
-        SerialNumber=(serial_no or "NA"),
-        PartNumber=(part_no or "UNKNOWPN"),
-        Operation=operation, TestStation=test_station,
-        Operator="NA", StartTime=now_iso_content, Site=str(site), LotNumber=""
-    )
-    tstep = ET.SubElement(
-        result, "TestStep",
-        Name=operation, startDateTime=now_iso_content, endDateTime=now_iso_content, Status=teststep_status_value
-    )
-    ET.SubElement(
-        tstep, "Data",
-        DataType="Table", Name=f"tbl_{operation.upper()}",
-        Value=str(csv_path), CompOperation="LOG"
-    )
-
-    with open(xml_fp, "wb") as f:
-        f.write(_prettify(results))
+    header = {
+        "SerialNumber": serial_no or "NA", "PartNumber": part_no or "UNKNOWPN",
+        "Operation": operation, "TestStation": test_station,
+        "Operator": "NA", "StartTime": now_iso_content, "Site": str(site), "LotNumber": "",
+    }
+    target = stage.path(xml_fp, after=csv_path) if stage is not None else xml_fp
+    Xml_Writer.write_file(target, Xml_Writer.pointer_document(
+        header, operation, csv_path, now_iso_content,
+        result=result_value, status=teststep_status_value))
     return xml_fp
 
 # ---------------- Directory scanning & picking ----------------
@@ -169,11 +164,8 @@ def debug_list_dir(d: str, patterns: list[str], max_show: int = 50):
         print(f"  - OSError: {e}")
         return []
 
-def pick_latest_two_days_files(input_dirs, patterns):
-    """
-    Picks all .xls files from the latest two available dates.
-    Returns a list of file paths.
-    """
+def list_dated_files(input_dirs, patterns):
+    """All YYYYMMDD*.xls files of the input dirs as (path, file_date, mtime)."""
     all_hits = []  # (path, file_date, mtime)
     for d in input_dirs:
         hits = debug_list_dir(d, patterns)
@@ -191,6 +183,14 @@ def pick_latest_two_days_files(input_dirs, patterns):
             all_hits.append((f, fdate, os.path.getmtime(f)))
 
     print(f"\nFiles matching YYYYMMDD.xls: {len(all_hits)}")
+    return all_hits
+
+def pick_latest_two_days_files(input_dirs, patterns):
+    """
+    Picks all .xls files from the latest two available dates.
+    Returns a list of file paths.
+    """
+    all_hits = list_dated_files(input_dirs, patterns)
     if not all_hits:
         return []
 
@@ -204,6 +204,11 @@ def pick_latest_two_days_files(input_dirs, patterns):
     selected_files = [c[0] for c in all_hits if c[1] in latest_two_dates]
     return selected_files
 
+def pick_all_files_by_date(input_dirs, patterns):
+    """Every .xls file of the archive, oldest date first (backfill)."""
+    all_hits = list_dated_files(input_dirs, patterns)
+    return [c[0] for c in sorted(all_hits, key=lambda c: (c[1], os.path.basename(c[0]), c[0]))]
+
 def pick_by_filename_closest_date(input_dirs, patterns):
     today = datetime.today().date()
     all_hits = []  # (path, file_date, mtime)
@@ -259,6 +264,27 @@ def build_serial_from_prefix(prefix: str, date_source: str | datetime = None) ->
     prefix = (prefix or "").strip()
     return f"{prefix}{yymmdd}" if prefix else yymmdd
 
+def to_datetime_column(values: pd.Series) -> pd.Series:
+    """
+    Column-wise pd.to_datetime(errors='coerce'). Values that do not fit the inferred
+    format are parsed again one by one (format='mixed'), as the old per-row parse did.
+    """
+    ts = pd.to_datetime(values, errors="coerce")
+    retry = ts.isna() & values.notna()
+    if retry.any() and not pd.api.types.is_datetime64_any_dtype(values):
+        ts.loc[retry] = pd.to_datetime(values[retry], errors="coerce", format="mixed")
+    return ts
+
+def build_serial_column(prefix: str, date_source: pd.Series) -> pd.Series:
+    """Vectorized build_serial_from_prefix: one <Prefix><YYMMDD> per row, today for unparsable dates."""
+    # Few distinct days: format each day once and broadcast; NaT (code -1) takes the last label = today
+    codes, days = pd.factorize(to_datetime_column(date_source).dt.normalize())
+    labels = np.append(pd.Series(days).dt.strftime("%y%m%d").to_numpy(dtype=object),
+                       datetime.today().strftime("%y%m%d"))
+    yymmdd = pd.Series(labels[codes], index=date_source.index, dtype=object)
+    prefix = (prefix or "").strip()
+    return prefix + yymmdd if prefix else yymmdd
+
 # ---------------- Optional header detection (fallback) ----------------
 def detect_header_row(df_like, expected=EXPECTED_HEADERS, min_hits=12):
     top = min(30, len(df_like))
@@ -270,8 +296,381 @@ def detect_header_row(df_like, expected=EXPECTED_HEADERS, min_hits=12):
             return r, r + 1
     return 0, 1
 
+# ---------------- Per-file read ----------------
+def read_particle_file(path: str, desired_sheet: str, cols: str, skiprows: int) -> pd.DataFrame:
+    """
+    Reads one particle workbook: picks the best matching sheet, reads it as strings
+    and falls back to header detection when the configured header row gives nothing.
+    """
+    # List sheets and choose best match
+    xls = pd.ExcelFile(path, engine="xlrd")  # .xls requires xlrd
+    sheets = xls.sheet_names
+    print(f"\nAvailable sheets: {sheets}")
+    norm = lambda s: re.sub(r"\s+", "", s).lower()
+    nd = norm(desired_sheet)
+    use_sheet = desired_sheet if desired_sheet in sheets else \
+                next((s for s in sheets if norm(s) == nd), None) or \
+                next((s for s in sheets if nd in norm(s)), sheets[0])
+    print(f"Using sheet: {use_sheet}")
+
+    # Read with header (as configured). If empty, try header detection.
+    df = pd.read_excel(
+        xls,
+        sheet_name=use_sheet,
+        header=0,
+        usecols=cols,
+        skiprows=skiprows - 1,
+        dtype=str  # Read all as string to avoid type inference issues
+    )
+
+    if df.empty:
+        raw = pd.read_excel(xls, sheet_name=use_sheet, header=None)
+        hdr_row, data_start = detect_header_row(raw, EXPECTED_HEADERS, min_hits=12)
+        print(f"Header auto-detected at row: {hdr_row+1} (data start: {data_start+1})")
+        df = pd.read_excel(xls, sheet_name=use_sheet, header=hdr_row, usecols=cols, dtype=str)
+    return df
+
+# ---------------- Frame processing ----------------
+def prepare_frame(df: pd.DataFrame, fmap: dict, enforce_today_restime: bool,
+                  operation: str, test_station: str, site: str, tool_name: str) -> pd.DataFrame:
+    """key_* mapping, optional 'ResTime == today' filter, system fields and final column names."""
+    # Apply key_* mapping to column names
+    if fmap and not df.empty:
+        rename_by_index = {}
+        for k, v in fmap.items():
+            idx = v["col"]
+            if 0 <= idx < len(df.columns):
+                rename_by_index[df.columns[idx]] = k
+        df = df.rename(columns=rename_by_index)
+
+    # Optional: enforce today's ResTime
+    if enforce_today_restime and "key_ResTime" in df.columns and not df.empty:
+        before = len(df)
+        is_today = to_datetime_column(df["key_ResTime"]).dt.normalize() == pd.Timestamp(date.today())
+        df = df[is_today].copy()
+        print(f"Filter 'ResTime == today' enabled: kept {len(df)}/{before} rows")
+
+    # Inject system/ManualAssign fields
+    if not df.empty:
+        df["Operation"] = operation
+        df["TestStation"] = test_station
+        df["Site"] = site
+        df["key_Tool_name"] = tool_name
+
+        rename_map = {"key_ResTime": "Start_Date_Time", "key_Tool_name": "DeviceSerialNumber"}
+        for c in list(df.columns):
+            if c.startswith("key_") and c not in rename_map:
+                rename_map[c] = c.replace("key_", "", 1)
+        df = df.rename(columns=rename_map)
+    return df
+
+RESAMPLE_STATS = ("max", "mean", "p95", "count_over")
+
+def can_resample(df: pd.DataFrame, time_interval) -> bool:
+    return time_interval is not None and "PtName" in df.columns and "Start_Date_Time" in df.columns and not df.empty
+
+def read_resample_options(cfg: ConfigParser) -> dict:
+    """[Options] resample_stats / resample_channels / count_over_threshold / resample_keep_argmax."""
+    stats = [x.strip().lower() for x in cfg.get("Options", "resample_stats", fallback="").split(",") if x.strip()]
+    unknown = [x for x in stats if x not in RESAMPLE_STATS]
+    if unknown:
+        logging.warning(f"Unknown resample_stats ignored: {unknown} (allowed: {', '.join(RESAMPLE_STATS)})")
+        print(f"⚠️ Unknown resample_stats ignored: {unknown}")
+    stats = [x for x in stats if x in RESAMPLE_STATS]
+    keep_argmax = cfg.getboolean("Options", "resample_keep_argmax", fallback=True)
+    if not keep_argmax and not stats:
+        # The compact rollup row only carries the statistics; without them it would be empty
+        logging.warning("resample_keep_argmax = false needs resample_stats; keeping the max-Ch1 row")
+        print("⚠️ resample_keep_argmax = false needs resample_stats; keeping the max-Ch1 row")
+        keep_argmax = True
+    return {
+        "stats": stats,
+        "channels": [c.strip() for c in cfg.get("Options", "resample_channels", fallback="").split(",") if c.strip()],
+        "count_over_threshold": cfg.getfloat("Options", "count_over_threshold", fallback=0.0),
+        "keep_argmax": keep_argmax,
+    }
+
+def time_bins(times: pd.Series, interval_minutes: int) -> np.ndarray:
+    """Start of the time_interval bin of every timestamp as int64 ns (same as .dt.floor)."""
+    step = np.int64(interval_minutes) * 60 * 10**9
+    ns = times.to_numpy(dtype="datetime64[ns]").astype(np.int64)
+    return ns - ns % step
+
+def _argmax_rows(values: np.ndarray, times_ns: np.ndarray, group: np.ndarray) -> np.ndarray:
+    """
+    Row position of the largest value of every group (earliest time on ties), in group
+    code order. A group without any value falls back to its earliest row.
+    """
+    gmax = pd.Series(values).groupby(group).transform("max").to_numpy()
+    cand = values == gmax  # NaN never matches
+    cand |= ~pd.Series(cand).groupby(group).transform("any").to_numpy()
+    pos = np.flatnonzero(cand)
+    return pd.Series(times_ns[pos], index=pos).groupby(group[pos], sort=True).idxmin().to_numpy()
+
+def resample_frame(df: pd.DataFrame, time_interval, options: dict = None) -> pd.DataFrame:
+    """
+    One row per (PtName, time_interval hours bin), grouped on an int64 code
+    (PtName code * bins + bin code) instead of sorting the frame.
+      - keep_argmax: the bin's row with the largest Ch1KeisokuData (default, as before);
+        otherwise (only together with stats) Start_Date_Time becomes the bin start and the
+        raw channel values are dropped.
+      - stats: adds <channel>_<stat> columns (max, mean, p95, count_over) and Bin_Points.
+    """
+    options = options or {}
+    stats = options.get("stats", [])
+    # --- Resample data based on time_interval ---
+    if can_resample(df, time_interval):
+        # 將小時轉換為分鐘，以支援小數
+        interval_minutes = int(time_interval * 60)
+        print(f"Resampling data: keeping one point every {time_interval} hours ({interval_minutes} minutes) per PtName...")
+        
+        before_resample_count = len(df)
+        # Ensure Start_Date_Time is a datetime object for time-based operations.
+        df['Start_Date_Time'] = to_datetime_column(df['Start_Date_Time'])
+        
+        # 將所有 KeisokuData 欄位轉換為數值型別，以便比較大小
+        keisoku_cols = [col for col in df.columns if 'KeisokuData' in col]
+        for col in keisoku_cols:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+
+        df = df.dropna(subset=['Start_Date_Time', 'PtName']).reset_index(drop=True)
+
+        # 1. 建立時間區間標記 (int64 bin codes; factorize(sort=True) keeps the (PtName, time_bin) order)
+        bins = time_bins(df['Start_Date_Time'], interval_minutes)
+        pt_codes, _ = pd.factorize(df['PtName'], sort=True)
+        bin_codes, bin_values = pd.factorize(bins, sort=True)
+        group = pt_codes.astype(np.int64) * len(bin_values) + bin_codes
+
+        # 2. 找到每個 (PtName, time_bin) 群組中，'Ch1KeisokuData' 數值最大的那筆資料
+        #    如果 'Ch1KeisokuData' 不存在，則退回使用時間戳記
+        times_ns = df['Start_Date_Time'].to_numpy(dtype="datetime64[ns]").astype(np.int64)
+        if 'Ch1KeisokuData' in df.columns:
+            target = df['Ch1KeisokuData'].to_numpy(dtype=float, na_value=np.nan)
+        else:
+            target = times_ns.astype(float)
+        keep = _argmax_rows(target, times_ns, group)
+        out = df.iloc[keep].reset_index(drop=True)
+
+        # 3. Per channel statistics of every bin
+        channels = [c for c in (options.get("channels") or keisoku_cols) if c in df.columns]
+        if stats and channels:
+            grouped = df[channels].groupby(group, sort=True)
+            rollup = {}
+            for stat in stats:
+                if stat == "max":
+                    values = grouped.max()
+                elif stat == "mean":
+                    values = grouped.mean()
+                elif stat == "p95":
+                    values = grouped.quantile(0.95)
+                else:  # count_over
+                    over = df[channels].gt(options.get("count_over_threshold", 0.0))
+                    values = over.groupby(group, sort=True).sum()
+                for c in channels:
+                    rollup[f"{c}_{stat}"] = values[c].to_numpy()
+            rollup["Bin_Points"] = grouped.size().to_numpy()
+            out = pd.concat([out, pd.DataFrame(rollup)], axis=1)
+
+        if not options.get("keep_argmax", True) and stats:
+            out['Start_Date_Time'] = pd.to_datetime(bins[keep])
+            out = out.drop(columns=channels)
+        df = out
+        
+        print(f"Resampling complete. Kept {len(df)} of {before_resample_count} rows.")
+    else:
+        print("No time_interval set or required columns are missing. Skipping resampling, uploading all data.")
+    return df
+
+def finalize_frame(df: pd.DataFrame, sn_prefix: str, part_no: str, manual_items: dict) -> pd.DataFrame:
+    """Null filtering, name cleaning, Serial_Number/Part_Number, extra fields and column order."""
+    # --- Filter out rows with None/NaN in critical columns ---
+    if not df.empty:
+        before_dropna_count = len(df)
+        # Define critical columns to check for nulls, e.g., PtName and measurement data.
+        critical_cols = [col for col in df.columns if 'KeisokuData' in col or col == 'PtName']
+        df.dropna(subset=critical_cols, how='any', inplace=True)
+        after_dropna_count = len(df)
+        print(f"Filtering None/NaN values in critical columns. Kept {after_dropna_count} of {before_dropna_count} rows.")
+
+    # --- Data Cleaning for specific columns ---
+    # Convert full-width to half-width characters
+    # str.translate is much faster than applying a function row-by-row.
+    full_to_half_map = str.maketrans(
+        "＂＃＄％＆＇（）＊＋，－．／０１２３４５６７８９：；＜＝＞？＠ＡＢＣＤＥＦＧＨＩＪＫＬＭＮＯＰＱＲＳＴＵＶＷＸＹＺ［＼］＾＿｀ａｂｃｄｅｆｇｈｉｊｋｌｍｎｏｐｑｒｓｔｕｖｗｘｙｚ｛｜｝～",
+        "\"#$%&'()*+,-./0123456789:;<=>?@ABCDEFGHIJKLMNOPQRSTUVWXYZ[\\]^_`abcdefghijklmnopqrstuvwxyz{|}~"
+    )
+    for col in ["SenName", "PtName", "GrpName"]:
+        if col in df.columns:
+            df[col] = df[col].astype(str).str.translate(full_to_half_map)
+
+    if "SenName" in df.columns:
+        df["SenName"] = df["SenName"].str.replace(r'[^a-zA-Z]', '', regex=True)
+    if "PtName" in df.columns:
+        df["PtName"] = df["PtName"].str.replace(r'[^a-zA-Z0-9]', '', regex=True)
+    if "GrpName" in df.columns:
+        df["GrpName"] = df["GrpName"].str.replace(r'[^a-zA-Z]', '', regex=True)
+    print("Applied cleaning rules to SenName, PtName, and GrpName columns.")
+
+    # Generate Serial Number for each row based on its own Start_Date_Time
+    if 'Start_Date_Time' in df.columns:
+        df['Serial_Number'] = build_serial_column(sn_prefix, df['Start_Date_Time'])
+    else:
+        df['Serial_Number'] = build_serial_from_prefix(sn_prefix) # Fallback
+    df["Part_Number"] = part_no if part_no else "UNKNOWPN"
+
+    # Any extra ManualAssign fields go to CSV too
+    for mk, mv in (manual_items or {}).items():
+        df[mk] = mv
+
+    # Column order
+    front = ["Serial_Number", "Part_Number", "Start_Date_Time", "Operation", "TestStation", "Site"]
+    df = df[front + [c for c in df.columns if c not in front]]
+    return df
+
+# ---------------- Per-file read (parallel) ----------------
+def _load_particle_file(task):
+    """Worker: cached frame for one file, or parse + store it. Returns (df, cache_hit)."""
+    path, key, cache, desired_sheet, cols, skiprows = task
+    df = cache.load(key) if key else None
+    if df is not None:
+        return df, True
+    df = read_particle_file(path, desired_sheet, cols, skiprows)
+    if key:
+        cache.store(key, df)
+    return df, False
+
+def load_particle_files(tasks, workers: int):
+    """
+    Runs _load_particle_file for every task, in a process pool when workers > 1.
+    Results come back in task order, so the merge is deterministic. When this file
+    is not the main script (e.g. loaded by bat/Daemon.py as daemon_job_...), spawned
+    workers cannot import it, so the files are read in this process.
+    """
+    if __name__ != "__main__":
+        workers = 1
+    if workers > 1 and len(tasks) > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+                return list(pool.map(_load_particle_file, tasks))
+        except (BrokenProcessPool, AttributeError, TypeError, OSError) as e:
+            # e.g. module not importable by the child process; parse in this process instead
+            logging.warning(f"Process pool unavailable ({e}), reading files sequentially")
+            print(f"Process pool unavailable ({e}), reading files sequentially")
+    return [_load_particle_file(t) for t in tasks]
+
+# ---------------- Backfill ----------------
+class CsvPartWriter:
+    """
+    Appends frames to <operation>_<timestamp>_partNNN.csv and rolls over to a new part
+    once part_rows rows were written; every finished part gets its own pointer XML.
+    """
+    def __init__(self, csv_dir: Path, output_dir: Path, operation: str, part_rows: int, xml_kwargs: dict,
+                 stage: Output_Stage.OutputStage = None):
+        self.csv_dir = Path(csv_dir)
+        self.stage = stage
+        self.output_dir = Path(output_dir)
+        self.operation = operation
+        self.part_rows = part_rows
+        self.xml_kwargs = xml_kwargs
+        self.stamp = datetime.now().strftime("%Y_%m_%dT%H.%M.%S")
+        self.part_no = 0
+        self.columns = None
+        self.parts = []  # (csv_path, xml_path, rows)
+        self._csv_path = None
+        self._rows = 0
+        self._first_sn = ""
+        self._last_xml_time = None
+
+    def write(self, df: pd.DataFrame) -> None:
+        if df.empty:
+            return
+        if self.columns is None:
+            self.columns = list(df.columns)
+        df = df.reindex(columns=self.columns)
+        while not df.empty:
+            if self._csv_path is None:
+                self.part_no += 1
+                self._csv_path = self.csv_dir / f"{self.operation}_{self.stamp}_part{self.part_no:03d}.csv"
+                self._rows = 0
+                self._first_sn = df["Serial_Number"].iloc[0] if "Serial_Number" in df.columns else ""
+            take = self.part_rows - self._rows
+            target = Path(self.stage.path(self._csv_path)) if self.stage is not None else self._csv_path
+            write_to_csv(target, df.iloc[:take])
+            self._rows += min(take, len(df))
+            df = df.iloc[take:]
+            if self._rows >= self.part_rows:
+                self.close_part()
+
+    def close_part(self) -> None:
+        if self._csv_path is None:
+            return
+        # The XML file name only carries the time to the second; never reuse a second
+        if self.parts:
+            while datetime.now().replace(microsecond=0) <= self._last_xml_time:
+                time.sleep(0.05)
+        self._last_xml_time = datetime.now().replace(microsecond=0)
+        xml_fp = generate_pointer_xml(
+            output_path=self.output_dir, csv_path=self._csv_path,
+            serial_no=self._first_sn, stage=self.stage, **self.xml_kwargs)
+        self.parts.append((self._csv_path, xml_fp, self._rows))
+        logging.info(f"Backfill part {self._csv_path.name}: {self._rows} rows, XML {xml_fp.name}")
+        print(f"📄 Part {self.part_no}: {self._csv_path.name} ({self._rows} rows) -> {xml_fp.name}")
+        self._csv_path = None
+
+def run_backfill(source_files, read_files, prep_args: tuple, final_args: tuple, time_interval,
+                 resample_options: dict, chunk_files: int, writer: CsvPartWriter) -> None:
+    """
+    Processes the whole archive in date-ordered chunks of chunk_files workbooks, so only
+    one chunk is in memory at a time. The last resampling bin of every PtName is still
+    open at the end of a chunk (the next file can add points to it); its raw rows are
+    carried into the next chunk, which gives the same result (argmax row and bin
+    statistics) as resampling the whole archive at once.
+    """
+    carry = pd.DataFrame()
+    total_chunks = (len(source_files) + chunk_files - 1) // chunk_files
+    for n, start in enumerate(range(0, len(source_files), chunk_files), 1):
+        chunk = source_files[start:start + chunk_files]
+        print(f"\n[Backfill] chunk {n}/{total_chunks}: {os.path.basename(chunk[0])} .. {os.path.basename(chunk[-1])}")
+        frames = [df for df in read_files(chunk) if not df.empty]
+        df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+        del frames
+        df = prepare_frame(df, *prep_args)
+        if not carry.empty:
+            df = pd.concat([carry, df], ignore_index=True)
+            carry = pd.DataFrame()
+        if df.empty:
+            continue
+
+        if can_resample(df, time_interval):
+            df["Start_Date_Time"] = to_datetime_column(df["Start_Date_Time"])
+            df = df.dropna(subset=["Start_Date_Time"])
+            bins = pd.Series(time_bins(df["Start_Date_Time"], int(time_interval * 60)), index=df.index)
+            open_bin = bins == bins.groupby(df["PtName"]).transform("max")
+            carry = df[open_bin]
+            df = df[~open_bin]
+
+        if not df.empty:
+            df = resample_frame(df, time_interval, resample_options)
+            writer.write(finalize_frame(df, *final_args))
+        logging.info(f"Backfill chunk {n}/{total_chunks} done, {len(carry)} rows carried")
+        del df
+
+    if not carry.empty:
+        writer.write(finalize_frame(resample_frame(carry, time_interval, resample_options), *final_args))
+    writer.close_part()
+
+def publish_stage(stage: Output_Stage.OutputStage) -> None:
+    failures = stage.publish()
+    for final, error in failures:
+        print(f"⚠️ Publish failed (kept for the next run): {final}: {error}")
+    print(stage.summary())
+
 # ---------------- Main ----------------
-def main():
+def main(backfill: bool = None):
+    # --backfill: push the whole archive instead of the latest two days
+    if backfill is None:
+        backfill = BACKFILL_ARG in sys.argv
+
     ini_files = [f for f in os.listdir(".") if f.lower().endswith(".ini")]
     if not ini_files:
         print("No config (.ini) found.")
@@ -294,12 +693,23 @@ def main():
         output_dir = Path(cfg.get("Paths", "output_path", fallback="./XML/"))
         intermediate = Path(cfg.get("Paths", "intermediate_data_path", fallback="./DataFile/"))
         intermediate.mkdir(parents=True, exist_ok=True)
+        # CSV / XML go to a local staging folder first and are published to the share in one batch
+        stage = Output_Stage.OutputStage(
+            cfg.get("Paths", "staging_path", fallback=str(intermediate / "_staging")),
+            workers=cfg.getint("Options", "publish_workers", fallback=4))
 
         # Excel parameters
         desired_sheet = cfg.get("Excel", "sheet_name", fallback="KeisokuDataTable")
         cols = cfg.get("Excel", "data_columns", fallback="A:U")
         skiprows = cfg.getint("Excel", "main_skip_rows", fallback=1)
 
+        # Parsed sheets are cached by file content hash (Feather, or pickle without pyarrow)
+        parse_cache = Parse_Cache.ParseCache(
+            cfg.get("Paths", "parse_cache_path", fallback=str(intermediate / "_parse_cache")),
+            enabled=cfg.getboolean("Options", "parse_cache", fallback=True))
+        parse_params = {"sheet": desired_sheet, "usecols": cols, "skiprows": skiprows}
+        workers = cfg.getint("Options", "workers", fallback=1)
+
         # DataFields mapping
         fields_lines = cfg.get("DataFields", "fields", fallback="").strip()
         fmap = parse_fields_map(fields_lines)
@@ -313,6 +723,7 @@ def main():
         enforce_today_restime = cfg.getboolean("Options", "enforce_today_restime", fallback=False)
         tz_name = cfg.get("Options", "timezone", fallback="Asia/Taipei")  # reserved for future TZ handling
         time_interval = cfg.getfloat("Options", "time_interval", fallback=None) # 每幾小時抓一點 (可為小數)，若無設定則不篩選
+        resample_options = read_resample_options(cfg)
 
         # XML defaults
         result_value = cfg.get("XML_Defaults", "result_value", fallback="Passed")
@@ -322,6 +733,39 @@ def main():
         patterns = [s.strip() for s in cfg.get("Basic_info", "file_name_patterns", fallback="*.xls").split(",")]
         patterns = [p for p in patterns if p.lower().endswith(".xls")] or ["*.xls"]
 
+        if backfill:
+            source_files = pick_all_files_by_date(input_paths, patterns)
+            if not source_files:
+                print("\n❌ No .xls files with leading YYYYMMDD found in any input_paths.")
+                continue
+            if enforce_today_restime:
+                print("Backfill: 'enforce_today_restime' is ignored.")
+            chunk_files = max(1, cfg.getint("Options", "backfill_chunk_files", fallback=7))
+            part_rows = max(1, cfg.getint("Options", "backfill_part_rows", fallback=500000))
+            print(f"\n✅ Backfill: {len(source_files)} files, {chunk_files} files per chunk, {part_rows} rows per CSV part")
+            logging.info(f"Backfill start: {len(source_files)} files")
+
+            def read_files(files):
+                # The archive is read in place (no copy to intermediate); parsed sheets still go to the cache
+                tasks = [(f, parse_cache.key_for(f, parse_params) if parse_cache.enabled else None,
+                          parse_cache, desired_sheet, cols, skiprows) for f in files]
+                parse_cache.save_index()
+                return [df for df, _ in load_particle_files(tasks, workers)]
+
+            writer = CsvPartWriter(csv_dir, output_dir, operation, part_rows, dict(
+                site=site, product_family=product_family, operation=operation, test_station=test_station,
+                part_no=part_no, result_value=result_value, teststep_status_value=teststep_status_value), stage)
+            run_backfill(
+                source_files, read_files,
+                (fmap, False, operation, test_station, site, tool_name),
+                (sn_prefix, part_no, manual_items),
+                time_interval, resample_options, chunk_files, writer)
+            total_rows = sum(rows for _, _, rows in writer.parts)
+            logging.info(f"Backfill end: {len(writer.parts)} part(s), {total_rows} rows")
+            print(f"\n✅ Backfill done: {len(writer.parts)} CSV part(s), {total_rows} rows")
+            publish_stage(stage)
+            continue
+
         # Pick files from the latest two days
         source_files = pick_latest_two_days_files(input_paths, patterns)
         if not source_files:
@@ -333,41 +777,24 @@ def main():
         for f in source_files:
             print(f"   - {os.path.basename(f)}")
 
-        all_data_frames = []
-        for src_file in source_files:
-            # Copy to intermediate
-            copied = shutil.copy(src_file, intermediate / os.path.basename(src_file))
-
-            # List sheets and choose best match
-            xls = pd.ExcelFile(copied, engine="xlrd")  # .xls requires xlrd
-            sheets = xls.sheet_names
-            print(f"\nAvailable sheets: {sheets}")
-            norm = lambda s: re.sub(r"\s+", "", s).lower()
-            nd = norm(desired_sheet)
-            use_sheet = desired_sheet if desired_sheet in sheets else \
-                        next((s for s in sheets if norm(s) == nd), None) or \
-                        next((s for s in sheets if nd in norm(s)), sheets[0])
-            print(f"Using sheet: {use_sheet}")
-
-            # Read with header (as configured). If empty, try header detection.
-            df = pd.read_excel(
-                copied,
-                sheet_name=use_sheet,
-                header=0,
-                usecols=cols,
-                skiprows=skiprows - 1,
-                engine="xlrd",
-                dtype=str  # Read all as string to avoid type inference issues
-            )
-            
-            if df.empty:
-                raw = pd.read_excel(copied, sheet_name=use_sheet, header=None, engine="xlrd")
-                hdr_row, data_start = detect_header_row(raw, EXPECTED_HEADERS, min_hits=12)
-                print(f"Header auto-detected at row: {hdr_row+1} (data start: {data_start+1})")
-                df = pd.read_excel(copied, sheet_name=use_sheet, header=hdr_row, usecols=cols, engine="xlrd", dtype=str)
-            
-            if not df.empty:
-                all_data_frames.append(df)
+        # Copy to intermediate (file name order = date order, keeps the merge deterministic);
+        # copies run concurrently and a file already identical in intermediate is not copied again
+        source_files = sorted(source_files, key=lambda f: (os.path.basename(f), f))
+        copier = Copy_Stage.from_config(cfg)
+        tasks = []
+        for src_file, copied, error in copier.copy_many(source_files, str(intermediate)):
+            if error is not None:
+                raise error
+            key = parse_cache.key_for(copied, parse_params) if parse_cache.enabled else None
+            tasks.append((copied, key, parse_cache, desired_sheet, cols, skiprows))
+        parse_cache.save_index()
+        logging.info(copier.summary())
+
+        # Read / normalize every file (process pool when [Options] workers > 1)
+        results = load_particle_files(tasks, workers)
+        all_data_frames = [df for df, _ in results if not df.empty]
+        hits = sum(1 for _, hit in results if hit)
+        print(f"Parse cache: {hits} hit(s), {len(results) - hits} parsed, workers={workers}")
 
         # Merge all dataframes into one
         try:
@@ -379,124 +806,15 @@ def main():
         if df.empty:
             print("⚠️ DataFrame is empty after reading. Check sheet name/header row/column range (A:U).")
 
-        # Apply key_* mapping to column names
-        if fmap and not df.empty:
-            rename_by_index = {}
-            for k, v in fmap.items():
-                idx = v["col"]
-                if 0 <= idx < len(df.columns):
-                    rename_by_index[df.columns[idx]] = k
-            df = df.rename(columns=rename_by_index)
-
-        # Optional: enforce today's ResTime
-        if enforce_today_restime and "key_ResTime" in df.columns and not df.empty:
-            def _is_today(x):
-                try:
-                    ts = pd.to_datetime(x, errors="coerce")
-                    return not pd.isna(ts) and ts.date() == date.today()
-                except Exception:
-                    return False
-            before = len(df)
-            df = df[df["key_ResTime"].apply(_is_today)].copy()
-            print(f"Filter 'ResTime == today' enabled: kept {len(df)}/{before} rows")
-
-        # Inject system/ManualAssign fields
+        df = prepare_frame(df, fmap, enforce_today_restime, operation, test_station, site, tool_name)
         if not df.empty:
-            df["Operation"] = operation
-            df["TestStation"] = test_station
-            df["Site"] = site
-            df["key_Tool_name"] = tool_name
-
-            rename_map = {"key_ResTime": "Start_Date_Time", "key_Tool_name": "DeviceSerialNumber"}
-            for c in list(df.columns):
-                if c.startswith("key_") and c not in rename_map:
-                    rename_map[c] = c.replace("key_", "", 1)
-            df = df.rename(columns=rename_map)
-
-            # --- Resample data based on time_interval ---
-            if time_interval is not None and "PtName" in df.columns and "Start_Date_Time" in df.columns and not df.empty:
-                # 將小時轉換為分鐘，以支援小數
-                interval_minutes = int(time_interval * 60)
-                print(f"Resampling data: keeping one point every {time_interval} hours ({interval_minutes} minutes) per PtName...")
-                
-                before_resample_count = len(df)
-                # Ensure Start_Date_Time is a datetime object for time-based operations.
-                df['Start_Date_Time'] = pd.to_datetime(df['Start_Date_Time'], errors='coerce')
-                
-                # 將所有 KeisokuData 欄位轉換為數值型別，以便比較大小
-                keisoku_cols = [col for col in df.columns if 'KeisokuData' in col]
-                for col in keisoku_cols:
-                    df[col] = pd.to_numeric(df[col], errors='coerce')
-
-                df.dropna(subset=['Start_Date_Time'], inplace=True)
-
-                # --- Efficient Resampling ---
-
-                df = df.sort_values(['PtName', 'Start_Date_Time']).reset_index(drop=True)
-                
-                # 1. 建立時間區間標記
-                df['time_bin'] = df['Start_Date_Time'].dt.floor(f'{interval_minutes}min')
-                # 2. 找到每個 (PtName, time_bin) 群組中，'Ch1KeisokuData' 數值最大的那筆資料的索引
-                #    如果 'Ch1KeisokuData' 不存在，則退回使用時間戳記取第一筆
-                target_col_for_max = 'Ch1KeisokuData' if 'Ch1KeisokuData' in df.columns else 'Start_Date_Time'
-                idx_to_keep = df.groupby(['PtName', 'time_bin'])[target_col_for_max].idxmax()
-                # 3. 根據索引篩選 DataFrame，並移除輔助欄位
-                df = df.loc[idx_to_keep].drop(columns=['time_bin']).reset_index(drop=True)
-                
-                print(f"Resampling complete. Kept {len(df)} of {before_resample_count} rows.")
-            else:
-                print("No time_interval set or required columns are missing. Skipping resampling, uploading all data.")
-
-            # --- Filter out rows with None/NaN in critical columns ---
-            if not df.empty:
-                before_dropna_count = len(df)
-                # Define critical columns to check for nulls, e.g., PtName and measurement data.
-                critical_cols = [col for col in df.columns if 'KeisokuData' in col or col == 'PtName']
-                df.dropna(subset=critical_cols, how='any', inplace=True)
-                after_dropna_count = len(df)
-                print(f"Filtering None/NaN values in critical columns. Kept {after_dropna_count} of {before_dropna_count} rows.")
-
-            # --- Data Cleaning for specific columns ---
-            # Convert full-width to half-width characters
-            # str.translate is much faster than applying a function row-by-row.
-            full_to_half_map = str.maketrans(
-                "＂＃＄％＆＇（）＊＋，－．／０１２３４５６７８９：；＜＝＞？＠ＡＢＣＤＥＦＧＨＩＪＫＬＭＮＯＰＱＲＳＴＵＶＷＸＹＺ［＼］＾＿｀ａｂｃｄｅｆｇｈｉｊｋｌｍｎｏｐｑｒｓｔｕｖｗｘｙｚ｛｜｝～",
-                "\"#$%&'()*+,-./0123456789:;<=>?@ABCDEFGHIJKLMNOPQRSTUVWXYZ[\\]^_`abcdefghijklmnopqrstuvwxyz{|}~"
-            )
-            for col in ["SenName", "PtName", "GrpName"]:
-                if col in df.columns:
-                    df[col] = df[col].astype(str).str.translate(full_to_half_map)
-
-            if "SenName" in df.columns:
-                df["SenName"] = df["SenName"].str.replace(r'[^a-zA-Z]', '', regex=True)
-            if "PtName" in df.columns:
-                df["PtName"] = df["PtName"].str.replace(r'[^a-zA-Z0-9]', '', regex=True)
-            if "GrpName" in df.columns:
-                df["GrpName"] = df["GrpName"].str.replace(r'[^a-zA-Z]', '', regex=True)
-            print("Applied cleaning rules to SenName, PtName, and GrpName columns.")
-
-            # Generate Serial Number for each row based on its own Start_Date_Time
-            if 'Start_Date_Time' in df.columns:
-                # Ensure Start_Date_Time is in datetime format before applying the function
-                df['Start_Date_Time_dt'] = pd.to_datetime(df['Start_Date_Time'], errors='coerce')
-                df['Serial_Number'] = df['Start_Date_Time_dt'].apply(lambda dt: build_serial_from_prefix(sn_prefix, dt))
-                df.drop(columns=['Start_Date_Time_dt'], inplace=True)
-            else:
-                df['Serial_Number'] = build_serial_from_prefix(sn_prefix) # Fallback
-            df["Part_Number"] = part_no if part_no else "UNKNOWPN"
-
-            # Any extra ManualAssign fields go to CSV too
-            for mk, mv in (manual_items or {}).items():
-                df[mk] = mv
-
-            # Column order
-            front = ["Serial_Number", "Part_Number", "Start_Date_Time", "Operation", "TestStation", "Site"]
-            df = df[front + [c for c in df.columns if c not in front]]
+            df = resample_frame(df, time_interval, resample_options)
+            df = finalize_frame(df, sn_prefix, part_no, manual_items)
 
         # Write CSV
         ts_for_csv = datetime.now().strftime("%Y_%m_%dT%H.%M.%S")
         csv_path = Path(csv_dir) / f"{operation}_{ts_for_csv}.csv"
-        write_to_csv(csv_path, df if not df.empty else pd.DataFrame())
+        write_to_csv(Path(stage.path(csv_path)), df if not df.empty else pd.DataFrame())
 
         # For the XML filename, use the first Serial Number as a representative value
         representative_sn = ""
@@ -508,8 +826,16 @@ def main():
             csv_path=csv_path,
             site=site, product_family=product_family, operation=operation, test_station=test_station,
             serial_no=representative_sn, part_no=part_no,
-            result_value=result_value, teststep_status_value=teststep_status_value
+            result_value=result_value, teststep_status_value=teststep_status_value, stage=stage
         )
+        publish_stage(stage)
+
+        # Plain copies older than datafile_plain_days move into the compressed, deduplicated archive
+        blobs = Blob_Store.from_config(cfg)
+        blobs.archive_dir(intermediate, operation, keep_days=blobs.plain_days, patterns=patterns, keep=source_files)
+        blobs.apply_retention(blobs.retention_days)
+        logging.info(blobs.summary())
+        blobs.close()
 
         print(f"\n✅ Done: {os.path.basename(csv_path)}")
         print(f"📄 XML: {os.path.basename(xml_fp)}")
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: Serial_Number generation and the 'ResTime == today' filter of 051_Particle,
+row-wise (.apply, the old implementation) vs. vectorized (current implementation).
+
+Reads the sample workbooks in ../DataFile/051_Particle/ (samples 051_Particle.py has moved
+into the ../DataFile/_blobs archive are read back from there), checks that both versions
+give identical results and prints rows/sec for each.
+
+Usage (from the 051_Particle folder):
+    python Benchmark_Vectorize.py              # latest 2 sample files
+    python Benchmark_Vectorize.py --files 10   # latest 10 sample files
+    python Benchmark_Vectorize.py --repeat 5
+"""
+
+import os
+import glob
+import time
+import argparse
+import importlib.util
+from datetime import datetime
+
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_particle_module():
+    """051_Particle.py cannot be imported by name (leading digit)."""
+    os.chdir(HERE)  # the script resolves ../MyModule relative to the working directory
+    spec = importlib.util.spec_from_file_location("particle_051", os.path.join(HERE, "051_Particle.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# ---------------- Old (row-wise) implementations ----------------
+def serial_rowwise(m, sn_prefix: str, start_date_time: pd.Series) -> pd.Series:
+    dt = pd.to_datetime(start_date_time, errors='coerce')
+    return dt.apply(lambda x: m.build_serial_from_prefix(sn_prefix, x))
+
+
+def today_mask_rowwise(res_time: pd.Series, today) -> pd.Series:
+    def _is_today(x):
+        try:
+            ts = pd.to_datetime(x, errors="coerce")
+            return not pd.isna(ts) and ts.date() == today
+        except Exception:
+            return False
+    return res_time.apply(_is_today)
+
+
+# ---------------- Current (vectorized) implementations ----------------
+def serial_vectorized(m, sn_prefix: str, start_date_time: pd.Series) -> pd.Series:
+    return m.build_serial_column(sn_prefix, start_date_time)
+
+
+def today_mask_vectorized(m, res_time: pd.Series, today) -> pd.Series:
+    return m.to_datetime_column(res_time).dt.normalize() == pd.Timestamp(today)
+
+
+def archived_samples(m, cfg, count: int, plain) -> list:
+    """Plain paths of the latest archived .xls samples (Blob_Store) not in plain, oldest first."""
+    operation = cfg.get("Basic_info", "Operation", fallback="PARTICLE_MONITOR_CR3F")
+    plain = {os.path.basename(f) for f in plain}
+    with m.Blob_Store.from_config(cfg) as blobs:
+        names = [(name, date) for name, date in blobs.snapshots(operation)
+                 if name.lower().endswith(".xls") and name not in plain]
+        return [blobs.materialize(operation, name, date) for name, date in names[-count:]] if count > 0 else []
+
+
+def best_of(repeat: int, func):
+    best, result = None, None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Row-wise vs vectorized serial / ResTime filter.")
+    parser.add_argument("--data", default=os.path.join(HERE, "..", "DataFile", "051_Particle"))
+    parser.add_argument("--files", type=int, default=2, help="number of latest sample files to load")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    m = load_particle_module()
+    cfg = m.read_ini("Config_Partical.ini")
+    files = sorted(glob.glob(os.path.join(args.data, "*.xls")))[-args.files:]
+    files = archived_samples(m, cfg, args.files - len(files), files) + files
+    if not files:
+        print(f"No sample .xls found in {args.data} or the archive")
+        return
+
+    desired_sheet = cfg.get("Excel", "sheet_name", fallback="KeisokuDataTable")
+    cols = cfg.get("Excel", "data_columns", fallback="A:U")
+    skiprows = cfg.getint("Excel", "main_skip_rows", fallback=1)
+    sn_prefix = cfg.get("ManualAssign", "SerialNumber", fallback="").strip()
+    fmap = m.parse_fields_map(cfg.get("DataFields", "fields", fallback=""))
+
+    print(f"Loading {len(files)} file(s): {os.path.basename(files[0])} .. {os.path.basename(files[-1])}")
+    frames = [m.read_particle_file(f, desired_sheet, cols, skiprows) for f in files]
+    df = m.prepare_frame(pd.concat(frames, ignore_index=True), fmap, False, "OP", "TS", "350", "TOOL")
+    res_time = df["Start_Date_Time"]
+    rows = len(df)
+    # 'today' = last date in the samples, so the filter keeps a realistic share of rows
+    today = pd.to_datetime(res_time, errors="coerce").max().date()
+    print(f"Rows: {rows}, reference date for the ResTime filter: {today}\n")
+
+    t_old, sn_old = best_of(args.repeat, lambda: serial_rowwise(m, sn_prefix, res_time))
+    t_new, sn_new = best_of(args.repeat, lambda: serial_vectorized(m, sn_prefix, res_time))
+    assert sn_old.tolist() == sn_new.tolist(), "Serial_Number differs"
+
+    f_old, mask_old = best_of(args.repeat, lambda: today_mask_rowwise(res_time, today))
+    f_new, mask_new = best_of(args.repeat, lambda: today_mask_vectorized(m, res_time, today))
+    assert mask_old.tolist() == mask_new.tolist(), "ResTime filter differs"
+
+    print(f"{'Step':<22}{'row-wise rows/s':>18}{'vectorized rows/s':>20}{'speed-up':>10}")
+    for name, old, new in (("Serial_Number", t_old, t_new), ("ResTime == today", f_old, f_new)):
+        print(f"{name:<22}{rows / old:>18,.0f}{rows / new:>20,.0f}{old / new:>9.1f}x")
+    print(f"\nResults identical ({int(mask_new.sum())} rows on {today}). {datetime.now():%Y-%m-%d %H:%M:%S}")
+
+
+if __name__ == "__main__":
+    main()
@@ -18,9 +18,9 @@ import traceback
 
 sys.path.append('../MyModule')
 import Log
-import SQL
 import Convert_Date
 import Row_Number_Func
+import Prime_Lookup
 
 class IniSettings:
     """Class to hold all settings read from the INI file (Universal Version)"""
@@ -173,8 +173,9 @@ def generate_pointer_xml(output_path, csv_path, settings, log_file):
     except Exception as e:
         Log.Log_Error(log_file, f"Function generate_pointer_xml failed: {e}")
 
-def process_excel_file(filepath_str, settings, log_file, csv_filepath):
-    """Processes a single Excel file in a batched, vectorized manner (Universal Version)."""
+def process_excel_file(filepath_str, settings, log_file, csv_filepath, prime):
+    """Processes a single Excel file in a batched, vectorized manner (Universal Version).
+    prime is the run's lookup connection (opened and closed by main())."""
     filepath = Path(filepath_str)
     Log.Log_Info(log_file, f"--- Start processing file: {filepath.name} ---")
     start_row = max(Row_Number_Func.start_row_number(settings.running_rec) - settings.skip_rows, 4)
@@ -214,23 +215,17 @@ def process_excel_file(filepath_str, settings, log_file, csv_filepath):
         Log.Log_Info(log_file, "No data left after initial filtering. Ending process for this file.")
         return
 
-    # Step 4: Database query
-    conn, cursor = None, None
-    try:
-        Log.Log_Info(log_file, "Step 3: Starting database query...")
-        conn, cursor = SQL.connSQL()
-        if conn is None: 
-            Log.Log_Error(log_file, "Database connection failed.")
-            return
-        def get_db_info(serial): return pd.Series(SQL.selectSQL(cursor, str(serial)))
-        df[['key_Part_Number', 'key_LotNumber_9']] = df['key_Serial_Number'].apply(get_db_info)
-        df.dropna(subset=['key_Part_Number'], inplace=True)
-        df = df[df['key_Part_Number'] != 'LDアレイ_']
-        Log.Log_Info(log_file, f"Database query and filtering complete. {df.shape[0]} valid rows remaining.")
-    finally:
-        if conn: 
-            SQL.disconnSQL(conn, cursor)
-            Log.Log_Info(log_file, "Database connection closed.")
+    # Step 4: Database query (the run's connection, closed by main())
+    Log.Log_Info(log_file, "Step 3: Starting database query...")
+    conn, cursor = prime.get()
+    if conn is None: 
+        Log.Log_Error(log_file, "Database connection failed.")
+        return
+    def get_db_info(serial): return pd.Series(Prime_Lookup.select(cursor, str(serial)))
+    df[['key_Part_Number', 'key_LotNumber_9']] = df['key_Serial_Number'].apply(get_db_info)
+    df.dropna(subset=['key_Part_Number'], inplace=True)
+    df = df[df['key_Part_Number'] != 'LDアレイ_']
+    Log.Log_Info(log_file, f"Database query and filtering complete. {df.shape[0]} valid rows remaining.")
     
     if df.empty:
         Log.Log_Info(log_file, "No data left after database lookup. Ending process for this file.")
@@ -319,12 +314,15 @@ def main():
         print("No config files (.ini or .txt) found in the current directory.")
         return
     Log.Log_Info(log_file, f"Found {len(ini_files)} config file(s): {', '.join(ini_files)}")
+    # One lookup connection for all configs and files of this run
+    prime = Prime_Lookup.RunConnection()
 
     for ini_path in ini_files:
         try:
             print(f"--- Processing config: {ini_path} ---")
             config = _read_and_parse_ini_config(ini_path)
             settings = _extract_settings_from_config(config)
+            Prime_Lookup.configure(config)
             
             # Set up a specific log file for this operation
             log_file = setup_logging(settings.log_path, settings.operation)
@@ -354,7 +352,7 @@ def main():
                     try:
                         dst_path = shutil.copy(latest_file, intermediate_path)
                         Log.Log_Info(log_file, f"File copied successfully -> {dst_path}")
-                        process_excel_file(dst_path, settings, log_file, csv_filepath_for_this_ini)
+                        process_excel_file(dst_path, settings, log_file, csv_filepath_for_this_ini, prime)
                     except Exception:
                         Log.Log_Error(log_file, f"Error processing file {latest_file.name}: {traceback.format_exc()}")
 
@@ -379,6 +377,8 @@ def main():
             print(error_message)
             if log_file: Log.Log_Error(log_file, error_message)
 
+    prime.close()
+    Log.Log_Info(log_file, prime.summary())
     Log.Log_Info(log_file, "===== Universal Script End =====")
     print("✅ All .ini configurations have been processed.")
 
@@ -1,12 +1,9 @@
 import os
 import sys
-import shutil
 import logging
 import numpy as np
 import pandas as pd
-import xml.etree.ElementTree as ET
-from xml.dom import minidom
-from datetime import datetime, date, timedelta
+from datetime import datetime, date
 from dateutil.relativedelta import relativedelta
 from configparser import ConfigParser
 from pathlib import Path
@@ -16,9 +13,15 @@ import traceback
 
 sys.path.append('../MyModule')
 import Log
-import SQL
 import Convert_Date
-import Row_Number_Func
+import Source_Manifest
+import Incremental_Reader
+import State_Store
+import Prime_Lookup
+import Xml_Writer
+import Output_Stage
+import Table_Output
+import Copy_Stage
 
 class IniSettings:
     """Class to hold all settings read from the INI file (Universal Version)"""
@@ -29,17 +32,22 @@ class IniSettings:
         self.operation = ""
         self.test_station = ""
         self.retention_date = 30
+        self.output_mode = "csv"
         self.file_name_patterns = []
         self.input_paths = []
         self.output_path = ""
         self.csv_path = "" 
         self.intermediate_data_path = ""
+        self.staging_path = ""
+        self.publish_workers = 4
         self.log_path = ""
         self.running_rec = ""
-        self.backup_running_rec_path = ""
+        self.state_store_backup = ""
         self.sheet_name = ""
         self.data_columns = ""
         self.skip_rows = 500
+        self.first_data_row = 21
+        self.incremental_state = "./Incremental_State.json"
         self.field_map = {}
         # CVD-specific
         self.tool_name = ""
@@ -87,6 +95,7 @@ def _extract_settings_from_config(config):
     s.operation = config.get('Basic_info', 'Operation')
     s.test_station = config.get('Basic_info', 'TestStation')
     s.retention_date = config.getint('Basic_info', 'retention_date', fallback=30)
+    s.output_mode = Table_Output.output_mode(config, default='csv')
     s.file_name_patterns = [x.strip() for x in config.get('Basic_info', 'file_name_patterns').split(',')]
     s.tool_name = config.get('Basic_info', 'Tool_Name', fallback=None) # CVD
     
@@ -95,14 +104,18 @@ def _extract_settings_from_config(config):
     s.output_path = config.get('Paths', 'output_path', fallback=None)
     s.csv_path = config.get('Paths', 'CSV_path', fallback=None)
     s.intermediate_data_path = config.get('Paths', 'intermediate_data_path')
+    s.staging_path = config.get('Paths', 'staging_path', fallback=os.path.join(s.intermediate_data_path, '_staging'))
+    s.publish_workers = config.getint('Paths', 'publish_workers', fallback=4)
     s.log_path = config.get('Paths', 'log_path')
-    s.running_rec = config.get('Paths', 'running_rec')
-    s.backup_running_rec_path = config.get('Paths', 'backup_running_rec_path', fallback=None)
+    s.running_rec = config.get('Paths', 'running_rec', fallback=None)  # old record, imported into the state store once
+    s.state_store_backup = config.get('Paths', 'state_store_backup', fallback=None)
 
     # Excel
     s.sheet_name = config.get('Excel', 'sheet_name')
     s.data_columns = config.get('Excel', 'data_columns')
     s.skip_rows = config.getint('Excel', 'main_skip_rows')
+    s.first_data_row = config.getint('Excel', 'first_data_row', fallback=21)
+    s.incremental_state = config.get('Paths', 'incremental_state', fallback='./Incremental_State.json')
     s.xy_sheet_name = config.get('Excel', 'xy_sheet_name', fallback=None) # ICP/Dry
     s.xy_columns = config.get('Excel', 'xy_columns', fallback=None) # ICP/Dry
 
@@ -134,11 +147,10 @@ def write_to_csv(csv_filepath, dataframe, log_file):
         Log.Log_Error(log_file, f"Function write_to_csv failed: {e}")
         return False
 
-def generate_pointer_xml(output_path, csv_path, settings, log_file):
-    """Generates the pointer XML file that points to the CSV."""
+def generate_pointer_xml(output_path, csv_path, settings, log_file, stage=None):
+    """Generates the pointer XML file that points to the CSV (into the stage, published after the CSV)."""
     Log.Log_Info(log_file, "Executing function generate_pointer_xml...")
     try:
-        os.makedirs(output_path, exist_ok=True)
         now_iso = datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
         serial_no = Path(csv_path).stem
         
@@ -153,43 +165,61 @@ def generate_pointer_xml(output_path, csv_path, settings, log_file):
         
         xml_file_path = os.path.join(output_path, xml_file_name)
 
-        results = ET.Element("Results", {"xmlns:xsi": "http://www.w3.org/2001/XMLSchema-instance", "xmlns:xsd": "http://www.w3.org/2001/XMLSchema"})
-        result = ET.SubElement(results, "Result", startDateTime=now_iso, endDateTime=now_iso, Result="Passed")
-        ET.SubElement(result, "Header",
-            SerialNumber=serial_no, PartNumber="UNKNOWPN",
-            Operation=settings.operation, TestStation=settings.test_station,
-            Operator="NA", StartTime=now_iso, Site=settings.site, LotNumber=""
-        )
-        test_step = ET.SubElement(result, "TestStep", Name=settings.operation, startDateTime=now_iso, endDateTime=now_iso, Status="Passed")
-        ET.SubElement(test_step, "Data", DataType="Table", Name=f"tbl_{settings.operation.upper()}", Value=str(csv_path), CompOperation="LOG")
-        
-        xml_str = minidom.parseString(ET.tostring(results)).toprettyxml(indent="  ", encoding="utf-8")
-        with open(xml_file_path, "wb") as f:
-            f.write(xml_str)
+        header = {
+            "SerialNumber": serial_no, "PartNumber": "UNKNOWPN",
+            "Operation": settings.operation, "TestStation": settings.test_station,
+            "Operator": "NA", "StartTime": now_iso, "Site": settings.site, "LotNumber": "",
+        }
+        target = stage.path(xml_file_path, after=csv_path) if stage is not None else xml_file_path
+        if stage is None:
+            os.makedirs(output_path, exist_ok=True)
+        Xml_Writer.write_file(target, Xml_Writer.pointer_document(header, settings.operation, csv_path, now_iso))
 
         Log.Log_Info(log_file, f"Pointer XML generated successfully at: {xml_file_path}")
     except Exception as e:
         Log.Log_Error(log_file, f"Function generate_pointer_xml failed: {e}")
 
-def process_excel_file(filepath_str, settings, log_file, csv_filepath):
-    """Processes a single Excel file in a batched, vectorized manner (Universal Version)."""
+def _apply_field_names(df, settings):
+    """Renames the numbered sheet columns to the key_* names of [DataFields]."""
+    ini_keys_by_col_index = {int(v['col']): k for k, v in settings.field_map.items() if not v['col'].startswith('xy_')}
+    df.columns = [ini_keys_by_col_index.get(i, f'unused_{i}') for i in range(df.shape[1])]
+    return df
+
+def _filter_recent_rows(df, settings):
+    """Keeps rows inside the retention window that have a serial number."""
+    date_series = pd.to_datetime(df['key_Start_Date_Time'], errors='coerce')
+    df = df[date_series.notna() & (date_series >= (datetime.now() - relativedelta(days=settings.retention_date)))]
+    return df.dropna(subset=['key_Serial_Number'])
+
+def process_excel_file(filepath_str, settings, log_file, csv_filepath, store, prime):
+    """
+    Processes a single Excel file in a batched, vectorized manner (Universal Version).
+    Returns False when reading or the database connection failed, True otherwise.
+    The read position and last output time go to the state store; main() commits them
+    once the outputs were published. prime is the run's lookup connection (opened by
+    main(), reused for every file).
+    """
     filepath = Path(filepath_str)
     Log.Log_Info(log_file, f"--- Start processing file: {filepath.name} ---")
-    start_row = max(Row_Number_Func.start_row_number(settings.running_rec) - settings.skip_rows, 4)
-    start_row = int(20)
+    # Only rows after the stored watermark are read (first run: from first_data_row)
+    reader = Incremental_Reader.IncrementalReader(settings.incremental_state, scope=settings.operation, store=store)
     
+    workbook = None
     try:
+        # The workbook is opened once: main sheet, XY sheet and row count all come from it
+        workbook = Incremental_Reader.open_workbook(str(filepath))
         # Step 1: Read the main Excel worksheet
-        df = pd.read_excel(filepath, header=None, sheet_name=settings.sheet_name, usecols=settings.data_columns, skiprows=start_row)
-        Log.Log_Info(log_file, f"Step 1: Successfully read main sheet '{settings.sheet_name}', {df.shape[0]} rows loaded.")
-        ini_keys_by_col_index = {int(v['col']): k for k, v in settings.field_map.items() if not v['col'].startswith('xy_')}
-        df.columns = [ini_keys_by_col_index.get(i, f'unused_{i}') for i in range(df.shape[1])]
+        df = reader.read_new_rows(str(filepath), settings.sheet_name, usecols=settings.data_columns,
+                                  first_row=settings.first_data_row, workbook=workbook)
+        Log.Log_Info(log_file, f"Step 1: Successfully read main sheet '{settings.sheet_name}', {df.shape[0]} new rows loaded "
+                               f"({'full scan' if reader.full_scan else 'tail read'}, last row {reader.last_row}).")
+        df = _apply_field_names(df, settings)
         
         # Step 2: Conditionally read the XY coordinate worksheet (ICP/Dry mode)
         xy_data = {}
         if settings.xy_sheet_name:
             Log.Log_Info(log_file, f"ICP/Dry mode detected. Reading XY coordinate sheet: '{settings.xy_sheet_name}'")
-            df_xy = pd.read_excel(filepath, header=None, sheet_name=settings.xy_sheet_name, usecols=settings.xy_columns)
+            df_xy = Incremental_Reader.read_sheet(workbook, settings.xy_sheet_name, settings.xy_columns, excel_path=str(filepath))
             for key, mapping in settings.field_map.items():
                 col_str = mapping['col']
                 if col_str.startswith('xy_'):
@@ -200,39 +230,38 @@ def process_excel_file(filepath_str, settings, log_file, csv_filepath):
         else:
             Log.Log_Info(log_file, "No XY coordinate sheet setting detected. Processing in CVD mode.")
         # Step 3: Initial filtering
-        date_series = pd.to_datetime(df['key_Start_Date_Time'], errors='coerce')
-        df = df[date_series.notna() & (date_series >= (datetime.now() - relativedelta(days=settings.retention_date)))]
-        df.dropna(subset=['key_Serial_Number'], inplace=True)
+        df = _filter_recent_rows(df, settings)
         Log.Log_Info(log_file, f"Step 2: Initial filtering (date, serial number) complete. {df.shape[0]} rows remaining.")
     except Exception as e:
         Log.Log_Error(log_file, f"Step 1/2/3 failed: Error during Excel read or filter. Error: {e}")
-        return
+        return False
+    finally:
+        if workbook is not None:
+            workbook.close()
 
     if df.empty:
         Log.Log_Info(log_file, "No data left after initial filtering. Ending process for this file.")
-        return
+        reader.commit()
+        return True
 
-    # Step 4: Database query
-    conn, cursor = None, None
-    try:
-        Log.Log_Info(log_file, "Step 3: Starting database query...")
-        conn, cursor = SQL.connSQL()
-        if conn is None: 
-            Log.Log_Error(log_file, "Database connection failed.")
-            return
-        def get_db_info(serial): return pd.Series(SQL.selectSQL(cursor, str(serial)))
-        df[['key_Part_Number', 'key_LotNumber_9']] = df['key_Serial_Number'].apply(get_db_info)
-        df.dropna(subset=['key_Part_Number'], inplace=True)
-        df = df[df['key_Part_Number'] != 'LDアレイ_']
-        Log.Log_Info(log_file, f"Database query and filtering complete. {df.shape[0]} valid rows remaining.")
-    finally:
-        if conn: 
-            SQL.disconnSQL(conn, cursor)
-            Log.Log_Info(log_file, "Database connection closed.")
+    # Step 4: Database query (the run's connection, closed by main())
+    Log.Log_Info(log_file, "Step 3: Starting database query...")
+    conn, cursor = prime.get()
+    if conn is None: 
+        Log.Log_Error(log_file, "Database connection failed.")
+        return False
+    lookup = Prime_Lookup.bulk_select(cursor, df['key_Serial_Number'].astype(str))
+    serials = df['key_Serial_Number'].astype(str)
+    df['key_Part_Number'] = serials.map(lookup['Part_Number'])
+    df['key_LotNumber_9'] = serials.map(lookup['LotNumber_9'])
+    df.dropna(subset=['key_Part_Number'], inplace=True)
+    df = df[df['key_Part_Number'] != 'LDアレイ_']
+    Log.Log_Info(log_file, f"Database query and filtering complete. {df.shape[0]} valid rows remaining.")
     
     if df.empty:
         Log.Log_Info(log_file, "No data left after database lookup. Ending process for this file.")
-        return
+        reader.commit()
+        return True
 
     # Step 5: Data transformation and calculation
     Log.Log_Info(log_file, "Step 4: Starting data transformation and calculation...")
@@ -245,7 +274,7 @@ def process_excel_file(filepath_str, settings, log_file, csv_filepath):
     
     base_date = datetime(1899, 12, 30)
     df['date_excel_number'] = (df['datetime_obj'] - base_date).dt.days
-    df['excel_row'] = start_row + df.index + 1
+    df['excel_row'] = df.index + 1  # index is the 0-based sheet row
     df['key_STARTTIME_SORTED'] = df['date_excel_number'] + (df['excel_row'] / 10**6)
     df['key_SORTNUMBER'] = df['excel_row']
     Log.Log_Info(log_file, "Date and SORTED field calculations complete.")
@@ -289,20 +318,68 @@ def process_excel_file(filepath_str, settings, log_file, csv_filepath):
     final_columns = [col for col in dynamic_column_order if col in df_renamed.columns]
     df_to_csv = df_renamed[final_columns]
 
-    if csv_filepath:
-        Log.Log_Info(log_file, f"Step 7: Preparing to write {len(df_to_csv)} rows to CSV...")
-        write_to_csv(csv_filepath, df_to_csv, log_file)
-        
+    if not csv_filepath:  # No CSV to write to: the read position is not recorded, the rows are read again
+        Log.Log_Error(log_file, "Step 7: No CSV path, rows not written and read position not recorded")
+        return False
+    Log.Log_Info(log_file, f"Step 7: Preparing to write {len(df_to_csv)} rows to CSV...")
+    if not write_to_csv(csv_filepath, df_to_csv, log_file):
+        return False
 
-    # Step 8: Update the starting row record
-    original_row_count = pd.read_excel(filepath_str, header=None, sheet_name=settings.sheet_name).shape[0]
-    next_start_row = start_row + original_row_count + 1
-    Row_Number_Func.next_start_row_number(settings.running_rec, next_start_row)
-    Log.Log_Info(log_file, f"Step 8: Updating next start row to {next_start_row}")
-    if settings.backup_running_rec_path:
-        try: shutil.copy(settings.running_rec, settings.backup_running_rec_path)
-        except Exception as e: Log.Log_Error(log_file, f"Failed to backup running_rec file: {e}")
+    # Step 8: Record the read position (last row) and the newest output time in the state store
+    reader.commit()
+    store.update(settings.operation, filepath.name, settings.sheet_name, last_time=df['datetime_obj'].max())
+    Log.Log_Info(log_file, f"Step 8: Read position row {reader.last_row} recorded, committed after publishing")
     Log.Log_Info(log_file, f"--- Function process_excel_file executed successfully ---")
+    return True
+
+def _resolve(base_dir, path):
+    """An ini path relative to the script folder base_dir (absolute paths unchanged)."""
+    return path if not path or os.path.isabs(path) else os.path.normpath(os.path.join(base_dir, path))
+
+def prefetch_serials():
+    """
+    Serials the next main() run will look up in Prime (prefetch phase of the
+    orchestrator, see bat/Prefetch.py). Sources unchanged since the last run
+    (manifest) are skipped; the new rows of the others are read from their copies
+    in intermediate_data_path. The run state is only read: no chdir, nothing is
+    imported into or committed to the state store, the manifest and the watermarks
+    stay as they are. The one write is the copy of a changed source, which main()
+    then finds identical and reuses, so the share is read once per cycle.
+    """
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    serials = []
+    store = State_Store.StateStore(_resolve(base_dir, State_Store.DEFAULT_PATH))
+    for ini_name in sorted(f for f in os.listdir(base_dir) if f.endswith('.ini')):
+        try:
+            config = _read_and_parse_ini_config(os.path.join(base_dir, ini_name))
+            settings = _extract_settings_from_config(config)
+            manifest = Source_Manifest.SourceManifest(
+                _resolve(base_dir, config.get('Paths', 'source_manifest', fallback='./Source_Manifest.json')),
+                scope=ini_name, force_refresh=Source_Manifest.force_refresh_requested(config))
+            # No state file: the watermarks are only read from the store, no JSON is imported
+            reader = Incremental_Reader.IncrementalReader(None, scope=settings.operation, store=store)
+            copier = Copy_Stage.from_config(config)
+            intermediate_path = _resolve(base_dir, settings.intermediate_data_path)
+            for input_p_str in settings.input_paths:
+                for pattern in settings.file_name_patterns:
+                    files = [p for p in Path(_resolve(base_dir, input_p_str)).glob(pattern) if not p.name.startswith('~$')]
+                    if not files: continue
+                    latest_file = max(files, key=os.path.getmtime)
+                    if manifest.is_unchanged(str(latest_file)): continue
+                    try:
+                        local_copy = copier.copy(str(latest_file), intermediate_path)
+                        df = reader.read_new_rows(local_copy, settings.sheet_name, usecols=settings.data_columns,
+                                                  first_row=settings.first_data_row)
+                    except Exception as e:
+                        logging.warning(f"Prefetch of {latest_file.name} ({ini_name}) failed: {e}")
+                        continue
+                    if df.empty: continue
+                    df = _filter_recent_rows(_apply_field_names(df, settings), settings)
+                    serials.extend(df['key_Serial_Number'].astype(str))
+        except Exception:
+            logging.warning(f"Prefetch of {ini_name} failed: {traceback.format_exc()}")
+    store.close()
+    return serials
 
 def main():
     """Main function to find and process all INI files."""
@@ -317,29 +394,53 @@ def main():
         print("No config files (.ini or .txt) found in the current directory.")
         return
     Log.Log_Info(log_file, f"Found {len(ini_files)} config file(s): {', '.join(ini_files)}")
+    # Read positions / last output times of all operations (../DataFile/State_Store.sqlite)
+    store = State_Store.StateStore()
+    # One lookup connection for all configs and files of this run
+    prime = Prime_Lookup.RunConnection()
 
     for ini_path in ini_files:
         try:
             print(f"--- Processing config: {ini_path} ---")
             config = _read_and_parse_ini_config(ini_path)
             settings = _extract_settings_from_config(config)
+            Prime_Lookup.configure(config)
             
             # Set up a specific log file for this operation
             log_file = setup_logging(settings.log_path, settings.operation)
             Log.Log_Info(log_file, f"--- Start processing config file: {ini_path} ---")
+            store.import_running_rec(settings.operation, settings.running_rec)
+            if settings.output_mode != 'csv':
+                # The sheet rows have no per-row XML template here; they are always uploaded as a table
+                Log.Log_Error(log_file, f"output_mode = {settings.output_mode} is not supported by Facet_Common, writing CSV + pointer XML")
+            if not settings.csv_path:
+                # Nowhere to write: skip the config so no read position moves past unwritten rows
+                Log.Log_Error(log_file, "output_mode = csv needs [Paths] CSV_path; config skipped")
+                continue
             
-            # Create a unique CSV file for this INI's execution
+            # CSV / XML are written to a local staging folder and published to the share at the end
+            stage = Output_Stage.OutputStage(settings.staging_path, workers=settings.publish_workers)
+
+            # Create a unique CSV file for this INI's execution (written to its staged copy)
             csv_filepath_for_this_ini = None
+            staged_csv = None
             if settings.csv_path:
-                Path(settings.csv_path).mkdir(parents=True, exist_ok=True)
                 timestamp = datetime.now().strftime('%Y_%m_%dT%H.%M.%S')
                 filename = f"{settings.operation}_{timestamp}.csv"
                 csv_filepath_for_this_ini = Path(settings.csv_path) / filename
+                staged_csv = stage.path(csv_filepath_for_this_ini)
                 Log.Log_Info(log_file, f"CSV output for this config will be: {csv_filepath_for_this_ini}")
 
             intermediate_path = Path(settings.intermediate_data_path)
             intermediate_path.mkdir(parents=True, exist_ok=True)
+            # Skip sources unchanged since the last successful run (--force-refresh to override)
+            manifest = Source_Manifest.SourceManifest(
+                config.get('Paths', 'source_manifest', fallback='./Source_Manifest.json'),
+                scope=ini_path, force_refresh=Source_Manifest.force_refresh_requested(config))
+            # Copies into intermediate_path run concurrently; an identical copy already there is reused
+            copier = Copy_Stage.from_config(config)
             source_files_found = False
+            changed_files = []
             for input_p_str in settings.input_paths:
                 input_p = Path(input_p_str)
                 for pattern in settings.file_name_patterns:
@@ -349,34 +450,69 @@ def main():
                     source_files_found = True
                     latest_file = max(files, key=os.path.getmtime)
                     Log.Log_Info(log_file, f"Found latest source file: {latest_file.name}")
-                    try:
-                        dst_path = shutil.copy(latest_file, intermediate_path)
-                        Log.Log_Info(log_file, f"File copied successfully -> {dst_path}")
-                        process_excel_file(dst_path, settings, log_file, csv_filepath_for_this_ini)
-                    except Exception:
-                        Log.Log_Error(log_file, f"Error processing file {latest_file.name}: {traceback.format_exc()}")
+                    if manifest.is_unchanged(str(latest_file)):
+                        Log.Log_Info(log_file, f"Source unchanged since last run, skipped: {latest_file.name}")
+                        continue
+                    changed_files.append(str(latest_file))
+            for latest_file, dst_path, error in copier.copy_many(changed_files, str(intermediate_path)):
+                if error is not None:
+                    Log.Log_Error(log_file, f"Copying {latest_file} failed: {error}")
+                    continue
+                try:
+                    Log.Log_Info(log_file, f"File copied successfully -> {dst_path}")
+                    if process_excel_file(dst_path, settings, log_file, staged_csv, store, prime):
+                        manifest.record(latest_file, local_copy=dst_path, stat=copier.source_stat(dst_path))
+                except Exception:
+                    Log.Log_Error(log_file, f"Error processing file {os.path.basename(latest_file)}: {traceback.format_exc()}")
+            Log.Log_Info(log_file, copier.summary())
 
             if not source_files_found:
                 Log.Log_Info(log_file, "No matching source files found for this configuration.")
 
+            # No new rows: the staged CSV was never written, so there is nothing to publish
+            if staged_csv and not os.path.exists(staged_csv):
+                stage.discard(csv_filepath_for_this_ini)
+
             # Generate the pointer XML for this specific INI's CSV
-            if csv_filepath_for_this_ini and os.path.exists(csv_filepath_for_this_ini) and settings.output_path:
+            if staged_csv and os.path.exists(staged_csv) and settings.output_path:
                 Log.Log_Info(log_file, f"--- Generating pointer XML for {ini_path} ---")
                 
                 generate_pointer_xml(
                     output_path=settings.output_path,
                     csv_path=csv_filepath_for_this_ini,
                     settings=settings,
-                    log_file=log_file
+                    log_file=log_file,
+                    stage=stage
                 )
+
+            # Publish CSV first, then its XML (temp name + rename); failures stay staged for the next run
+            for final, error in stage.publish():
+                Log.Log_Error(log_file, f"Publishing {final} failed, kept for the next run: {error}")
+            Log.Log_Info(log_file, stage.summary())
+
+            # Commit this config's state once its outputs are published (or kept staged for the next run)
+            if stage.lost:
+                store.rollback()
+                Log.Log_Error(log_file, f"{stage.lost} staged output file(s) lost, state not committed; the rows are read again next run")
+            else:
+                manifest.save()
+                store.commit()
+                if settings.state_store_backup:
+                    try: store.backup(settings.state_store_backup)
+                    except Exception as e: Log.Log_Error(log_file, f"Failed to backup the state store: {e}")
+            Log.Log_Info(log_file, store.summary())
             
             Log.Log_Info(log_file, f"--- Finished processing config file: {ini_path} ---")
 
         except Exception:
+            store.rollback()
             error_message = f"FATAL Error with INI {ini_path}: {traceback.format_exc()}"
             print(error_message)
             if log_file: Log.Log_Error(log_file, error_message)
 
+    prime.close()
+    Log.Log_Info(log_file, prime.summary())
+    store.close()
     Log.Log_Info(log_file, "===== Universal Script End =====")
     print("✅ All .ini configurations have been processed.")
     print("This window will close in 5 seconds...")
@@ -6,7 +6,8 @@
 実行ログとエラーログはカスタムモジュール Log を使用して出力されます。
 
 依存モジュール:
-- Log, SQL, Check, Convert_Date, Row_Number_Func (../MyModule 内)
+- Log, SQL, Check, Convert_Date (../MyModule 内)
+- 最終出力日時・最終行・内容ハッシュは State_Store (../DataFile/State_Store.sqlite) に保存
 """
 
 import os
@@ -16,14 +17,18 @@ import shutil
 import logging
 import pandas as pd
 from configparser import ConfigParser, NoSectionError, NoOptionError
-from datetime import datetime, timedelta, date
+from datetime import datetime, date
 
 sys.path.append('../MyModule')
 import Log
-import SQL
 import Check
 import Convert_Date
-import Row_Number_Func
+import Source_Manifest
+import State_Store
+import Prime_Lookup
+import Xml_Writer
+import Output_Stage
+import Table_Output
 
 global_log_file = None
 
@@ -39,51 +44,14 @@ def setup_logging(log_file_path: str) -> None:
         print(f"Error setting up log file {log_file_path}: {e}")
         raise
 
-def update_running_rec(running_rec_path: str, end_date: datetime) -> None:
-    """実行記録ファイルを更新する"""
-    try:
-        with open(running_rec_path, 'w', encoding='utf-8') as f:
-            f.write(end_date.strftime('%Y-%m-%d %H:%M:%S'))
-        Log.Log_Info(global_log_file, f"Running record file {running_rec_path} updated with end date {end_date}")
-    except Exception as e:
-        Log.Log_Error(global_log_file, f"Error updating running record file {running_rec_path}: {e}")
-
-def ensure_running_rec_exists_and_update(running_rec_path: str, end_date: datetime) -> None:
-    """実行記録ファイルが存在しなければ作成して更新する"""
-    try:
-        with open(running_rec_path, 'w', encoding='utf-8') as f:
-            f.write(end_date.strftime('%Y-%m-%d %H:%M:%S'))
-        Log.Log_Info(global_log_file, f"Running record file {running_rec_path} confirmed and updated with end date {end_date}")
-    except Exception as e:
-        Log.Log_Error(global_log_file, f"Error processing running record file {running_rec_path}: {e}")
-
-def read_running_rec(running_rec_path: str) -> datetime:
+def process_excel_file(file_path: str, sheet_name: str, data_columns, store: State_Store.StateStore,
+                       output_path: str, fields: dict, site: str, product_family: str,
+                       operation: str, Test_Station: str, prime: Prime_Lookup.RunConnection,
+                       xml_pool: Xml_Writer.WriterPool, table: Table_Output.TableOutput = None) -> None:
     """
-    最後の実行記録を読み込み、ファイルが存在しないまたは内容が無効な場合は DayGap 日前の日時を返す。
+    Excel ファイルを読み込み、データ変換後に XML ファイル (output_mode = csv なら CSV + ポインタ XML) を生成する。
+    最終出力日時・最終行・内容ハッシュは store に記録し、出力の発行後に main() が確定する。
     """
-   
-    if not os.path.exists(running_rec_path):
-        with open(running_rec_path, 'w', encoding='utf-8') as f:
-            f.write('')
-        return datetime.today() - timedelta(days=DayGap)
-    try:
-        with open(running_rec_path, 'r', encoding='utf-8') as f:
-            content = f.read().strip()
-            if content:
-                last_run_date = pd.to_datetime(content, errors='coerce')
-                if pd.isnull(last_run_date):
-                    return datetime.today() - timedelta(days=DayGap)
-                return last_run_date
-            else:
-                return datetime.today() - timedelta(days=DayGap)
-    except Exception as e:
-        Log.Log_Error(global_log_file, f"Error reading running record file {running_rec_path}: {e}")
-        return datetime.today() - timedelta(days=DayGap)
-
-def process_excel_file(file_path: str, sheet_name: str, data_columns, running_rec: str,
-                       output_path: str, fields: dict, site: str, product_family: str,
-                       operation: str, Test_Station: str) -> None:
-    """Excel ファイルを読み込み、データ変換後に XML ファイルを生成する"""
     Log.Log_Info(global_log_file, f"Processing Excel File: {file_path}")
     Excel_file_list = []
     for file in glob.glob(file_path):
@@ -96,6 +64,13 @@ def process_excel_file(file_path: str, sheet_name: str, data_columns, running_re
     Excel_file_list = sorted(Excel_file_list, key=lambda x: x[1], reverse=True)
     Excel_File = Excel_file_list[0][0]
 
+    # 前回処理したときと内容が同じファイルは読み込まない
+    source = os.path.basename(Excel_File)
+    digest = Source_Manifest.file_hash(Excel_File)
+    if store.is_processed(operation, source, sheet_name, digest):
+        Log.Log_Info(global_log_file, f"Source unchanged since it was last processed, skipped: {source}")
+        return
+
     try:
         try:
             df = pd.read_csv(Excel_File, header=0, encoding='utf-8')
@@ -121,30 +96,28 @@ def process_excel_file(file_path: str, sheet_name: str, data_columns, running_re
 
     if not os.path.exists(output_path):
         os.makedirs(output_path)
-    one_month_ago = read_running_rec(running_rec)
-    print(one_month_ago)
-    df = df[pd.to_datetime(df['key_Start_Date_Time']) >= one_month_ago]
+    # 前回出力した最終日時以降の行だけを対象にする（記録がなければ DayGap 日前から）
+    since = store.last_time(operation, source, sheet_name, default_days=DayGap)
+    Log.Log_Info(global_log_file, f"Rows from {since} on are output")
+    df = df[pd.to_datetime(df['key_Start_Date_Time']) >= since]
     df['key_Serial_Number'] = df['Nine_Serial_Number'].apply(lambda x: str(x)[4:9])
     df['key_Start_Date_Time'] = pd.to_datetime(df['key_Start_Date_Time'], format='%Y/%m/%d %H:%M:%S').dt.strftime('%Y-%m-%dT%H.%M.%S')
 
     Serial_Number = df['key_Serial_Number'].tolist()
     
-    conn, cursor = SQL.connSQL()
+    conn, cursor = prime.get()
     if conn is None:
         Log.Log_Error(global_log_file, "Connection with Prime Failed")
         return
     try:
-        for serial in Serial_Number:
-            part_number, nine_serial_number = SQL.selectSQL(cursor, serial)
-            if part_number and nine_serial_number:
-                df.loc[df['key_Serial_Number'] == serial, 'Part_Number'] = part_number
-                df.loc[df['key_Serial_Number'] == serial, 'Nine_Serial_Number'] = nine_serial_number
-            else:
-                Log.Log_Error(global_log_file, f"Serial number {serial} not found in database")
+        lookup = Prime_Lookup.bulk_select(cursor, Serial_Number)
+        unmatched = Prime_Lookup.enrich(df, 'key_Serial_Number', lookup)
+        if unmatched:
+            report = os.path.join(os.path.dirname(global_log_file), Prime_Lookup.UNMATCHED_REPORT)
+            Prime_Lookup.report_unmatched(report, unmatched, operation, file_path)
+            Log.Log_Error(global_log_file, f"{len(unmatched)} serial number(s) not found in database, see {report}")
     except Exception as e:
         Log.Log_Error(global_log_file, f"SQL query failed: {e}")
-    finally:
-        SQL.disconnSQL(conn, cursor)
 
     df = df.dropna(subset=['Part_Number'])
     df = df.reset_index(drop=True)
@@ -152,9 +125,6 @@ def process_excel_file(file_path: str, sheet_name: str, data_columns, running_re
     row_number = 0
     while row_number < row_end:
         data_dict = {}
-        if row_number == row_end - 1:
-            latest_date = df['key_Start_Date_Time'].max()
-            update_running_rec(running_rec, latest_date)
         for key, (col, dtype) in fields.items():
             try:
                 value = df.iloc[row_number, int(col)]
@@ -192,15 +162,51 @@ def process_excel_file(file_path: str, sheet_name: str, data_columns, running_re
         data_dict["key_STARTTIME_SORTED"] = date_excel_number
         if None in data_dict.values():
             Log.Log_Error(global_log_file, f"Skipping row {row_number} due to None values in data_dict")
+        elif table is not None:
+            table.add(table_row(data_dict, site, operation, Test_Station))
         else:
-            generate_xml(data_dict, output_path, site, product_family, operation, Test_Station)
+            generate_xml(data_dict, output_path, site, product_family, operation, Test_Station, xml_pool)
         row_number += 1
-        Log.Log_Info(global_log_file, "Write the next starting line number")
-        Row_Number_Func.next_start_row_number(log_file, row_number)
+    # output_mode = csv: このファイルの全行を1つの CSV + ポインタ XML として出力
+    if table is not None:
+        table.write()
+    # このファイル分のXML書き込み完了を待ち、成功したときだけ状態を記録する
+    failures = xml_pool.flush()
+    for xml_file, e in failures:
+        Log.Log_Error(global_log_file, f"Failed to write XML file {xml_file}: {e}")
+    if not failures:
+        if row_end:
+            store.update(operation, source, sheet_name, last_time=df['key_Start_Date_Time'].max(),
+                         last_row=int(df['key_SORTNUMBER'].max()))
+        store.update(operation, source, sheet_name, content_hash=digest)
+
+def table_row(data_dict: dict, site: str, operation: str, Test_Station: str) -> dict:
+    """output_mode = csv のときの 1 行分 (generate_xml の Header / Data と同じ項目)"""
+    return {
+        "Serial_Number": data_dict["key_Serial_Number"],
+        "Part_Number": data_dict["Part_Number"],
+        "Start_Date_Time": data_dict["key_Start_Date_Time"].replace(".", ":"),
+        "Operation": operation,
+        "TestStation": Test_Station,
+        "Site": site,
+        "Operator": data_dict["key_Operator"],
+        "Scriber": data_dict["key_scriber"],
+        "Cleaving": data_dict["key_cleaving"],
+        "Neddle_vendor": data_dict["key_neddle_vendor"],
+        "Neddle_no": data_dict["key_neddle_no"],
+        "scribe_length": data_dict["key_scribe_length"],
+        "scribe_force": data_dict["key_scribe_force"],
+        "unseparate_No": data_dict["key_unseparate"],
+        "peeling_No": data_dict["key_peeling"],
+        "LotNumber_5": data_dict["key_Serial_Number"],
+        "LotNumber_9": data_dict["Nine_Serial_Number"],
+        "STARTTIME_SORTED": data_dict["key_STARTTIME_SORTED"],
+        "SORTNUMBER": data_dict["key_SORTNUMBER"],
+    }
 
 def generate_xml(data_dict: dict, output_path: str, site: str, product_family: str,
-                 operation: str, Test_Station: str) -> None:
-    """受け取ったデータから XML ファイルを生成する"""
+                 operation: str, Test_Station: str, xml_pool: Xml_Writer.WriterPool) -> None:
+    """受け取ったデータから XML を生成し、書き込みを xml_pool に渡す"""
     print(data_dict.get('key_Start_Date_Time', ''))
     xml_filename = (
         f"Site={site},ProductFamily={product_family},Operation={operation},"
@@ -210,39 +216,36 @@ def generate_xml(data_dict: dict, output_path: str, site: str, product_family: s
     )
     xml_filepath = os.path.join(output_path, xml_filename)
     Log.Log_Info(global_log_file, f"XML File Path: {xml_filepath}")
-    with open(xml_filepath, 'w', encoding='utf-8') as f:
-        f.write('<?xml version="1.0" encoding="utf-8"?>\n')
-        f.write('<Results xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xmlns:xsd="http://www.w3.org/2001/XMLSchema">\n')
-        f.write(f'    <Result startDateTime="{data_dict["key_Start_Date_Time"].replace(".", ":")}" Result="Passed">\n')
-        f.write(f'        <Header SerialNumber="{data_dict["key_Serial_Number"]}" PartNumber="{data_dict["Part_Number"]}" Operation="{operation}" TestStation="{Test_Station}" Operator="{data_dict["key_Operator"]}" StartTime="{data_dict["key_Start_Date_Time"].replace(".", ":")}" Site="{site}" LotNumber="{data_dict["key_Serial_Number"]}"/>\n')
-        f.write('        <HeaderMisc>\n')
-        f.write(f'            <Item Description="{operation}"></Item>\n')
-        f.write('        </HeaderMisc>\n')
-        f.write(f'        <TestStep Name="{data_dict["key_Operation"]}" startDateTime="{data_dict["key_Start_Date_Time"].replace(".", ":")}" Status="Passed">\n')
-        f.write(f'            <Data DataType="String" Name="Scriber" Units="" Value="{data_dict["key_scriber"]}"/>\n')
-        f.write(f'            <Data DataType="String" Name="Cleaving" Units="" Value="{data_dict["key_cleaving"]}"/>\n')
-        f.write(f'            <Data DataType="String" Name="Neddle_vendor" Units="" Value="{data_dict["key_neddle_vendor"]}"/>\n')
-        f.write(f'            <Data DataType="String" Name="Neddle_no" Units="" Value="{data_dict["key_neddle_no"]}"/>\n')
-        f.write(f'            <Data DataType="Numeric" Name="scribe_length" Units="" Value="{data_dict["key_scribe_length"]}"/>\n')
-        f.write(f'            <Data DataType="Numeric" Name="scribe_force" Units="" Value="{data_dict["key_scribe_force"]}"/>\n')
-        f.write(f'            <Data DataType="Numeric" Name="unseparate_No" Units="" Value="{data_dict["key_unseparate"]}"/>\n')
-        f.write(f'            <Data DataType="Numeric" Name="peeling_No" Units="" Value="{data_dict["key_peeling"]}"/>\n')
-        f.write('        </TestStep>\n')
-        f.write(f'        <TestStep Name="SORTED_DATA" startDateTime="{data_dict["key_Start_Date_Time"].replace(".", ":")}" Status="Passed">\n')
-        f.write(f'            <Data DataType="Numeric" Name="STARTTIME_SORTED" Units="" Value="{data_dict["key_STARTTIME_SORTED"]}"/>\n')
-        f.write(f'            <Data DataType="Numeric" Name="SORTNUMBER" Units="" Value="{data_dict["key_SORTNUMBER"]}"/>\n')
-        f.write(f'            <Data DataType="String" Name="LotNumber_5" Value="{data_dict["key_Serial_Number"]}" CompOperation="LOG"/>\n')
-        f.write(f'            <Data DataType="String" Name="LotNumber_9" Value="{data_dict["Nine_Serial_Number"]}" CompOperation="LOG"/>\n')
-        f.write('        </TestStep>\n')
-        f.write('        <TestEquipment>\n')
-        f.write(f'            <Item DeviceName="Scriber" DeviceSerialNumber="{data_dict["key_scriber"]}"></Item>\n')
-        f.write(f'            <Item DeviceName="Cleaving" DeviceSerialNumber="{data_dict["key_cleaving"]}"></Item>\n')
-        f.write('        </TestEquipment>\n')
-        f.write('    </Result>\n')
-        f.write('</Results>\n')
-    Log.Log_Info(global_log_file, f"XML File Created: {xml_filepath}")
+    start_time = data_dict["key_Start_Date_Time"].replace(".", ":")
+    w = Xml_Writer.ResultsWriter(indent="    ")
+    w.result({"startDateTime": start_time, "Result": "Passed"})
+    w.header({"SerialNumber": data_dict["key_Serial_Number"], "PartNumber": data_dict["Part_Number"],
+              "Operation": operation, "TestStation": Test_Station, "Operator": data_dict["key_Operator"],
+              "StartTime": start_time, "Site": site, "LotNumber": data_dict["key_Serial_Number"]})
+    w.header_misc([{"Description": operation}])
+    w.test_step({"Name": data_dict["key_Operation"], "startDateTime": start_time, "Status": "Passed"}, [
+        {"DataType": "String", "Name": "Scriber", "Units": "", "Value": data_dict["key_scriber"]},
+        {"DataType": "String", "Name": "Cleaving", "Units": "", "Value": data_dict["key_cleaving"]},
+        {"DataType": "String", "Name": "Neddle_vendor", "Units": "", "Value": data_dict["key_neddle_vendor"]},
+        {"DataType": "String", "Name": "Neddle_no", "Units": "", "Value": data_dict["key_neddle_no"]},
+        {"DataType": "Numeric", "Name": "scribe_length", "Units": "", "Value": data_dict["key_scribe_length"]},
+        {"DataType": "Numeric", "Name": "scribe_force", "Units": "", "Value": data_dict["key_scribe_force"]},
+        {"DataType": "Numeric", "Name": "unseparate_No", "Units": "", "Value": data_dict["key_unseparate"]},
+        {"DataType": "Numeric", "Name": "peeling_No", "Units": "", "Value": data_dict["key_peeling"]},
+    ])
+    w.test_step({"Name": "SORTED_DATA", "startDateTime": start_time, "Status": "Passed"}, [
+        {"DataType": "Numeric", "Name": "STARTTIME_SORTED", "Units": "", "Value": data_dict["key_STARTTIME_SORTED"]},
+        {"DataType": "Numeric", "Name": "SORTNUMBER", "Units": "", "Value": data_dict["key_SORTNUMBER"]},
+        {"DataType": "String", "Name": "LotNumber_5", "Value": data_dict["key_Serial_Number"], "CompOperation": "LOG"},
+        {"DataType": "String", "Name": "LotNumber_9", "Value": data_dict["Nine_Serial_Number"], "CompOperation": "LOG"},
+    ])
+    w.test_equipment([{"DeviceName": "Scriber", "DeviceSerialNumber": data_dict["key_scriber"]},
+                      {"DeviceName": "Cleaving", "DeviceSerialNumber": data_dict["key_cleaving"]}])
+    xml_pool.submit(xml_filepath, w.getvalue())
+    Log.Log_Info(global_log_file, f"XML File Queued: {xml_filepath}")
 
-def process_ini_file(config_path: str) -> None:
+def process_ini_file(config_path: str, prime: Prime_Lookup.RunConnection,
+                     xml_pool: Xml_Writer.WriterPool, store: State_Store.StateStore) -> None:
     """.ini ファイルを読み込み、Excel と XML の処理を実行する"""
     global global_log_file, input_paths, output_path, xml_path, running_rec, sheet_name, data_columns, log_path, log_file, fields, site, product_family, operation, Test_Station, file_name_pattern, file_location, DayGap
 
@@ -271,6 +274,7 @@ def process_ini_file(config_path: str) -> None:
         file_name_pattern = config.get('Basic_info', 'file_name_pattern')
         file_location = config.get('Logging', 'file_location')
         log_file = config.get('Logging', 'log_file')
+        Prime_Lookup.configure(config)
     except NoSectionError as e:
         Log.Log_Error(global_log_file, f"Missing section in config file {config_path}: {e}")
         return
@@ -286,6 +290,10 @@ def process_ini_file(config_path: str) -> None:
     global_log_file = log_file
     setup_logging(global_log_file)
     Log.Log_Info(log_file, f"Program Start for config {config_path}")
+    # 旧実行記録ファイル (running_rec) は初回だけ状態ストアに取り込む
+    store.import_running_rec(operation, running_rec)
+    # output_mode = csv なら行ごとの XML ではなくファイルごとに 1 つの CSV + ポインタ XML
+    table = Table_Output.from_config(config, site, product_family, operation, Test_Station, stage=xml_pool.stage)
 
     fields = {}
     for field in fields_config:
@@ -305,14 +313,31 @@ def process_ini_file(config_path: str) -> None:
                 shutil.copy(file, destination_dir)
                 Log.Log_Info(global_log_file, f"Copy excel file {file} to {file_location}")
                 copied_file_path = os.path.join(destination_dir, os.path.basename(file))
-                process_excel_file(copied_file_path, sheet_name, data_columns, running_rec,
-                                   output_path, fields, site, product_family, operation, Test_Station)
+                process_excel_file(copied_file_path, sheet_name, data_columns, store,
+                                   output_path, fields, site, product_family, operation, Test_Station, prime, xml_pool, table)
 
 def main() -> None:
     """カレントディレクトリ内の .ini ファイルをスキャンして処理を実行する"""
     ini_files = glob.glob("*.ini")
-    for ini_file in ini_files:
-        process_ini_file(ini_file)
+    # Prime接続は実行全体で1本だけ開き、全ファイル・全iniで再利用する
+    # XMLはバックグラウンドのスレッドでローカルの一時フォルダに書き込み（次の行の変換と並行）、
+    # 実行の最後に共有フォルダへまとめて発行する（一時名で転送してからリネーム）
+    with State_Store.StateStore() as store:
+        with Output_Stage.OutputStage('../DataFile/BE_SCRAP_ITEMS/_staging/') as stage, \
+                Prime_Lookup.RunConnection() as prime, \
+                Xml_Writer.WriterPool(stage=stage) as xml_pool:
+            for ini_file in ini_files:
+                process_ini_file(ini_file, prime, xml_pool, store)
+        # 最終出力日時などは出力の発行後に確定する。発行できなかったファイルは一時フォルダに残り次回発行されるが、
+        # 一時フォルダから失われたファイルがあれば確定しない（次回同じ行を再処理）
+        if stage.lost:
+            Log.Log_Error(global_log_file, f"{stage.lost} staged output file(s) lost, run state not committed")
+        else:
+            store.commit()
+    for summary in (prime.summary(), xml_pool.summary(), stage.summary(), store.summary()):
+        print(summary)
+        if global_log_file:
+            Log.Log_Info(global_log_file, summary)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Version: 1.0.0
+Last Modified: 2026-10-16
+
+Description:
+Content-addressed, compressed archive of the 051 Particle snapshots under
+../DataFile/051_Particle/. That folder grows by one workbook per day; the other
+operations copy the same workbook names into their DataFile folders on every run,
+so their copies are replaced in place and are not archived. archive_dir() moves
+the copies older than keep_days into the store and deletes them, the copies of the
+last days stay plain for the copy stage and the parsers; the archived ones are read
+back with snapshots() + open() / materialize() (e.g. 051_Particle/Benchmark_Vectorize.py).
+
+  - Every file is stored once per content: objects/<2 hex>/<sha1>.zst (zstd when
+    the zstandard package is installed, .gz otherwise). A snapshot identical to an
+    earlier one only adds an index entry.
+  - index.sqlite in the store folder maps (operation, original name, date) -> sha1;
+    date is the snapshot date (mtime of the file, YYYY-MM-DD) unless given.
+  - open() returns a decompressed stream, materialize() a plain file in
+    <store>/_extract (for readers that need a path) and mmap() a read-only mmap
+    of that file.
+  - apply_retention(days) drops the entries older than days and deletes the
+    blobs no entry points at any more.
+
+Options read by from_config() (operation ini):
+
+  - [Paths]   blob_store_path     : store folder (default ../DataFile/_blobs)
+  - [Options] datafile_plain_days : days a copy stays plain in DataFile (default 3)
+  - [Options] blob_retention_days : archive retention, 0 keeps everything (default 0)
+
+Usage:
+    store = Blob_Store.from_config(cfg)
+    store.archive_dir(intermediate, operation, keep_days=store.plain_days, patterns=['*.xls'], keep=source_files)
+    with store.open(operation, '20241101.xls', '2024-11-01') as f:
+        df = pd.read_excel(io.BytesIO(f.read()), sheet_name=...)
+    for name, date in store.snapshots(operation):                  # latest snapshot of every name
+        path = store.materialize(operation, name, date)
+    store.apply_retention(store.retention_days)
+    logging.info(store.summary())
+    store.close()
+"""
+
+import io
+import os
+import gzip
+import mmap
+import shutil
+import sqlite3
+import logging
+from fnmatch import fnmatch
+from datetime import date as ddate, datetime, timedelta
+from typing import BinaryIO, Iterable, List, Optional, Tuple
+
+try:
+    import zstandard
+    _HAS_ZSTD = True
+except ImportError:
+    _HAS_ZSTD = False
+
+from Source_Manifest import file_hash
+
+DEFAULT_ROOT = "../DataFile/_blobs"
+ZSTD_LEVEL = 10
+GZIP_LEVEL = 6
+PART_SUFFIX = ".part"
+_CHUNK = 1 << 20
+
+
+def from_config(config) -> "BlobStore":
+    """BlobStore with the blob_* / datafile_plain_days options of an operation ini."""
+    store = BlobStore(config.get("Paths", "blob_store_path", fallback=DEFAULT_ROOT))
+    store.plain_days = config.getint("Options", "datafile_plain_days", fallback=3)
+    store.retention_days = config.getint("Options", "blob_retention_days", fallback=0)
+    return store
+
+
+class BlobStore:
+    """Compressed, deduplicated snapshots of the source files of all operations."""
+
+    def __init__(self, root: str = DEFAULT_ROOT):
+        self.root = os.path.abspath(root)
+        self.codec = "zst" if _HAS_ZSTD else "gz"
+        self.plain_days = 3
+        self.retention_days = 0
+        self.added = 0
+        self.deduplicated = 0
+        self.removed = 0
+        os.makedirs(os.path.join(self.root, "objects"), exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(self.root, "index.sqlite"), timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS blob ("
+            " sha1 TEXT PRIMARY KEY, codec TEXT NOT NULL, size INTEGER NOT NULL,"
+            " stored_size INTEGER NOT NULL, created TEXT)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entry ("
+            " operation TEXT NOT NULL, name TEXT NOT NULL, date TEXT NOT NULL, sha1 TEXT NOT NULL,"
+            " added TEXT, PRIMARY KEY (operation, name, date)) WITHOUT ROWID")
+        self._conn.commit()
+
+    def _blob_path(self, sha1: str, codec: str) -> str:
+        return os.path.join(self.root, "objects", sha1[:2], f"{sha1}.{codec}")
+
+    def _compress(self, src: str, dst: str) -> None:
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        tmp = dst + PART_SUFFIX
+        try:
+            with open(src, "rb") as fin, open(tmp, "wb") as fout:
+                if self.codec == "zst":
+                    zstandard.ZstdCompressor(level=ZSTD_LEVEL).copy_stream(fin, fout, read_size=_CHUNK)
+                else:
+                    with gzip.GzipFile(fileobj=fout, mode="wb", compresslevel=GZIP_LEVEL, mtime=0) as gz:
+                        shutil.copyfileobj(fin, gz, _CHUNK)
+            os.replace(tmp, dst)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def put(self, path: str, operation: str, name: Optional[str] = None, date: Optional[str] = None) -> str:
+        """Stores path (once per content) as (operation, name, date); returns its SHA-1."""
+        name = name or os.path.basename(path)
+        date = date or datetime.fromtimestamp(os.path.getmtime(path)).strftime("%Y-%m-%d")
+        sha1 = file_hash(path)
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        row = self._conn.execute("SELECT codec FROM blob WHERE sha1 = ?", (sha1,)).fetchone()
+        if row is not None and os.path.exists(self._blob_path(sha1, row[0])):
+            self.deduplicated += 1
+        else:
+            target = self._blob_path(sha1, self.codec)
+            self._compress(path, target)
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO blob (sha1, codec, size, stored_size, created) VALUES (?, ?, ?, ?, ?)",
+                    (sha1, self.codec, os.path.getsize(path), os.path.getsize(target), now))
+            self.added += 1
+        with self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO entry (operation, name, date, sha1, added) VALUES (?, ?, ?, ?, ?)",
+                               (operation, name, date, sha1, now))
+        return sha1
+
+    def archive_dir(self, folder, operation: str, keep_days: int = 3, patterns: Iterable[str] = (),
+                    keep: Iterable[str] = ()) -> int:
+        """
+        Moves the files of folder (not its sub folders) older than keep_days into the
+        store; patterns (e.g. '*.xls') limit it to matching names, the names in keep
+        (e.g. the files of this run) stay plain. Returns the number archived.
+        """
+        cutoff = (datetime.now() - timedelta(days=keep_days)).timestamp()
+        patterns = [p.lower() for p in patterns]
+        keep = {os.path.basename(str(k)) for k in keep}
+        archived = 0
+        for item in os.scandir(folder):
+            if not item.is_file() or item.name.endswith(PART_SUFFIX) or item.name.startswith("~$"):
+                continue
+            if item.name in keep or (patterns and not any(fnmatch(item.name.lower(), p) for p in patterns)):
+                continue
+            if item.stat().st_mtime >= cutoff:
+                continue
+            try:
+                self.put(item.path, operation)
+                os.remove(item.path)
+                archived += 1
+            except OSError as e:
+                logging.error(f"Blob store: archiving {item.path} failed, kept: {e}")
+        if archived:
+            logging.info(f"Blob store: {archived} file(s) of {folder} archived")
+        return archived
+
+    def lookup(self, operation: str, name: str, date: Optional[str] = None) -> Optional[Tuple[str, str, str]]:
+        """(sha1, codec, date) of the latest snapshot of name on or before date (any date if None)."""
+        row = self._conn.execute(
+            "SELECT e.sha1, b.codec, e.date FROM entry e JOIN blob b ON b.sha1 = e.sha1"
+            " WHERE e.operation = ? AND e.name = ? AND e.date <= ? ORDER BY e.date DESC LIMIT 1",
+            (operation, name, date or "9999-12-31")).fetchone()
+        return tuple(row) if row else None
+
+    def snapshots(self, operation: str) -> List[Tuple[str, str]]:
+        """(name, date) of the latest snapshot of every name archived for operation, by name."""
+        return [tuple(row) for row in self._conn.execute(
+            "SELECT name, MAX(date) FROM entry WHERE operation = ? GROUP BY name ORDER BY name", (operation,))]
+
+    def _found(self, operation: str, name: str, date: Optional[str]) -> Tuple[str, str, str]:
+        found = self.lookup(operation, name, date)
+        if found is None:
+            raise FileNotFoundError(f"Blob store: no snapshot of {operation}/{name} on or before {date}")
+        return found
+
+    def open(self, operation: str, name: str, date: Optional[str] = None) -> BinaryIO:
+        """Decompressed (read only, forward) stream of a snapshot."""
+        sha1, codec, _ = self._found(operation, name, date)
+        path = self._blob_path(sha1, codec)
+        if codec == "gz":
+            return gzip.open(path, "rb")
+        if not _HAS_ZSTD:
+            raise RuntimeError(f"Blob store: {path} is zstd compressed, the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+
+    def read_bytes(self, operation: str, name: str, date: Optional[str] = None) -> io.BytesIO:
+        """Snapshot decompressed into memory (seekable, e.g. for pd.read_excel)."""
+        with self.open(operation, name, date) as f:
+            return io.BytesIO(f.read())
+
+    def materialize(self, operation: str, name: str, date: Optional[str] = None) -> str:
+        """Path of a plain copy of the snapshot in <store>/_extract (made once per content)."""
+        sha1, _, _ = self._found(operation, name, date)
+        ext = os.path.splitext(name)[1]
+        target = os.path.join(self.root, "_extract", f"{sha1}{ext}")
+        if not os.path.exists(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            tmp = target + PART_SUFFIX
+            with self.open(operation, name, date) as fin, open(tmp, "wb") as fout:
+                shutil.copyfileobj(fin, fout, _CHUNK)
+            os.replace(tmp, target)
+        return target
+
+    def mmap(self, operation: str, name: str, date: Optional[str] = None) -> mmap.mmap:
+        """Read-only mmap of the materialized snapshot."""
+        with open(self.materialize(operation, name, date), "rb") as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def apply_retention(self, days: int) -> int:
+        """Drops the entries older than days (0 keeps all) and the unreferenced blobs; returns blobs deleted."""
+        if days <= 0:
+            return 0
+        oldest = (ddate.today() - timedelta(days=days)).isoformat()
+        with self._conn:
+            self._conn.execute("DELETE FROM entry WHERE date < ?", (oldest,))
+            orphans = self._conn.execute(
+                "SELECT sha1, codec FROM blob WHERE sha1 NOT IN (SELECT sha1 FROM entry)").fetchall()
+            self._conn.executemany("DELETE FROM blob WHERE sha1 = ?", [(sha1,) for sha1, _ in orphans])
+        for sha1, codec in orphans:
+            for path in (self._blob_path(sha1, codec),
+                         *(os.path.join(self.root, "_extract", f) for f in self._extracted(sha1))):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        self.removed += len(orphans)
+        if orphans:
+            logging.info(f"Blob store: {len(orphans)} blob(s) older than {days} days deleted")
+        return len(orphans)
+
+    def _extracted(self, sha1: str):
+        folder = os.path.join(self.root, "_extract")
+        return [f for f in os.listdir(folder) if f.startswith(sha1)] if os.path.isdir(folder) else []
+
+    def summary(self) -> str:
+        entries = self._conn.execute("SELECT COUNT(*) FROM entry").fetchone()[0]
+        blobs, size, stored = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(stored_size), 0) FROM blob").fetchone()
+        logical = self._conn.execute(
+            "SELECT COALESCE(SUM(b.size), 0) FROM entry e JOIN blob b ON b.sha1 = e.sha1").fetchone()[0]
+        return (f"Blob store: {self.added} added, {self.deduplicated} deduplicated, {self.removed} deleted; "
+                f"{entries} snapshot(s) {logical / 1048576:.1f} MB in {blobs} blob(s) "
+                f"{stored / 1048576:.1f} MB ({size / 1048576:.1f} MB uncompressed)")
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __enter__(self) -> "BlobStore":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
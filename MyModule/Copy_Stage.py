@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Version: 1.0.0
+Last Modified: 2026-10-16
+
+Description:
+Copy of the source workbooks from the share into ../DataFile/... that skips files
+already there. A destination with the same size and mtime (within 2 s, the SMB /
+FAT resolution) as the source is identical and not copied again; with verify_hash
+the SHA-1 of both files has to match as well.
+
+Copies keep the mtime of the source (so the next run can compare), go to
+<name>.part first and are renamed into place, so a reader never sees a half
+copied workbook. A failed copy is retried (retries, growing delay). copy_many()
+copies several files in a thread pool, so the slow UNC transfers overlap.
+Every file's time and size are kept for summary(), and source_stat() returns the
+size/mtime the source had when its copy was made (for Source_Manifest.record()).
+
+[Paths] options read by from_config():
+
+  - copy_workers     : parallel copies (default 4)
+  - copy_retries     : retries after a failed copy (default 2)
+  - copy_verify_hash : also compare the content hash (default false)
+
+Usage:
+    copier = Copy_Stage.from_config(config)
+    copied = copier.copy(file, dest_dir)                       # one file, raises on failure
+    for src, copied, error in copier.copy_many(files, dest_dir):   # in the order of files
+        ...
+        manifest.record(src, local_copy=copied, stat=copier.source_stat(copied))
+    logging.info(copier.summary())
+"""
+
+import os
+import time
+import shutil
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import Source_Manifest
+
+MTIME_TOLERANCE = 2.0
+PART_SUFFIX = ".part"
+
+
+def identical(src: str, dst: str, verify_hash: bool = False) -> bool:
+    """True when dst exists with the size and mtime (and with verify_hash the content) of src."""
+    try:
+        s, d = os.stat(src), os.stat(dst)
+    except OSError:
+        return False
+    if s.st_size != d.st_size or abs(s.st_mtime - d.st_mtime) > MTIME_TOLERANCE:
+        return False
+    return not verify_hash or Source_Manifest.file_hash(src) == Source_Manifest.file_hash(dst)
+
+
+def from_config(config) -> "CopyStage":
+    """CopyStage with the [Paths] copy_* options of an operation ini."""
+    return CopyStage(
+        workers=config.getint("Paths", "copy_workers", fallback=4),
+        retries=config.getint("Paths", "copy_retries", fallback=2),
+        verify_hash=config.getboolean("Paths", "copy_verify_hash", fallback=False),
+    )
+
+
+class CopyStage:
+    """Skip-if-identical copies with retry; one instance per run / ini."""
+
+    def __init__(self, workers: int = 4, retries: int = 2, retry_delay: float = 1.0, verify_hash: bool = False):
+        self.workers = max(1, int(workers))
+        self.retries = max(0, int(retries))
+        self.retry_delay = retry_delay
+        self.verify_hash = verify_hash
+        self._lock = threading.Lock()
+        self.copied: List[Tuple[str, float, int]] = []  # (source, seconds, bytes)
+        self._source_stats: Dict[str, os.stat_result] = {}  # destination -> source stat taken before the copy
+        self.skipped = 0
+        self.failed = 0
+
+    def _copy_once(self, src: str, dst: str) -> None:
+        tmp = dst + PART_SUFFIX
+        try:
+            shutil.copyfile(src, tmp)
+            shutil.copystat(src, tmp)
+            os.replace(tmp, dst)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def copy(self, src: str, dst_dir: str) -> str:
+        """Copies src into dst_dir unless an identical copy is there; returns the destination path."""
+        os.makedirs(dst_dir, exist_ok=True)
+        dst = os.path.join(dst_dir, os.path.basename(src))
+        try:
+            st = os.stat(src)
+        except OSError:
+            st = None
+        if os.path.abspath(src) == os.path.abspath(dst) or identical(src, dst, self.verify_hash):
+            with self._lock:
+                self.skipped += 1
+                if st is not None:
+                    self._source_stats[os.path.abspath(dst)] = st
+            logging.info(f"Copy stage: {dst} is identical to {src}, not copied")
+            return dst
+        for attempt in range(self.retries + 1):
+            t0 = time.perf_counter()
+            try:
+                st = os.stat(src)  # taken before the copy: a later edit shows up as a changed source
+                self._copy_once(src, dst)
+            except OSError as e:
+                if attempt == self.retries:
+                    with self._lock:
+                        self.failed += 1
+                    logging.error(f"Copy stage: copying {src} failed after {attempt + 1} attempt(s): {e}")
+                    raise
+                logging.warning(f"Copy stage: copying {src} failed (attempt {attempt + 1}), retrying: {e}")
+                time.sleep(self.retry_delay * (2 ** attempt))
+                continue
+            elapsed = time.perf_counter() - t0
+            size = os.path.getsize(dst)
+            with self._lock:
+                self.copied.append((src, elapsed, size))
+                self._source_stats[os.path.abspath(dst)] = st
+            logging.info(f"Copy stage: {src} -> {dst} ({size / 1048576:.1f} MB, {elapsed:.2f}s)")
+            return dst
+
+    def copy_many(self, sources: Iterable[str], dst_dir: str) -> List[Tuple[str, Optional[str], Optional[Exception]]]:
+        """Copies the sources concurrently; returns (source, destination or None, error or None) in order."""
+        sources = list(sources)
+        if not sources:
+            return []
+        with ThreadPoolExecutor(min(self.workers, len(sources)), thread_name_prefix="copy") as pool:
+            futures = [pool.submit(self.copy, src, dst_dir) for src in sources]
+        results = []
+        for src, future in zip(sources, futures):
+            error = future.exception()
+            results.append((src, None, error) if error is not None else (src, future.result(), None))
+        return results
+
+    def source_stat(self, dst: str) -> Optional[os.stat_result]:
+        """Stat of the source at the time dst was copied (or found identical); None if unknown."""
+        with self._lock:
+            return self._source_stats.get(os.path.abspath(dst))
+
+    def summary(self) -> str:
+        with self._lock:
+            times = sorted(t for _, t, _ in self.copied)
+            total = sum(size for _, _, size in self.copied)
+            skipped, failed = self.skipped, self.failed
+        if not times:
+            return f"Copy stage: 0 copied, {skipped} identical (skipped), {failed} failed"
+        seconds = sum(times)
+        return (f"Copy stage: {len(times)} copied ({total / 1048576:.1f} MB), {skipped} identical (skipped), "
+                f"{failed} failed, per file p50={times[len(times) // 2]:.2f}s max={times[-1]:.2f}s, "
+                f"{total / 1048576 / seconds if seconds else 0:.1f} MB/s")
@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Version: 1.0.0
+Last Modified: 2026-10-16
+
+Description:
+Index of the rows an operation already uploaded, so the table operations that
+output a Running_date window (048 TAK_SPUT, 049 TAK_PLX C) write only the rows
+that were not in an earlier CSV instead of the whole window every run.
+
+Every row is reduced to a 16 byte fingerprint (SHA-1 of its business key and all
+its values, as written to the CSV), kept per scope (ini file) in one SQLite file
+(../DataFile/Emit_Index.sqlite by default). A row whose values changed therefore
+has a new fingerprint and is uploaded again.
+
+filter_new() drops the rows already in the index; record() collects the
+fingerprints of the rows written and commit() stores them in one transaction, to
+be called once the outputs exist (published). Entries older than retention_days
+are evicted: a row is emitted after its own date, so such a row is outside the
+Running_date window anyway.
+
+Re-emission of everything: '--force-emit' on the command line or
+[Options] force_emit = true in the ini (the index is still updated).
+
+Usage:
+    index = Emit_Index.EmitIndex(scope=os.path.basename(config_path), retention_days=running_date,
+                                 force=Emit_Index.force_emit_requested(config))
+    df = index.filter_new(df, key_columns=["Serial_Number", "Start_Date_Time"], ignore_columns=["SORTNUMBER"])
+    df.to_csv(...)
+    index.record(df)
+    ... publish ...
+    index.commit()
+"""
+
+import os
+import sys
+import sqlite3
+import hashlib
+import logging
+from datetime import datetime, timedelta, time as dtime
+from typing import Iterable, List
+
+import pandas as pd
+
+DEFAULT_PATH = "../DataFile/Emit_Index.sqlite"
+FORCE_EMIT_ARG = "--force-emit"
+FINGERPRINT_BYTES = 16
+_SEPARATOR = "\x1f"
+
+
+def force_emit_requested(config=None) -> bool:
+    """True when '--force-emit' is on the command line or [Options] force_emit = true."""
+    if FORCE_EMIT_ARG in sys.argv:
+        return True
+    if config is not None and config.has_option("Options", "force_emit"):
+        try:
+            return config.getboolean("Options", "force_emit")
+        except ValueError:
+            return False
+    return False
+
+
+class EmitIndex:
+    """Fingerprints of the emitted rows of one scope."""
+
+    def __init__(self, path: str = DEFAULT_PATH, scope: str = "", retention_days: int = 0,
+                 force: bool = False):
+        self.path = path
+        self.scope = scope
+        self.retention_days = int(retention_days)
+        self.force = force
+        self._pending: List[bytes] = []
+        self._key_columns: List[str] = []
+        self._ignore_columns: List[str] = []
+        self.dropped = 0
+        self.emitted = 0
+        self.evicted = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS emitted ("
+            " scope TEXT NOT NULL, fingerprint BLOB NOT NULL, emitted REAL NOT NULL,"
+            " PRIMARY KEY (scope, fingerprint)) WITHOUT ROWID")
+        self._conn.commit()
+        if self.force:
+            logging.info(f"Emit index: {FORCE_EMIT_ARG} / force_emit, every row of {scope} is emitted again")
+
+    def fingerprints(self, df: pd.DataFrame, key_columns: Iterable[str] = (),
+                     ignore_columns: Iterable[str] = ()) -> List[bytes]:
+        """Fingerprint of every row: key columns first, then the other columns by name."""
+        key = [c for c in key_columns if c in df.columns]
+        ignore = set(ignore_columns)
+        columns = key + sorted(str(c) for c in df.columns if c not in key and c not in ignore)
+        text = df[columns].astype(str)
+        joined = text.iloc[:, 0].str.cat([text[c] for c in columns[1:]], sep=_SEPARATOR) if columns else []
+        return [hashlib.sha1(row.encode("utf-8")).digest()[:FINGERPRINT_BYTES] for row in joined]
+
+    def _known(self, fingerprints: List[bytes]) -> set:
+        known = set()
+        unique = list(dict.fromkeys(fingerprints))
+        for i in range(0, len(unique), 500):  # SQLite variable limit
+            chunk = unique[i:i + 500]
+            rows = self._conn.execute(
+                f"SELECT fingerprint FROM emitted WHERE scope = ? AND fingerprint IN ({','.join('?' * len(chunk))})",
+                [self.scope] + chunk).fetchall()
+            known.update(row[0] for row in rows)
+        return known
+
+    def filter_new(self, df: pd.DataFrame, key_columns: Iterable[str] = (),
+                   ignore_columns: Iterable[str] = ()) -> pd.DataFrame:
+        """
+        Rows of df that were not emitted before (all rows with force). The key and
+        ignore columns are remembered for record().
+        """
+        self._key_columns = list(key_columns)
+        self._ignore_columns = list(ignore_columns)
+        if df.empty or self.force:
+            return df
+        fingerprints = self.fingerprints(df, self._key_columns, self._ignore_columns)
+        known = self._known(fingerprints)
+        keep = [fp not in known for fp in fingerprints]
+        dropped = len(keep) - sum(keep)
+        if dropped:
+            self.dropped += dropped
+            logging.info(f"Emit index: {dropped} of {len(df)} row(s) already emitted, dropped")
+        return df[keep]
+
+    def record(self, df: pd.DataFrame) -> None:
+        """Collects the fingerprints of the written rows; they are stored by commit()."""
+        if not df.empty:
+            self._pending.extend(self.fingerprints(df, self._key_columns, self._ignore_columns))
+
+    def commit(self) -> int:
+        """Stores the recorded fingerprints and evicts the expired ones; returns the number stored."""
+        now = datetime.now().timestamp()
+        with self._conn:
+            if self._pending:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO emitted (scope, fingerprint, emitted) VALUES (?, ?, ?)",
+                    [(self.scope, fp, now) for fp in dict.fromkeys(self._pending)])
+            if self.retention_days > 0:
+                # start of the oldest day in the window (the operations compare dates, not times)
+                oldest = (datetime.now() - timedelta(days=self.retention_days)).date()
+                cutoff = datetime.combine(oldest, dtime.min).timestamp()
+                cur = self._conn.execute("DELETE FROM emitted WHERE scope = ? AND emitted < ?",
+                                         (self.scope, cutoff))
+                self.evicted += max(cur.rowcount, 0)
+        count = len(set(self._pending))
+        self.emitted += count
+        self._pending = []
+        return count
+
+    def rollback(self) -> None:
+        """Drops the recorded fingerprints (the rows are emitted again next run)."""
+        self._pending = []
+
+    def summary(self) -> str:
+        size = self._conn.execute("SELECT COUNT(*) FROM emitted WHERE scope = ?", (self.scope,)).fetchone()[0]
+        return (f"Emit index {self.scope}: {self.emitted} row(s) emitted, {self.dropped} already emitted, "
+                f"{self.evicted} evicted, {size} indexed")
+
+    def close(self) -> None:
+        if self._pending:
+            logging.warning(f"Emit index: {len(self._pending)} fingerprint(s) not committed, discarded")
+            self._pending = []
+        self._conn.close()
+
+    def __enter__(self) -> "EmitIndex":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        # commit() is explicit (after the outputs were published); anything else is discarded
+        self.close()
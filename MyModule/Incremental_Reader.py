@@ -0,0 +1,290 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Version: 1.0.0
+Last Modified: 2026-10-16
+
+Description:
+Tail-only Excel reader. For every (scope, workbook name, sheet) it remembers the last
+consumed row (watermark) and a hash per block of BLOCK_ROWS sheet rows of everything
+consumed up to it. The next read streams the sheet with openpyxl in read-only mode,
+verifies the block hashes and returns the rows past the watermark plus the consumed
+rows of every block that was edited since (rows_edited), so corrections to old rows
+are read again without parsing the whole sheet into a DataFrame. When the sheet got
+shorter than the watermark, the whole sheet is read again from first_row.
+
+The returned DataFrame has the values of pd.read_excel(header=None, usecols=...)
+with columns numbered 0..n-1 over the usecols range (the layout the scripts set with
+'df.columns = range(df.shape[1])') and the 0-based sheet row as index, so 'df.index'
+equals the old 'df.index + skiprows'. Completely empty rows are left out.
+
+The new watermark is only persisted by commit(), called after the outputs of the
+read were written. With a State_Store.StateStore the watermarks are kept there
+(the JSON file is imported once) and commit() hands them to the store, which
+writes them together with the rest of the run's state.
+
+Usage:
+    reader = Incremental_Reader.IncrementalReader('./Incremental_State.json', scope=operation)
+    reader = Incremental_Reader.IncrementalReader('./Incremental_State.json', scope=operation, store=store)
+    df = reader.read_new_rows(excel_file, sheet_name, usecols='B:Q', first_row=101)
+    ... process / write outputs ...
+    reader.commit()
+"""
+
+import os
+import json
+import hashlib
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.utils import column_index_from_string
+
+# Sheet rows (counted from first_row) covered by one block hash
+BLOCK_ROWS = 100
+
+
+def parse_usecols(usecols: Optional[str]) -> Optional[List[int]]:
+    """'B:Q' or 'A,C:E' -> 1-based column numbers; None -> all columns."""
+    if usecols is None or str(usecols).strip() == "":
+        return None
+    cols: List[int] = []
+    for part in str(usecols).split(","):
+        part = part.strip()
+        if ":" in part:
+            a, b = (column_index_from_string(x.strip().upper()) for x in part.split(":"))
+            cols.extend(range(a, b + 1))
+        elif part:
+            cols.append(column_index_from_string(part.upper()))
+    return cols
+
+
+def open_workbook(excel_path: str):
+    """
+    Opens a workbook once in read-only mode so several sheets can be read from it.
+    Returns None for .xls files, which openpyxl cannot read.
+    """
+    if excel_path.lower().endswith(".xls"):
+        return None
+    return load_workbook(excel_path, read_only=True, data_only=True, keep_links=False)
+
+
+def read_sheet(workbook, sheet_name: str, usecols: Optional[str] = None,
+               excel_path: Optional[str] = None) -> pd.DataFrame:
+    """
+    Whole sheet from an open workbook, equivalent to pd.read_excel(header=None, usecols=...)
+    (row 1 is index 0, columns 0..n-1). Falls back to pandas when workbook is None.
+    """
+    if workbook is None:
+        df = pd.read_excel(excel_path, header=None, sheet_name=sheet_name, usecols=usecols)
+        df.columns = range(df.shape[1])
+        return df
+    cols = parse_usecols(usecols)
+    min_col = min(cols) if cols else None
+    max_col = max(cols) if cols else None
+    rows = []
+    for values in workbook[sheet_name].iter_rows(min_col=min_col, max_col=max_col, values_only=True):
+        if cols:
+            values = tuple(values[c - min_col] if c - min_col < len(values) else None for c in cols)
+        rows.append(tuple(values))
+    while rows and all(v is None for v in rows[-1]):  # pandas drops trailing empty rows
+        rows.pop()
+    width = len(cols) if cols else max((len(r) for r in rows), default=0)
+    rows = [r + (None,) * (width - len(r)) for r in rows]
+    return pd.DataFrame(rows, columns=range(width))
+
+
+class IncrementalReader:
+    """Reads only the new rows of a sheet; one instance per operation scope."""
+
+    def __init__(self, state_path: str = "./Incremental_State.json", scope: str = "", store=None):
+        self.state_path = state_path
+        self.scope = scope
+        self.store = store
+        self._state: Dict[str, dict] = {}
+        self._pending: Dict[str, dict] = {}
+        # Information about the last read_new_rows() call
+        self.full_scan = False
+        self.rows_scanned = 0
+        self.rows_edited = 0         # consumed rows returned again because their block changed
+        self.last_row = 0            # 1-based number of the last non-empty row seen
+        self.watermark = 0           # stored last_row the read started from (0 on a full scan);
+                                     # returned rows with df.index < watermark are edited rows
+        self.max_row: Optional[int] = None  # sheet dimension metadata (may be None)
+        if store is not None:
+            store.import_watermarks(state_path)
+        elif os.path.exists(state_path):
+            try:
+                with open(state_path, "r", encoding="utf-8") as f:
+                    self._state = json.load(f)
+            except (OSError, ValueError) as e:
+                logging.warning(f"Incremental state {state_path} unreadable, full scan: {e}")
+
+    def _key(self, excel_path: str, sheet_name: str) -> str:
+        return f"{self.scope}|{os.path.basename(excel_path)}|{sheet_name}"
+
+    def _stored(self, key: str) -> Optional[dict]:
+        if self.store is None:
+            return self._state.get(key)
+        entry = self.store.get(*key.split("|", 2))
+        return entry["detail"] if entry else None
+
+    # ------------------------------------------------------------------
+    def read_new_rows(self, excel_path: str, sheet_name: str, usecols: Optional[str] = None,
+                      first_row: int = 1, force_full: bool = False, workbook=None) -> pd.DataFrame:
+        """
+        Returns the rows after the stored watermark (or from first_row on a full scan)
+        and the consumed rows of the blocks edited since the last read.
+        'workbook' may be a workbook from open_workbook(); it is left open for the caller.
+        """
+        key = self._key(excel_path, sheet_name)
+        cols = parse_usecols(usecols)
+
+        if excel_path.lower().endswith(".xls"):
+            # openpyxl cannot stream the old binary format
+            logging.info(f"{os.path.basename(excel_path)} is .xls, reading the whole sheet")
+            df = pd.read_excel(excel_path, header=None, sheet_name=sheet_name,
+                               usecols=usecols, skiprows=first_row - 1)
+            df.index = df.index + first_row - 1
+            df.columns = range(df.shape[1])
+            self.full_scan, self.rows_scanned, self.rows_edited, self.watermark = True, len(df), 0, 0
+            self.last_row = self.max_row = first_row - 1 + len(df)
+            return df
+
+        state = None if force_full else self._stored(key)
+        if state and (state.get("first_row") != first_row or state.get("usecols") != usecols
+                      or "blocks" not in state):
+            state = None
+
+        wb = workbook or open_workbook(excel_path)
+        try:
+            ws = wb[sheet_name]
+            self.max_row = ws.max_row
+            result = self._scan(ws, cols, first_row, state)
+        finally:
+            if workbook is None:
+                wb.close()
+
+        if result is None:  # sheet shorter than the watermark
+            logging.warning(f"'{sheet_name}' in {os.path.basename(excel_path)} ends before the watermark, "
+                            f"rescanning the whole sheet")
+            return self.read_new_rows(excel_path, sheet_name, usecols, first_row,
+                                      force_full=True, workbook=workbook)
+
+        index, rows, edited, last_row, blocks = result
+        self.full_scan = state is None
+        self.watermark = state["last_row"] if state else 0
+        self.rows_scanned = len(rows)
+        self.rows_edited = edited
+        self.last_row = last_row
+        if last_row >= first_row:
+            self._pending[key] = {
+                "first_row": first_row,
+                "usecols": usecols,
+                "last_row": last_row,
+                "block_rows": BLOCK_ROWS,
+                "blocks": blocks,
+                "updated": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            }
+        if edited:
+            logging.warning(f"{os.path.basename(excel_path)}/{sheet_name}: {edited} rows before the "
+                            f"watermark were edited, reading them again")
+        logging.info(f"{os.path.basename(excel_path)}/{sheet_name}: "
+                     f"{'full scan' if self.full_scan else 'tail read'}, {len(rows) - edited} new rows, "
+                     f"{edited} edited rows, last row {self.last_row}")
+
+        width = len(cols) if cols else max((len(r) for r in rows), default=0)
+        rows = [r + (None,) * (width - len(r)) for r in rows]
+        return pd.DataFrame(rows, index=index, columns=range(width))
+
+    def _scan(self, ws, cols: Optional[List[int]], first_row: int, state: Optional[dict]
+              ) -> Optional[Tuple[List[int], List[tuple], int, int, List[str]]]:
+        """
+        One streaming pass from first_row. With a state the consumed rows are hashed
+        block by block and compared with the stored hashes; the rows of a changed
+        block are returned with the rows past the watermark. Returns (index, rows,
+        number of edited rows, last non-empty row, block hashes), or None when the
+        sheet ends before the watermark.
+        """
+        watermark = state["last_row"] if state else first_row - 1
+        size = state.get("block_rows", BLOCK_ROWS) if state else BLOCK_ROWS
+        stored: List[str] = state["blocks"] if state else []
+        blocks: List[str] = []
+        digest = hashlib.sha1()
+        consumed: List[tuple] = []  # non-empty rows of the current block up to the watermark
+        index: List[int] = []
+        rows: List[tuple] = []
+        edited = 0
+        last_row = first_row - 1
+        reached = state is None
+
+        min_col = min(cols) if cols else None
+        max_col = max(cols) if cols else None
+        rows_iter = ws.iter_rows(min_row=first_row, min_col=min_col, max_col=max_col, values_only=True)
+        for row_no, values in enumerate(rows_iter, start=first_row):
+            block, offset = divmod(row_no - first_row, size)
+            if offset == 0 and block:
+                blocks.append(digest.hexdigest())
+                digest = hashlib.sha1()
+            if cols:
+                values = tuple(values[c - min_col] if c - min_col < len(values) else None for c in cols)
+            else:
+                values = tuple(values)
+            empty = all(v is None for v in values)
+            if not empty:
+                digest.update(repr((row_no, values)).encode("utf-8"))
+                last_row = row_no
+            if row_no <= watermark:
+                if not empty:
+                    consumed.append((row_no, values))
+                if row_no == watermark or offset == size - 1:
+                    if block >= len(stored) or digest.hexdigest() != stored[block]:
+                        for edited_no, edited_values in consumed:
+                            index.append(edited_no - 1)
+                            rows.append(edited_values)
+                        edited += len(consumed)
+                    consumed = []
+                    reached = reached or row_no == watermark
+                continue
+            if empty:
+                continue
+            index.append(row_no - 1)
+            rows.append(values)
+
+        if not reached:  # sheet is now shorter than the watermark
+            return None
+        blocks.append(digest.hexdigest())
+        del blocks[(last_row - first_row) // size + 1:]  # blocks of trailing empty rows
+        return index, rows, edited, last_row, blocks
+
+    # ------------------------------------------------------------------
+    def commit(self) -> None:
+        """Persists the watermarks of all reads since the last commit (with a store: on store.commit())."""
+        if not self._pending:
+            return
+        if self.store is not None:
+            for key, state in self._pending.items():
+                self.store.update(*key.split("|", 2), last_row=state["last_row"], detail=state)
+            self._pending = {}
+            return
+        self._state.update(self._pending)
+        self._pending = {}
+        self._save()
+
+    def reset(self, excel_path: str, sheet_name: str) -> None:
+        """Forgets the watermark so the next read is a full scan."""
+        key = self._key(excel_path, sheet_name)
+        self._pending.pop(key, None)
+        if self.store is not None:
+            self.store.forget(*key.split("|", 2))
+        elif self._state.pop(key, None) is not None:
+            self._save()
+
+    def _save(self) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.state_path)), exist_ok=True)
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._state, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.state_path)
@@ -0,0 +1,300 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Version: 1.0.0
+Last Modified: 2026-10-16
+
+Description:
+Backends for the serial -> (Part_Number, LotNumber_9) lookup of Prime_Lookup.
+[Database] lookup_backend of the operation ini selects one of them:
+
+  - odbc   : production Prime through MyModule SQL (db_connection_string), default.
+             Without [Database] bulk_select_sql the IN-list query is derived from
+             the statement SQL.selectSQL runs (derive_bulk_sql()) and checked once
+             per process against selectSQL before it is used.
+  - sqlite : local table prime_serial(serial, part_number, lot_9) in lookup_path
+  - csv    : local file with the columns Serial_Number, Part_Number, LotNumber_9
+
+The sqlite / csv backends stand in for Prime off-site, e.g. to profile the
+enrichment path with a fixture from write_fixture() (see bat/Benchmark_Lookup.py).
+
+Usage:
+    backend = Lookup_Backend.open_backend('sqlite', '../DataFile/Prime_Fixture.sqlite')
+    part_number, lot_9 = backend.select_one('A1B2C')
+    found = backend.select_many(['A1B2C', 'D3E4F'])   # {serial: (part, lot)}
+    backend.close()
+"""
+
+import os
+import re
+import csv
+import random
+import sqlite3
+import logging
+from typing import Dict, List, Optional, Tuple
+
+Result = Tuple[Optional[str], Optional[str]]
+
+PLACEHOLDER_MARK = "{placeholders}"
+PROBE_SERIAL = "~PROBE~"  # serial handed to SQL.selectSQL when its statement is recorded
+SQLITE_TABLE = "prime_serial"
+CSV_COLUMNS = ["Serial_Number", "Part_Number", "LotNumber_9"]
+
+
+class LookupBackend:
+    """Interface of a lookup source; select_many() handles one IN-list chunk."""
+    name = "base"
+
+    def select_one(self, serial) -> Result:
+        raise NotImplementedError
+
+    def select_many(self, keys: List[str]) -> Dict[str, Result]:
+        """Known keys only. Raises NotImplementedError when there is no bulk query."""
+        raise NotImplementedError
+
+    def ping(self) -> bool:
+        """True while the backend can still answer queries."""
+        return True
+
+    def close(self) -> None:
+        pass
+
+
+class _RecordingCursor:
+    """Stands in for a pyodbc cursor: records execute() calls and returns no rows."""
+
+    def __init__(self):
+        self.statements: List[Tuple[str, tuple]] = []
+        self.description = None
+        self.rowcount = 0
+
+    def execute(self, sql, *params):
+        if len(params) == 1 and isinstance(params[0], (list, tuple)):
+            params = tuple(params[0])
+        self.statements.append((str(sql), tuple(params)))
+        return self
+
+    def fetchone(self):
+        return None
+
+    def fetchall(self):
+        return []
+
+    def fetchval(self):
+        return None
+
+    def __iter__(self):
+        return iter(())
+
+
+_SELECT_RE = re.compile(r"^\s*SELECT\s+(?:TOP\s*\(?\s*1\s*\)?\s+)?(?P<cols>.+?)\s+FROM\s+(?P<source>.+?)"
+                        r"\s+WHERE\s+(?P<where>.+?)\s*;?\s*$", re.IGNORECASE | re.DOTALL)
+_derived = {"sql": None, "done": False, "verified": None}  # per process
+
+
+def derive_bulk_sql() -> Optional[str]:
+    """
+    IN-list form of the single-serial statement SQL.selectSQL runs, e.g.
+    'SELECT a, b FROM t WHERE s = ?' -> 'SELECT s, a, b FROM t WHERE s IN ({placeholders})'.
+    None when selectSQL runs anything else than one SELECT with one serial
+    predicate (as a '?' parameter or a literal).
+    """
+    if _derived["done"]:
+        return _derived["sql"]
+    _derived["done"] = True
+    import SQL
+    recorder = _RecordingCursor()
+    try:
+        SQL.selectSQL(recorder, PROBE_SERIAL)
+    except Exception:
+        pass  # the recorder returned no row
+    if len(recorder.statements) != 1:
+        logging.info(f"selectSQL ran {len(recorder.statements)} statements, no bulk query derived")
+        return None
+    sql, params = recorder.statements[0]
+    match = _SELECT_RE.match(sql)
+    if match is None:
+        logging.info("selectSQL statement is not a plain SELECT ... WHERE, no bulk query derived")
+        return None
+    where = match.group("where")
+    if params == (PROBE_SERIAL,) and where.count("?") == 1:
+        predicate = re.search(r"(?P<col>[\w.\[\]\"]+)\s*=\s*\?", where)
+    elif not params and where.count(PROBE_SERIAL) == 1:
+        predicate = re.search(r"(?P<col>[\w.\[\]\"]+)\s*=\s*N?'" + re.escape(PROBE_SERIAL) + "'", where)
+    else:
+        predicate = None
+    if predicate is None:
+        logging.info("selectSQL statement has no single serial predicate, no bulk query derived")
+        return None
+    column = predicate.group("col")
+    where = where[:predicate.start()] + f"{column} IN ({PLACEHOLDER_MARK})" + where[predicate.end():]
+    _derived["sql"] = f"SELECT {column}, {match.group('cols')} FROM {match.group('source')} WHERE {where}"
+    logging.info(f"Bulk lookup query derived from selectSQL: {_derived['sql']}")
+    return _derived["sql"]
+
+
+class OdbcBackend(LookupBackend):
+    """Prime on SQL Server through MyModule SQL (connSQL / selectSQL / disconnSQL)."""
+    name = "odbc"
+
+    def __init__(self, cursor=None, conn=None, bulk_sql: Optional[str] = None):
+        self.conn = conn
+        self.cursor = cursor
+        self.bulk_sql = bulk_sql
+
+    @classmethod
+    def open(cls, bulk_sql: Optional[str] = None) -> "OdbcBackend":
+        import SQL
+        conn, cursor = SQL.connSQL()
+        if conn is None:
+            raise ConnectionError("Connection with Prime failed")
+        return cls(cursor, conn, bulk_sql)
+
+    def select_one(self, serial) -> Result:
+        import SQL
+        return SQL.selectSQL(self.cursor, serial)
+
+    def select_many(self, keys: List[str]) -> Dict[str, Result]:
+        bulk_sql = self.bulk_sql
+        if not bulk_sql and _derived["verified"] is not False:
+            bulk_sql = derive_bulk_sql()
+        if not bulk_sql:
+            raise NotImplementedError("no bulk_select_sql configured or derived")
+        self.cursor.execute(bulk_sql.replace(PLACEHOLDER_MARK, ",".join("?" * len(keys))), keys)
+        found: Dict[str, Result] = {}
+        for row in self.cursor.fetchall():
+            found.setdefault(str(row[0]).strip(), (row[1], row[2]))
+        if not self.bulk_sql and _derived["verified"] is None and found:
+            self._verify_derived(found)
+        return found
+
+    def _verify_derived(self, found: Dict[str, Result]) -> None:
+        """The derived query is only kept when it returns what selectSQL returns for one serial."""
+        key, result = next(iter(found.items()))
+        expected = self.select_one(key)
+        _derived["verified"] = tuple(expected or (None, None)) == tuple(result)
+        if not _derived["verified"]:
+            logging.warning(f"Derived bulk query returned {result} for {key}, selectSQL {expected}; "
+                            f"using per-serial queries (set [Database] bulk_select_sql)")
+            raise NotImplementedError("derived bulk query does not match selectSQL")
+
+    def ping(self) -> bool:
+        try:
+            self.cursor.execute("SELECT 1")
+            self.cursor.fetchall()
+            return True
+        except Exception:
+            return False
+
+    def close(self) -> None:
+        if self.conn is not None:
+            import SQL
+            SQL.disconnSQL(self.conn, self.cursor)
+            self.conn = self.cursor = None
+
+
+class SqliteBackend(LookupBackend):
+    """Local SQLite copy of the serial table (read only)."""
+    name = "sqlite"
+
+    def __init__(self, path: str):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Lookup database not found: {path}")
+        self.path = path
+        self._conn = sqlite3.connect(path, timeout=30)
+
+    def select_one(self, serial) -> Result:
+        row = self._conn.execute(f"SELECT part_number, lot_9 FROM {SQLITE_TABLE} WHERE serial = ?",
+                                 (str(serial).strip(),)).fetchone()
+        return (row[0], row[1]) if row else (None, None)
+
+    def select_many(self, keys: List[str]) -> Dict[str, Result]:
+        rows = self._conn.execute(
+            f"SELECT serial, part_number, lot_9 FROM {SQLITE_TABLE} "
+            f"WHERE serial IN ({','.join('?' * len(keys))})", keys).fetchall()
+        return {serial: (part, lot) for serial, part, lot in rows}
+
+    def ping(self) -> bool:
+        try:
+            self._conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class CsvBackend(LookupBackend):
+    """Serial table from a CSV file, held in memory."""
+    name = "csv"
+
+    def __init__(self, path: str):
+        self.path = path
+        self._rows: Dict[str, Result] = {}
+        with open(path, "r", newline="", encoding="utf-8-sig") as f:
+            for row in csv.DictReader(f):
+                serial = (row.get("Serial_Number") or "").strip()
+                if serial and serial not in self._rows:
+                    self._rows[serial] = (row.get("Part_Number") or None, row.get("LotNumber_9") or None)
+
+    def select_one(self, serial) -> Result:
+        return self._rows.get(str(serial).strip(), (None, None))
+
+    def select_many(self, keys: List[str]) -> Dict[str, Result]:
+        return {k: self._rows[k] for k in keys if k in self._rows}
+
+
+BACKENDS = {"odbc": OdbcBackend, "sqlite": SqliteBackend, "csv": CsvBackend}
+
+
+def open_backend(kind: str = "odbc", path: Optional[str] = None,
+                 bulk_sql: Optional[str] = None) -> LookupBackend:
+    """Opens the backend named in [Database] lookup_backend."""
+    kind = (kind or "odbc").strip().lower()
+    if kind not in BACKENDS:
+        raise ValueError(f"Unknown lookup_backend '{kind}', expected one of {', '.join(BACKENDS)}")
+    if kind == "odbc":
+        return OdbcBackend.open(bulk_sql)
+    if not path:
+        raise ValueError(f"lookup_backend = {kind} needs lookup_path")
+    return BACKENDS[kind](path)
+
+
+def write_fixture(path: str, serials: int = 20000, parts: int = 60, seed: int = 1) -> List[str]:
+    """
+    Writes a reproducible serial table (.sqlite/.db or .csv by extension) shaped like
+    Prime: 5-character serials, 9-character lots ending in the serial
+    (yy + 2 letters + serial) and a few dozen part numbers with skewed usage.
+    Returns the serials in insertion order.
+    """
+    rng = random.Random(seed)
+    alphabet = "ABCDEFGHJKLMNPQRSTUVWXYZ0123456789"
+    part_numbers = [f"HL{13 + i % 5}B{i % 9}-BT{20 + i % 7}{chr(65 + i // 35)}" for i in range(parts)]
+    weights = [1.0 / (i + 1) for i in range(parts)]  # a few parts carry most of the volume
+    seen = set()
+    rows = []
+    while len(rows) < serials:
+        serial = "".join(rng.choice(alphabet) for _ in range(5))
+        if serial in seen:
+            continue
+        seen.add(serial)
+        lot_9 = f"{rng.randint(20, 26)}{rng.choice('ABCDEFGH')}{rng.choice('KLMNPQR')}{serial}"
+        rows.append((serial, rng.choices(part_numbers, weights)[0], lot_9))
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    if path.lower().endswith(".csv"):
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(CSV_COLUMNS)
+            writer.writerows(rows)
+    else:
+        if os.path.exists(path):
+            os.remove(path)
+        conn = sqlite3.connect(path)
+        with conn:
+            conn.execute(f"CREATE TABLE {SQLITE_TABLE} (serial TEXT PRIMARY KEY, part_number TEXT, lot_9 TEXT)")
+            conn.executemany(f"INSERT INTO {SQLITE_TABLE} VALUES (?, ?, ?)", rows)
+        conn.close()
+    logging.info(f"Lookup fixture {path}: {len(rows)} serials, {parts} part numbers")
+    return [r[0] for r in rows]
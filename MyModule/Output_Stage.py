@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Version: 1.0.0
+Last Modified: 2026-10-16
+
+Description:
+Local staging of a run's output files (CSV, XML) with one batch publish to the
+share. The operations write to a local path (stage.path(final_path)) instead of
+output_path / CSV_path. publish() then copies the files in parallel to
+<final>.part next to their destination and renames them (os.replace), so a
+reader of the share sees either no file or the complete one.
+
+All non-XML files are published before any XML, and an XML staged with
+after=<csv final path> is only published once that CSV is in place. The pointer
+XML therefore never appears before the CSV it points at.
+
+Every destination folder has its own sub folder in the staging folder, with the
+destination recorded in _target.txt, and the `after` paths of a staged file are
+kept next to it in <name>.after.json. Files that could not be published (share
+unreachable, run interrupted before publish()) therefore stay there and are
+published by the next run in the same order. Only a file whose staged copy
+disappeared is lost (counted in `lost`); the caller should then not save its read
+position. An empty staging_dir disables staging (path() returns the final path,
+publish() does nothing).
+
+Usage:
+    stage = Output_Stage.OutputStage('../Staging/051_Particle')
+    df.to_csv(stage.path(csv_path), index=False)
+    Xml_Writer.write_file(stage.path(xml_path, after=csv_path), content)  # content points at csv_path
+    failures = stage.publish()
+
+    with Output_Stage.OutputStage(staging_dir) as stage:   # publish() on a clean exit
+        ...
+"""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+TARGET_FILE = "_target.txt"
+PART_SUFFIX = ".part"
+AFTER_SUFFIX = ".after.json"
+
+
+class OutputStage:
+    """Output files of one run, staged locally and published to the share in one batch."""
+
+    def __init__(self, staging_dir: Optional[str], workers: int = 4):
+        self.staging_dir = os.path.abspath(staging_dir) if staging_dir else None
+        self.workers = max(1, int(workers))
+        self._entries: Dict[str, dict] = {}  # final path -> {"local", "after"}
+        self.published = 0
+        self.failed = 0
+        self.lost = 0  # staged copy missing: cannot be retried, its rows have to be output again
+        self.seconds = 0.0
+        if self.staging_dir:
+            os.makedirs(self.staging_dir, exist_ok=True)
+            self._recover()
+
+    @property
+    def enabled(self) -> bool:
+        return self.staging_dir is not None
+
+    def _recover(self) -> None:
+        """Registers the files a previous run left in the staging folder."""
+        for folder in os.scandir(self.staging_dir):
+            target_file = os.path.join(folder.path, TARGET_FILE)
+            if not folder.is_dir() or not os.path.exists(target_file):
+                continue
+            with open(target_file, "r", encoding="utf-8") as f:
+                target = f.read().strip()
+            for item in os.scandir(folder.path):
+                if (not item.is_file() or item.name == TARGET_FILE or item.name.endswith(PART_SUFFIX)
+                        or item.name.endswith(AFTER_SUFFIX)):
+                    continue
+                after = []
+                if os.path.exists(item.path + AFTER_SUFFIX):
+                    try:
+                        with open(item.path + AFTER_SUFFIX, "r", encoding="utf-8") as f:
+                            after = json.load(f)
+                    except (OSError, ValueError) as e:
+                        logging.warning(f"Output stage: {item.path}{AFTER_SUFFIX} unreadable, published unordered: {e}")
+                self._entries[os.path.join(target, item.name)] = {"local": item.path, "after": after}
+        if self._entries:
+            logging.info(f"Output stage: {len(self._entries)} file(s) left from a previous run will be published")
+
+    def path(self, final_path, after=None) -> str:
+        """
+        Local path to write instead of final_path (its folder is created).
+        after: final path(s) that must be published before this file.
+        """
+        final = os.path.abspath(str(final_path))
+        if not self.enabled:
+            os.makedirs(os.path.dirname(final), exist_ok=True)
+            return final
+        entry = self._entries.get(final)
+        if entry is None:
+            # one sub folder per destination folder, so equal names in different folders do not collide
+            target = os.path.dirname(final)
+            local_dir = os.path.join(self.staging_dir, hashlib.md5(target.lower().encode("utf-8")).hexdigest()[:10])
+            if not os.path.exists(os.path.join(local_dir, TARGET_FILE)):
+                os.makedirs(local_dir, exist_ok=True)
+                with open(os.path.join(local_dir, TARGET_FILE), "w", encoding="utf-8") as f:
+                    f.write(target)
+            entry = self._entries[final] = {"local": os.path.join(local_dir, os.path.basename(final)), "after": []}
+        if after is not None:
+            for dep in ([after] if isinstance(after, (str, os.PathLike)) else after):
+                dep = os.path.abspath(str(dep))
+                if dep not in entry["after"]:
+                    entry["after"].append(dep)
+            with open(entry["local"] + AFTER_SUFFIX, "w", encoding="utf-8") as f:
+                json.dump(entry["after"], f, ensure_ascii=False)
+        return entry["local"]
+
+    def discard(self, final_path) -> None:
+        """Forgets final_path when its staged copy was never written (nothing to publish)."""
+        final = os.path.abspath(str(final_path))
+        entry = self._entries.get(final)
+        if entry is not None and not os.path.exists(entry["local"]):
+            del self._entries[final]
+            if os.path.exists(entry["local"] + AFTER_SUFFIX):
+                os.remove(entry["local"] + AFTER_SUFFIX)
+
+    @staticmethod
+    def _copy(local: str, final: str) -> None:
+        os.makedirs(os.path.dirname(final), exist_ok=True)
+        tmp = final + PART_SUFFIX
+        shutil.copyfile(local, tmp)
+        os.replace(tmp, final)
+        os.remove(local)
+        if os.path.exists(local + AFTER_SUFFIX):
+            os.remove(local + AFTER_SUFFIX)
+
+    def publish(self) -> List[Tuple[str, Exception]]:
+        """Publishes every staged file; returns (final path, error) of the ones that failed."""
+        if not self.enabled or not self._entries:
+            return []
+        t0 = time.perf_counter()
+        done, lost, failures = set(), set(), []
+
+        def run_phase(finals: List[str]) -> None:
+            ready = []
+            for final in finals:
+                entry = self._entries[final]
+                missing = [dep for dep in entry["after"] if dep in self._entries and dep not in done]
+                if missing:
+                    failures.append((final, RuntimeError(f"waits for {missing[0]}, which was not published")))
+                elif not os.path.exists(entry["local"]):
+                    lost.add(final)
+                    failures.append((final, FileNotFoundError(f"staged file {entry['local']} not found")))
+                else:
+                    ready.append(final)
+            with ThreadPoolExecutor(min(self.workers, max(1, len(ready)))) as pool:
+                futures = {pool.submit(self._copy, self._entries[f]["local"], f): f for f in ready}
+            for future, final in futures.items():
+                error = future.exception()
+                if error is None:
+                    done.add(final)
+                else:
+                    failures.append((final, error))
+
+        finals = list(self._entries)
+        run_phase([f for f in finals if not f.lower().endswith(".xml")])
+        run_phase([f for f in finals if f.lower().endswith(".xml")])
+
+        # failed files stay staged for the next run; missing ones cannot be retried
+        retry = {f for f, _ in failures if f not in lost}
+        for final in finals:
+            if final not in retry:
+                self._entries.pop(final, None)
+
+        self.published += len(done)
+        self.failed += len(failures)
+        self.lost += len(lost)
+        self.seconds += time.perf_counter() - t0
+        for final, error in failures:
+            logging.error(f"Output stage: publishing {final} failed: {error}")
+        logging.info(self.summary())
+        return failures
+
+    def summary(self) -> str:
+        if not self.enabled:
+            return "Output stage: disabled (files written directly)"
+        lost = f" ({self.lost} lost)" if self.lost else ""
+        return (f"Output stage: {self.published} file(s) published, {self.failed} failed{lost}, "
+                f"{len(self._entries)} pending, {self.seconds:.2f}s")
+
+    def __enter__(self) -> "OutputStage":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        # after an error the run's files may be incomplete; they are not published by this run
+        if exc_type is None:
+            self.publish()
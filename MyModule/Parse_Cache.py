@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Version: 1.0.0
+Last Modified: 2026-10-16
+
+Description:
+Content-addressed cache of parsed worksheets. A parsed DataFrame is stored once as a
+columnar file named after the SHA-1 of the source workbook plus a hash of the parse
+parameters (sheet, columns, header row ...). Any later run or backfill that needs
+the same file with the same parameters loads the columnar copy instead of parsing
+the workbook again; a workbook whose content changed gets a new key.
+
+  - Feather (pyarrow) is used when pyarrow is installed, pickle otherwise.
+  - index.json in the cache folder maps path/size/mtime -> SHA-1 so unchanged
+    files are not re-hashed on every run.
+  - load()/store() only touch their own cache file, so they can be called from
+    worker processes; key_for() (which updates the index) belongs to the main process.
+
+Usage:
+    cache = Parse_Cache.ParseCache('../DataFile/051_Particle/_parse_cache/')
+    key = cache.key_for(xls_path, {'sheet': 'KeisokuDataTable', 'usecols': 'A:U'})
+    df = cache.load(key)
+    if df is None:
+        df = parse(xls_path)
+        cache.store(key, df)
+    cache.save_index()
+"""
+
+import os
+import json
+import hashlib
+import logging
+from typing import Callable, Dict, Optional
+
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+    _HAS_ARROW = True
+except ImportError:
+    _HAS_ARROW = False
+
+from Source_Manifest import file_hash
+
+
+class ParseCache:
+    """Parsed-sheet cache folder; one instance per script run."""
+
+    def __init__(self, cache_dir: str, enabled: bool = True):
+        self.cache_dir = cache_dir
+        self.enabled = enabled
+        self.ext = ".feather" if _HAS_ARROW else ".pkl"
+        self.hits = 0
+        self.misses = 0
+        self._index_path = os.path.join(cache_dir, "index.json")
+        self._index: Dict[str, dict] = {}
+        self._index_dirty = False
+        if enabled:
+            os.makedirs(cache_dir, exist_ok=True)
+            if os.path.exists(self._index_path):
+                try:
+                    with open(self._index_path, "r", encoding="utf-8") as f:
+                        self._index = json.load(f)
+                except (OSError, ValueError) as e:
+                    logging.warning(f"Parse cache index unreadable, rebuilding: {e}")
+
+    # ------------------------------------------------------------------
+    def content_hash(self, path: str) -> str:
+        """SHA-1 of the file, reused from the index while size and mtime are unchanged."""
+        st = os.stat(path)
+        key = os.path.normcase(os.path.abspath(path))
+        entry = self._index.get(key)
+        if entry and entry["size"] == st.st_size and entry["mtime"] == st.st_mtime:
+            return entry["sha1"]
+        digest = file_hash(path)
+        self._index[key] = {"size": st.st_size, "mtime": st.st_mtime, "sha1": digest}
+        self._index_dirty = True
+        return digest
+
+    def key_for(self, path: str, params: Optional[dict] = None) -> str:
+        """Cache key = content hash + hash of the parse parameters."""
+        param_hash = hashlib.sha1(json.dumps(params or {}, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+        return f"{self.content_hash(path)}_{param_hash}"
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + self.ext)
+
+    # ------------------------------------------------------------------
+    def load(self, key: str) -> Optional[pd.DataFrame]:
+        if not self.enabled:
+            return None
+        fp = self._file(key)
+        if not os.path.exists(fp):
+            self.misses += 1
+            return None
+        try:
+            df = pd.read_feather(fp) if self.ext == ".feather" else pd.read_pickle(fp)
+        except Exception as e:
+            logging.warning(f"Parse cache entry {fp} unreadable, re-parsing: {e}")
+            self.misses += 1
+            return None
+        self.hits += 1
+        return df
+
+    def store(self, key: str, df: pd.DataFrame) -> None:
+        if not self.enabled:
+            return
+        fp = self._file(key)
+        tmp = f"{fp}.{os.getpid()}.tmp"
+        try:
+            if self.ext == ".feather":
+                df.reset_index(drop=True).to_feather(tmp)
+            else:
+                df.to_pickle(tmp)
+            os.replace(tmp, fp)
+        except Exception as e:
+            logging.warning(f"Could not write parse cache entry {fp}: {e}")
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def get_or_parse(self, path: str, params: dict, parse_func: Callable[[], pd.DataFrame]) -> pd.DataFrame:
+        """Loads the cached frame for path/params, or parses and stores it."""
+        if not self.enabled:
+            return parse_func()
+        key = self.key_for(path, params)
+        df = self.load(key)
+        if df is None:
+            df = parse_func()
+            self.store(key, df)
+        return df
+
+    def save_index(self) -> None:
+        if not (self.enabled and self._index_dirty):
+            return
+        tmp = self._index_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._index, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self._index_path)
+        self._index_dirty = False
@@ -0,0 +1,356 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Version: 1.0.0
+Last Modified: 2026-10-16
+
+Description:
+Bulk Prime lookup of serial numbers -> (Part_Number, LotNumber_9). Instead of one
+SQL.selectSQL round trip per row, the serials are de-duplicated and resolved with
+chunked IN-list queries, so a 2,000-row sheet costs a handful of queries.
+
+By default the IN-list query is derived from the single-serial statement that
+SQL.selectSQL runs (Lookup_Backend.derive_bulk_sql()) and checked once against
+selectSQL. [Database] bulk_select_sql of the operation's ini overrides it; it
+must return serial, part number, 9-digit lot (in this order) and contain the
+'{placeholders}' marker where the '?' parameters go, e.g.
+
+    bulk_select_sql = SELECT serial, part_number, lot_9 FROM ... WHERE serial IN ({placeholders})
+
+When no query can be derived (or the bulk query fails) every unique serial is
+resolved with SQL.selectSQL, which still saves the round trips for duplicates.
+
+[Database] lookup_backend = odbc (default) | sqlite | csv and lookup_path select
+where the serials are resolved (see Lookup_Backend); sqlite / csv are local
+stand-ins for Prime and do not use the serial cache unless serial_cache = true.
+
+Serials are looked up in the shared Serial_Cache first ([Database] serial_cache,
+serial_cache_path, serial_cache_ttl_hours, serial_cache_negative_ttl_hours);
+only the misses go to Prime and their results (also 'not found') are cached.
+
+In orchestrated mode (bat/Prefetch.py) the serials of all operations are resolved
+once per cycle and handed over with preload(); bulk_select()/select() answer
+preloaded serials without touching the cache or Prime.
+
+enrich() attaches the result to the data rows with one vectorized map (instead of a
+df.loc[df[col] == serial] scan per serial) and report_unmatched() appends the
+serials Prime could not resolve to a CSV side report (Unmatched_Serials.csv in the
+day's log folder) instead of one log line per serial.
+
+RunConnection keeps one lookup connection for a whole script run: it is opened on
+first use, health-checked before each reuse and shared by every file and ini of
+the run; summary() reports the connect time for the run log.
+
+Usage:
+    Prime_Lookup.configure(config)                 # once per ini
+    conn, cursor = Prime_Lookup.connect()          # SQL.connSQL() or the configured backend
+    lookup = Prime_Lookup.bulk_select(cursor, df['Serial_Number'])
+    # lookup: index = serial, columns Part_Number / LotNumber_9 (known serials only)
+    unmatched = Prime_Lookup.enrich(df, 'Serial_Number', lookup)
+    Prime_Lookup.report_unmatched(report_path, unmatched, operation, source_file)
+    part_number, lot_9 = Prime_Lookup.select(cursor, serial)   # cached drop-in for SQL.selectSQL
+    Prime_Lookup.disconnect(conn, cursor)
+
+    with Prime_Lookup.RunConnection() as prime:    # per run, instead of connect()/disconnect()
+        conn, cursor = prime.get()                 # per file
+    print(prime.summary())
+"""
+
+import os
+import csv
+import time
+import logging
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+import SQL
+import Serial_Cache
+import Lookup_Backend
+
+PLACEHOLDER_MARK = Lookup_Backend.PLACEHOLDER_MARK
+UNMATCHED_REPORT = "Unmatched_Serials.csv"
+DEFAULT_CHUNK_SIZE = 500  # SQL Server allows 2100 parameters per statement
+
+_settings = {"bulk_sql": None, "chunk_size": DEFAULT_CHUNK_SIZE, "cache": None,
+             "backend": "odbc", "backend_path": None}
+_caches = {}  # path -> SerialCache, kept open across ini files of the process
+_preloaded = {}  # serial -> (part, lot) or None, from the current prefetch cycle
+
+
+def configure(config=None, bulk_sql: Optional[str] = None, chunk_size: Optional[int] = None) -> None:
+    """Takes bulk_select_sql / bulk_chunk_size / lookup_backend from the ini's [Database] section."""
+    backend, backend_path = "odbc", None
+    if config is not None and config.has_section("Database"):
+        bulk_sql = bulk_sql or config.get("Database", "bulk_select_sql", raw=True, fallback=None)
+        chunk_size = chunk_size or config.getint("Database", "bulk_chunk_size", fallback=DEFAULT_CHUNK_SIZE)
+        backend = config.get("Database", "lookup_backend", fallback="odbc").strip().lower() or "odbc"
+        backend_path = config.get("Database", "lookup_path", fallback=None)
+    if backend not in Lookup_Backend.BACKENDS:
+        logging.warning(f"Unknown lookup_backend '{backend}', using odbc")
+        backend = "odbc"
+    _settings["backend"], _settings["backend_path"] = backend, backend_path
+    if bulk_sql and PLACEHOLDER_MARK not in bulk_sql:
+        logging.warning(f"bulk_select_sql has no {PLACEHOLDER_MARK} marker, using per-serial lookups")
+        bulk_sql = None
+    _settings["bulk_sql"] = bulk_sql or None
+    _settings["chunk_size"] = max(1, int(chunk_size or DEFAULT_CHUNK_SIZE))
+    _settings["cache"] = _open_cache(config)
+
+
+def _open_cache(config) -> Optional[Serial_Cache.SerialCache]:
+    section = "Database"
+    get = (lambda opt, fb: config.get(section, opt, fallback=fb)) if config is not None else (lambda opt, fb: fb)
+    default = "true" if _settings["backend"] == "odbc" else "false"
+    if str(get("serial_cache", default)).strip().lower() in ("false", "0", "no", "off"):
+        return None
+    path = get("serial_cache_path", Serial_Cache.DEFAULT_PATH)
+    try:
+        ttl = float(get("serial_cache_ttl_hours", Serial_Cache.DEFAULT_TTL_HOURS))
+        negative_ttl = float(get("serial_cache_negative_ttl_hours", Serial_Cache.DEFAULT_NEGATIVE_TTL_HOURS))
+        key = os.path.abspath(path)
+        cache = _caches.get(key)
+        if cache is None:
+            cache = _caches[key] = Serial_Cache.SerialCache(path, ttl, negative_ttl)
+        cache.ttl, cache.negative_ttl = ttl * 3600, negative_ttl * 3600
+        return cache
+    except Exception as e:
+        logging.warning(f"Serial cache {path} unavailable, querying Prime directly: {e}")
+        return None
+
+
+def preload(lookup: Optional[pd.DataFrame] = None, serials: Iterable = ()) -> None:
+    """
+    Replaces the preloaded results with a bulk_select() result (None just clears
+    them). 'serials' are the keys that were resolved; those missing from lookup
+    are remembered as not found.
+    """
+    _preloaded.clear()
+    for serial in serials:
+        _preloaded[str(serial).strip()] = None
+    if lookup is not None:
+        for serial, part, lot in lookup.itertuples():
+            _preloaded[str(serial).strip()] = (part, lot)
+
+
+def unique_serials(serials: Iterable) -> List:
+    """Distinct, non-empty serials in first-seen order (original values are kept)."""
+    seen = set()
+    result = []
+    for serial in serials:
+        if serial is None or (isinstance(serial, float) and pd.isna(serial)):
+            continue
+        if not str(serial).strip() or serial in seen:
+            continue
+        seen.add(serial)
+        result.append(serial)
+    return result
+
+
+def connect():
+    """
+    Opens the configured lookup backend and returns (conn, cursor) like SQL.connSQL():
+    the pyodbc objects for odbc, the backend object twice otherwise, (None, None)
+    when it cannot be opened.
+    """
+    if _settings["backend"] == "odbc":
+        return SQL.connSQL()
+    try:
+        backend = Lookup_Backend.open_backend(_settings["backend"], _settings["backend_path"])
+    except Exception as e:
+        logging.error(f"Lookup backend {_settings['backend']} unavailable: {e}")
+        return None, None
+    return backend, backend
+
+
+def disconnect(conn, cursor) -> None:
+    """Counterpart of connect()."""
+    if isinstance(cursor, Lookup_Backend.LookupBackend):
+        cursor.close()
+    else:
+        SQL.disconnSQL(conn, cursor)
+
+
+class RunConnection:
+    """
+    Lookup connection owned by one script run. get() opens it on first use and
+    pings it before handing it out again; a dead connection, or an ini that
+    selects another backend, is replaced. close() (or the with block) ends it.
+    """
+
+    def __init__(self):
+        self.conn = None
+        self.cursor = None
+        self._key = None
+        self.connects = 0
+        self.reuses = 0
+        self.failures = 0
+        self.connect_seconds = 0.0
+
+    def __enter__(self) -> "RunConnection":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def get(self):
+        """(conn, cursor) like connect(); (None, None) when the connection cannot be opened."""
+        key = (_settings["backend"], _settings["backend_path"])
+        if self.cursor is not None:
+            if key == self._key and _as_backend(self.cursor).ping():
+                self.reuses += 1
+                return self.conn, self.cursor
+            if key == self._key:
+                logging.warning("Lookup connection failed the health check, reconnecting")
+            self.close()
+        t0 = time.perf_counter()
+        conn, cursor = connect()
+        self.connect_seconds += time.perf_counter() - t0
+        if conn is None:
+            self.failures += 1
+            return None, None
+        self.conn, self.cursor, self._key = conn, cursor, key
+        self.connects += 1
+        return conn, cursor
+
+    def close(self) -> None:
+        if self.cursor is not None:
+            try:
+                disconnect(self.conn, self.cursor)
+            except Exception as e:
+                logging.warning(f"Closing the lookup connection failed: {e}")
+        self.conn = self.cursor = None
+
+    def summary(self) -> str:
+        return (f"Prime connection: {self.connects} connect(s) in {self.connect_seconds:.2f}s, "
+                f"{self.reuses} reuse(s), {self.failures} failure(s)")
+
+
+def _as_backend(cursor) -> Lookup_Backend.LookupBackend:
+    """A cursor from SQL.connSQL() is wrapped in the ODBC backend."""
+    if isinstance(cursor, Lookup_Backend.LookupBackend):
+        return cursor
+    return Lookup_Backend.OdbcBackend(cursor, bulk_sql=_settings["bulk_sql"])
+
+
+def bulk_select(cursor, serials: Iterable) -> pd.DataFrame:
+    """
+    Resolves every distinct serial once. Returns a DataFrame indexed by the serial
+    (as it appears in the input) with Part_Number and LotNumber_9 as returned by
+    Prime (either may be None); serials Prime does not know are left out.
+    """
+    serials = unique_serials(serials)
+    keys = [str(s).strip() for s in serials]
+    chunk_size, cache = _settings["chunk_size"], _settings["cache"]
+    backend = _as_backend(cursor)
+    bulk = True
+    found = {}
+    queries = 0
+    distinct = list(dict.fromkeys(keys))
+
+    preloaded = {k: _preloaded[k] for k in distinct if k in _preloaded}
+    found.update(preloaded)
+    distinct = [k for k in distinct if k not in preloaded]
+
+    cached = {}
+    if cache is not None and distinct:
+        try:
+            cached = cache.get_many(distinct)
+        except Exception as e:
+            logging.warning(f"Serial cache read failed: {e}")
+        found.update(cached)
+        distinct = [k for k in distinct if k not in cached]
+
+    if distinct:
+        try:
+            for start in range(0, len(distinct), chunk_size):
+                found.update(backend.select_many(distinct[start:start + chunk_size]))
+                queries += 1
+        except NotImplementedError:  # no bulk query configured or derived
+            bulk = False
+        except Exception as e:
+            logging.error(f"Bulk Prime lookup failed, falling back to per-serial queries: {e}")
+            found = {**preloaded, **cached}
+            bulk = False
+
+    if not bulk:
+        for serial, key in zip(serials, keys):
+            if key not in found:
+                found[key] = backend.select_one(serial)
+                queries += 1
+
+    if cache is not None and distinct:
+        try:
+            cache.put_many({k: found.get(k) for k in distinct})
+        except Exception as e:
+            logging.warning(f"Serial cache write failed: {e}")
+
+    rows = [(s, *found[k]) for s, k in zip(serials, keys)
+            if k in found and found[k] and (found[k][0] or found[k][1])]
+    lookup = pd.DataFrame(rows, columns=["Serial_Number", "Part_Number", "LotNumber_9"]).set_index("Serial_Number")
+    logging.info(f"Prime lookup: {len(serials)} unique serials, {len(preloaded)} prefetched, "
+                 f"{len(cached)} from cache, {queries} queries, {len(lookup)} found")
+    if cache is not None:
+        cache.log_stats()
+    return lookup
+
+
+def enrich(df: pd.DataFrame, serial_col, lookup: pd.DataFrame, require_both: bool = True,
+           part_col: str = "Part_Number", lot_col: str = "Nine_Serial_Number") -> List:
+    """
+    Writes Part_Number / LotNumber_9 of a bulk_select() result into df[part_col] /
+    df[lot_col] for every row, in place. With require_both only serials that have
+    both values are written (other rows keep what they had); otherwise every
+    serial gets what Prime returned (NaN when unknown). Returns the serials
+    without a complete result, in first-seen order.
+    """
+    if require_both and not lookup.empty:
+        present = lookup[["Part_Number", "LotNumber_9"]].notna() & lookup[["Part_Number", "LotNumber_9"]].astype(bool)
+        lookup = lookup[present.all(axis=1)]
+    serials = df[serial_col]
+    distinct = unique_serials(serials)
+    rows = serials.isin(lookup.index) if require_both else serials.isin(distinct)
+    df.loc[rows, part_col] = serials[rows].map(lookup["Part_Number"])
+    df.loc[rows, lot_col] = serials[rows].map(lookup["LotNumber_9"])
+    return [s for s in distinct if s not in lookup.index]
+
+
+def report_unmatched(report_path: str, serials: Iterable, operation: str = "", source: str = "") -> None:
+    """Appends one row per unresolved serial to the CSV side report."""
+    serials = list(serials)
+    if not serials or not report_path:
+        return
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(report_path)), exist_ok=True)
+        new_file = not os.path.exists(report_path)
+        stamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with open(report_path, "a", newline="", encoding="utf-8-sig" if new_file else "utf-8") as f:
+            writer = csv.writer(f)
+            if new_file:
+                writer.writerow(["Time", "Operation", "Source", "Serial_Number"])
+            writer.writerows([stamp, operation, source, serial] for serial in serials)
+    except OSError as e:
+        logging.warning(f"Could not write unmatched serial report {report_path}: {e}")
+
+
+def select(cursor, serial) -> Tuple[Optional[str], Optional[str]]:
+    """Drop-in for SQL.selectSQL(cursor, serial) that goes through the serial cache."""
+    cache = _settings["cache"]
+    key = str(serial).strip()
+    if key in _preloaded:
+        return _preloaded[key] or (None, None)
+    if cache is not None and key:
+        try:
+            cached = cache.get_many([key])
+            if key in cached:
+                return cached[key] or (None, None)
+        except Exception as e:
+            logging.warning(f"Serial cache read failed: {e}")
+    result = _as_backend(cursor).select_one(serial)
+    if cache is not None and key:
+        try:
+            cache.put_many({key: result})
+        except Exception as e:
+            logging.warning(f"Serial cache write failed: {e}")
+    return result
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Version: 1.0.0
+Last Modified: 2026-10-16
+
+Description:
+On-disk serial -> (Part_Number, LotNumber_9) cache shared by all operations
+(SQLite, ../DataFile/Serial_Cache.sqlite by default). The same wafer/bar serials
+pass through many operations, so after the first lookup the others are served
+from here and Prime is only queried for serials that are really new.
+
+  - positive entries expire after ttl_hours
+  - serials Prime does not know are cached as negative entries and expire after
+    negative_ttl_hours, so they are retried later but not on every cycle
+  - WAL journal + busy timeout, so parallel operations (Main.py) can share the file
+
+Prime_Lookup.bulk_select uses the cache automatically when it is configured
+([Database] serial_cache = true, the default).
+
+Usage:
+    cache = Serial_Cache.SerialCache('../DataFile/Serial_Cache.sqlite')
+    cached = cache.get_many(['A123', 'B456'])   # {serial: (part, lot) or None (negative)}
+    cache.put_many({'C789': ('PN', 'LOT9'), 'D000': None})
+    cache.log_stats()
+"""
+
+import os
+import time
+import sqlite3
+import logging
+from typing import Dict, Iterable, Optional, Tuple
+
+DEFAULT_PATH = "../DataFile/Serial_Cache.sqlite"
+DEFAULT_TTL_HOURS = 24 * 7
+DEFAULT_NEGATIVE_TTL_HOURS = 6
+_IN_CHUNK = 500  # SQLite allows 999 parameters per statement on old builds
+
+Entry = Optional[Tuple[Optional[str], Optional[str]]]
+
+
+class SerialCache:
+    """SQLite backed serial cache; one instance per process is enough."""
+
+    def __init__(self, path: str = DEFAULT_PATH, ttl_hours: float = DEFAULT_TTL_HOURS,
+                 negative_ttl_hours: float = DEFAULT_NEGATIVE_TTL_HOURS):
+        self.path = path
+        self.ttl = ttl_hours * 3600
+        self.negative_ttl = negative_ttl_hours * 3600
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS serial_cache ("
+            " serial TEXT PRIMARY KEY, part_number TEXT, lot_9 TEXT,"
+            " found INTEGER NOT NULL, fetched REAL NOT NULL)")
+        self._conn.commit()
+
+    def get_many(self, serials: Iterable[str]) -> Dict[str, Entry]:
+        """
+        Fresh entries for the given serials: (part, lot) for known serials, None for a
+        cached 'not in Prime'. Serials without a fresh entry are not in the result.
+        """
+        keys = list(dict.fromkeys(str(s).strip() for s in serials))
+        now = time.time()
+        result: Dict[str, Entry] = {}
+        for start in range(0, len(keys), _IN_CHUNK):
+            chunk = keys[start:start + _IN_CHUNK]
+            rows = self._conn.execute(
+                f"SELECT serial, part_number, lot_9, found, fetched FROM serial_cache "
+                f"WHERE serial IN ({','.join('?' * len(chunk))})", chunk).fetchall()
+            for serial, part, lot, found, fetched in rows:
+                if found and now - fetched <= self.ttl:
+                    result[serial] = (part, lot)
+                elif not found and now - fetched <= self.negative_ttl:
+                    result[serial] = None
+        negatives = sum(1 for v in result.values() if v is None)
+        self.hits += len(result) - negatives
+        self.negative_hits += negatives
+        self.misses += len(keys) - len(result)
+        return result
+
+    def put_many(self, entries: Dict[str, Entry]) -> None:
+        """Stores lookup results; None marks a serial Prime does not know."""
+        now = time.time()
+        rows = []
+        for serial, value in entries.items():
+            part, lot = value if value else (None, None)
+            found = 1 if (part or lot) else 0
+            rows.append((str(serial).strip(), None if part is None else str(part),
+                         None if lot is None else str(lot), found, now))
+        if not rows:
+            return
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO serial_cache (serial, part_number, lot_9, found, fetched) "
+                "VALUES (?, ?, ?, ?, ?)", rows)
+
+    def purge_expired(self) -> int:
+        """Deletes entries past their TTL; returns the number of rows removed."""
+        now = time.time()
+        with self._conn:
+            cur = self._conn.execute(
+                "DELETE FROM serial_cache WHERE (found = 1 AND fetched < ?) OR (found = 0 AND fetched < ?)",
+                (now - self.ttl, now - self.negative_ttl))
+        return cur.rowcount
+
+    def log_stats(self) -> None:
+        logging.info(f"Serial cache: {self.hits} hit(s), {self.negative_hits} negative hit(s), "
+                     f"{self.misses} miss(es)")
+
+    def close(self) -> None:
+        self._conn.close()
@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Version: 1.0.0
+Last Modified: 2026-10-16
+
+Description:
+Row level diff of a hand-edited workbook against its previous snapshot, so a run
+outputs the inserted and the corrected rows instead of the whole Running_date
+window (048 TAK_SPUT, 049 TAK_PLX C, 050 TAK_MESA).
+
+The snapshot of every (scope, source workbook) is kept in one SQLite file
+(../DataFile/Snapshot_Diff.sqlite by default): per row its key (the key columns,
+'#n' appended for the n-th repeat of a key), a hash of the compared values and the
+values themselves, so the change log can show what was corrected.
+
+compare() classifies the rows of the new snapshot:
+
+  - inserted : key not in the previous snapshot
+  - changed  : key found, values differ
+  - deleted  : key only in the previous snapshot (change log only; complete=True)
+
+and returns the inserted and changed rows. A partial read (tail of a sheet) is
+compared with complete=False: missing keys are not deleted and the snapshot is
+merged instead of replaced.
+
+commit() stores the new snapshots and appends the change log (CSV: Time, Scope,
+Source, Key, Change, Column, Old, New; the first snapshot of a source is not
+logged row by row). It is called after the outputs were published, so an
+interrupted run compares against the same snapshot again.
+With force (--force-emit) the unchanged rows are returned as inserted, so the
+caller outputs its whole window again.
+
+Usage:
+    diff = Snapshot_Diff.SnapshotDiff(scope=os.path.basename(config_path), change_log='./Change_Log.csv')
+    inserted, changed = diff.compare(os.path.basename(excel_file), df, key_columns=["key_start_date_time",
+                                     "key_serial_number"])
+    ... output inserted rows of the window + changed rows, publish ...
+    diff.commit()
+"""
+
+import os
+import csv
+import json
+import sqlite3
+import hashlib
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+DEFAULT_PATH = "../DataFile/Snapshot_Diff.sqlite"
+LOG_COLUMNS = ["Time", "Scope", "Source", "Key", "Change", "Column", "Old", "New"]
+_SEPARATOR = "\x1f"
+
+
+def _text(value) -> str:
+    """
+    Cell value as compared / logged text; empty cells (None, NaN, NaT) are ''. A
+    whole float is written as int, so 5 and 5.0 (the column turned float because
+    another cell got a decimal) compare equal.
+    """
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+class SnapshotDiff:
+    """Previous snapshots of the sources of one scope and the diff against them."""
+
+    def __init__(self, path: str = DEFAULT_PATH, scope: str = "", change_log: Optional[str] = None,
+                 force: bool = False):
+        self.path = path
+        self.scope = scope
+        self.change_log = change_log
+        self.force = force
+        # source -> (complete, {key: (hash, values json)}) / change log lines, written by commit()
+        self._pending: Dict[str, Tuple[bool, Dict[str, Tuple[bytes, str]]]] = {}
+        self._log: List[List[str]] = []
+        self.counts = {"inserted": 0, "changed": 0, "deleted": 0, "unchanged": 0}
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS snapshot_row ("
+            " scope TEXT NOT NULL, source TEXT NOT NULL, row_key TEXT NOT NULL,"
+            " row_hash BLOB NOT NULL, row_values TEXT NOT NULL, updated TEXT,"
+            " PRIMARY KEY (scope, source, row_key)) WITHOUT ROWID")
+        self._conn.commit()
+
+    def _previous(self, source: str) -> Dict[str, Tuple[bytes, str]]:
+        rows = self._conn.execute(
+            "SELECT row_key, row_hash, row_values FROM snapshot_row WHERE scope = ? AND source = ?",
+            (self.scope, source)).fetchall()
+        return {key: (row_hash, values) for key, row_hash, values in rows}
+
+    def has_snapshot(self, source: str) -> bool:
+        """True when a snapshot of source is stored, i.e. its inserted rows are really new rows."""
+        return self._conn.execute("SELECT 1 FROM snapshot_row WHERE scope = ? AND source = ? LIMIT 1",
+                                  (self.scope, source)).fetchone() is not None
+
+    @staticmethod
+    def _keys(df: pd.DataFrame, key_columns: List) -> List[str]:
+        seen: Dict[str, int] = {}
+        keys = []
+        for values in zip(*(df[c] for c in key_columns)) if key_columns else ([] for _ in range(len(df))):
+            key = _SEPARATOR.join(_text(v) for v in values)
+            seen[key] = seen.get(key, 0) + 1
+            keys.append(key if seen[key] == 1 else f"{key}#{seen[key]}")
+        return keys
+
+    def compare(self, source: str, df: pd.DataFrame, key_columns: Iterable, value_columns: Optional[Iterable] = None,
+                ignore_columns: Iterable = (), complete: bool = True) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Diff of df (the new snapshot of source) against the previous one; returns
+        (inserted rows, changed rows) of df. value_columns (default: all but
+        ignore_columns) are compared and kept in the snapshot.
+        """
+        key_columns = list(key_columns)
+        ignore = set(ignore_columns)
+        columns = [c for c in (df.columns if value_columns is None else value_columns) if c not in ignore]
+        previous = self._previous(source)
+        current: Dict[str, Tuple[bytes, str]] = {}
+        inserted, changed, forced = [], [], 0
+        keys = self._keys(df, key_columns)
+        texts = {str(c): [_text(v) for v in df[c]] for c in columns}
+        for position, key in enumerate(keys):
+            values = {column: cells[position] for column, cells in texts.items()}
+            dumped = json.dumps(values, ensure_ascii=False, sort_keys=True)
+            row_hash = hashlib.sha1(dumped.encode("utf-8")).digest()
+            current[key] = (row_hash, dumped)
+            old = previous.get(key)
+            if old is None:
+                inserted.append(position)
+                if previous:  # the first snapshot of a source is not logged row by row
+                    self._log.append([source, key, "inserted", "", "", ""])
+            elif old[0] == row_hash:
+                if self.force:
+                    inserted.append(position)
+                    forced += 1
+            else:
+                changed.append(position)
+                old_values = json.loads(old[1])
+                for column in sorted(set(values) | set(old_values)):
+                    if values.get(column, "") != old_values.get(column, ""):
+                        self._log.append([source, key, "changed", column, old_values.get(column, ""),
+                                          values.get(column, "")])
+        deleted = [key for key in previous if key not in current] if complete else []
+        for key in deleted:
+            self._log.append([source, key, "deleted", "", "", ""])
+
+        unchanged = len(keys) - len(inserted) - len(changed) + forced
+        for name, count in (("inserted", len(inserted) - forced), ("changed", len(changed)),
+                            ("deleted", len(deleted)), ("unchanged", unchanged)):
+            self.counts[name] += count
+        if source in self._pending and not complete:
+            self._pending[source][1].update(current)
+        else:
+            self._pending[source] = (complete, current)
+        logging.info(f"Snapshot diff {source}: {len(inserted) - forced} inserted, {len(changed)} changed, "
+                     f"{len(deleted)} deleted, {unchanged} unchanged")
+        return df.iloc[inserted], df.iloc[changed]
+
+    def commit(self) -> int:
+        """Stores the compared snapshots and appends the change log; returns the number of sources."""
+        if not self._pending:
+            return 0
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._conn:
+            for source, (complete, rows) in self._pending.items():
+                if complete:
+                    self._conn.execute("DELETE FROM snapshot_row WHERE scope = ? AND source = ?",
+                                       (self.scope, source))
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO snapshot_row (scope, source, row_key, row_hash, row_values, updated)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    [(self.scope, source, key, row_hash, values, now) for key, (row_hash, values) in rows.items()])
+        if self.change_log and self._log:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.change_log)), exist_ok=True)
+                new_file = not os.path.exists(self.change_log)
+                with open(self.change_log, "a", newline="", encoding="utf-8-sig") as f:
+                    writer = csv.writer(f)
+                    if new_file:
+                        writer.writerow(LOG_COLUMNS)
+                    writer.writerows([now, self.scope, source, key.replace(_SEPARATOR, " | ")] + rest
+                                     for source, key, *rest in self._log)
+            except OSError as e:
+                logging.error(f"Snapshot diff: change log {self.change_log} not written: {e}")
+        count = len(self._pending)
+        self._pending, self._log = {}, []
+        return count
+
+    def rollback(self, source: Optional[str] = None) -> None:
+        """
+        Drops the compared snapshots, or only the one of source (its outputs were not
+        written); the next run compares against the stored ones again.
+        """
+        if source is None:
+            self._pending, self._log = {}, []
+            return
+        self._pending.pop(source, None)
+        self._log = [line for line in self._log if line[0] != source]
+
+    def summary(self) -> str:
+        return (f"Snapshot diff {self.scope}: {self.counts['inserted']} inserted, {self.counts['changed']} changed, "
+                f"{self.counts['deleted']} deleted, {self.counts['unchanged']} unchanged row(s)")
+
+    def close(self) -> None:
+        if self._pending:
+            logging.warning(f"Snapshot diff: {len(self._pending)} snapshot(s) not committed, discarded")
+            self._pending, self._log = {}, []
+        self._conn.close()
+
+    def __enter__(self) -> "SnapshotDiff":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        # commit() is explicit (after the outputs were published); anything else is discarded
+        self.close()
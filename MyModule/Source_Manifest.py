@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Version: 1.0.0
+Last Modified: 2026-10-16
+
+Description:
+Persistent manifest of source workbooks (path, size, mtime, content hash) used to
+skip the copy + parse of a source file that has not changed since the last
+successful run.
+
+  - size + mtime identical  -> unchanged (no I/O on the source)
+  - size or mtime differs   -> the content hash decides; a re-saved but identical
+                               file only refreshes the stored size/mtime
+  - force refresh           -> every file is reported as changed
+
+Entries are only written by record(), which the caller invokes after the file was
+processed successfully, so a failed run is retried on the next cycle.
+
+Usage:
+    manifest = Source_Manifest.SourceManifest('./Source_Manifest.json', scope=ini_file,
+                                              force_refresh=Source_Manifest.force_refresh_requested(config))
+    if manifest.is_unchanged(file):
+        continue
+    ... copy / parse ...
+    manifest.record(file, local_copy=copied, stat=copier.source_stat(copied))
+    manifest.save()
+"""
+
+import os
+import sys
+import json
+import hashlib
+import logging
+from datetime import datetime
+from typing import Dict, Optional
+
+FORCE_REFRESH_ARG = "--force-refresh"
+
+
+def force_refresh_requested(config=None) -> bool:
+    """True when '--force-refresh' is on the command line or [Options] force_refresh = true."""
+    if FORCE_REFRESH_ARG in sys.argv:
+        return True
+    if config is not None and config.has_option("Options", "force_refresh"):
+        try:
+            return config.getboolean("Options", "force_refresh")
+        except ValueError:
+            return False
+    return False
+
+
+def file_hash(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-1 of the file content, read in chunks."""
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class SourceManifest:
+    """JSON backed manifest; one instance per ini / operation scope."""
+
+    def __init__(self, manifest_path: str, scope: str = "", force_refresh: bool = False):
+        self.manifest_path = manifest_path
+        self.scope = scope
+        self.force_refresh = force_refresh
+        self._entries: Dict[str, dict] = {}
+        self._hash_cache: Dict[str, str] = {}  # path|size|mtime -> hash, for this run
+        self._dirty = False
+        if os.path.exists(manifest_path):
+            try:
+                with open(manifest_path, "r", encoding="utf-8") as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError) as e:
+                logging.warning(f"Source manifest {manifest_path} unreadable, starting empty: {e}")
+                self._entries = {}
+
+    def _key(self, path: str) -> str:
+        return f"{self.scope}|{os.path.normcase(os.path.abspath(path))}"
+
+    def _hash(self, path: str) -> str:
+        st = os.stat(path)
+        key = f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime}"
+        if key not in self._hash_cache:
+            self._hash_cache[key] = file_hash(path)
+        return self._hash_cache[key]
+
+    def is_unchanged(self, path: str) -> bool:
+        """True when the file matches the last recorded state and no refresh is forced."""
+        if self.force_refresh:
+            return False
+        entry = self._entries.get(self._key(path))
+        if entry is None:
+            return False
+        try:
+            st = os.stat(path)
+        except OSError as e:
+            logging.error(f"Cannot stat source file {path}: {e}")
+            return False
+        if st.st_size == entry.get("size") and st.st_mtime == entry.get("mtime"):
+            logging.info(f"Source unchanged (size/mtime), skipped: {path}")
+            return True
+        if st.st_size == entry.get("size") and self._hash(path) == entry.get("sha1"):
+            entry["mtime"] = st.st_mtime
+            self._dirty = True
+            logging.info(f"Source unchanged (content hash), skipped: {path}")
+            return True
+        return False
+
+    def record(self, path: str, local_copy: Optional[str] = None,
+               stat: Optional[os.stat_result] = None) -> None:
+        """
+        Stores the size/mtime/hash of a successfully processed file.
+        When local_copy is given the hash is taken from it, so the (network) source
+        is not read a second time; stat should then be the source's stat from when
+        the copy was made (Copy_Stage.source_stat()), so a file edited during the run
+        is not stored with its new size/mtime and the old content's hash.
+        """
+        st = stat or os.stat(path)
+        cached = self._hash_cache.get(f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime}")
+        if cached is not None:
+            digest = cached
+        elif local_copy:
+            digest = file_hash(local_copy)
+        else:
+            digest = self._hash(path)
+        self._entries[self._key(path)] = {
+            "path": path,
+            "size": st.st_size,
+            "mtime": st.st_mtime,
+            "sha1": digest,
+            "recorded": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        self._dirty = True
+
+    def forget(self, path: str) -> None:
+        if self._entries.pop(self._key(path), None) is not None:
+            self._dirty = True
+
+    def save(self) -> None:
+        """Writes the manifest atomically (temp file + replace)."""
+        if not self._dirty:
+            return
+        folder = os.path.dirname(os.path.abspath(self.manifest_path))
+        os.makedirs(folder, exist_ok=True)
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.manifest_path)
+        self._dirty = False
@@ -0,0 +1,257 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Version: 1.0.0
+Last Modified: 2026-10-16
+
+Description:
+Incremental state of the operations in one SQLite file (../DataFile/State_Store.sqlite
+by default), replacing the *_StartRow.txt running records and Incremental_State.json.
+For every (operation, source file, sheet) it keeps
+
+  - last_row     : last consumed sheet row (or column for transposed sheets)
+  - last_time    : newest measurement time that was output
+  - content_hash : SHA-1 of the source when it was last processed
+  - detail       : reader specific data (Incremental_Reader watermark fingerprint)
+  - run_id       : the run that wrote the entry
+
+update() only collects changes in memory; commit() writes all of them in one
+transaction. The scripts call commit() after their outputs were published, so an
+interrupted or failed run leaves the previous state and its work is redone.
+
+The old records are imported once per file (import_running_rec / import_watermarks):
+a date becomes last_time, a row number last_row and a list of file paths one entry
+per file, stored under source '' / sheet '' as the operation wide default.
+
+WAL journal + busy timeout, so parallel operations (Main.py) can share the file.
+
+Usage:
+    with State_Store.StateStore() as store:
+        store.import_running_rec(operation, running_rec)        # old *_StartRow.txt, once
+        if store.is_processed(operation, source, sheet, digest):
+            ...skip...
+        since = store.last_time(operation, source, sheet, default_days=30)
+        ... rows newer than since -> outputs ...
+        store.update(operation, source, sheet, last_row=n, last_time=t, content_hash=digest)
+        ... publish outputs ...
+        store.commit()
+"""
+
+import os
+import json
+import sqlite3
+import logging
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+DEFAULT_PATH = "../DataFile/State_Store.sqlite"
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+# Time formats found in the old running records and the sheets
+_PARSE_FORMATS = (TIME_FORMAT, "%Y-%m-%d %H:%M:%S.%f", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%dT%H.%M.%S",
+                  "%Y/%m/%d %H:%M:%S", "%Y-%m-%d %H.%M.%S", "%Y-%m-%d", "%Y/%m/%d")
+
+Key = Tuple[str, str, str]
+
+
+def as_time(value) -> Optional[datetime]:
+    """datetime / pandas Timestamp / date / text in one of the sheet formats -> datetime."""
+    if value is None or value != value:  # None / NaN / NaT
+        return None
+    if isinstance(value, datetime):
+        return value.to_pydatetime() if hasattr(value, "to_pydatetime") else value
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    text = str(value).strip()
+    for fmt in _PARSE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+class StateStore:
+    """SQLite backed incremental state; one instance per process / run."""
+
+    def __init__(self, path: str = DEFAULT_PATH, run_id: Optional[str] = None):
+        self.path = path
+        self.run_id = run_id or f"{datetime.now():%Y%m%dT%H%M%S}-{os.getpid()}"
+        self._pending: Dict[Key, dict] = {}
+        self.committed = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS source_state ("
+            " operation TEXT NOT NULL, source TEXT NOT NULL, sheet TEXT NOT NULL,"
+            " last_row INTEGER, last_time TEXT, content_hash TEXT, detail TEXT,"
+            " run_id TEXT, updated TEXT,"
+            " PRIMARY KEY (operation, source, sheet))")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS legacy_import ("
+            " path TEXT PRIMARY KEY, operation TEXT, imported TEXT)")
+        self._conn.commit()
+
+    # ---- reading (committed state only) ----
+    def get(self, operation: str, source: str = "", sheet: str = "") -> Optional[dict]:
+        row = self._conn.execute(
+            "SELECT * FROM source_state WHERE operation = ? AND source = ? AND sheet = ?",
+            (operation, source, sheet)).fetchone()
+        if row is None:
+            return None
+        entry = dict(row)
+        entry["detail"] = json.loads(entry["detail"]) if entry["detail"] else None
+        return entry
+
+    def last_time(self, operation: str, source: str = "", sheet: str = "",
+                  default_days: int = 30) -> datetime:
+        """
+        Newest output time of (operation, source, sheet); for a source without an entry
+        the newest time of the operation, otherwise today - default_days.
+        """
+        entry = self.get(operation, source, sheet)
+        value = entry["last_time"] if entry else None
+        if value is None:
+            value = self._conn.execute(
+                "SELECT MAX(last_time) FROM source_state WHERE operation = ?", (operation,)).fetchone()[0]
+        return as_time(value) or datetime.today() - timedelta(days=default_days)
+
+    def is_processed(self, operation: str, source: str, sheet: str, content_hash: str) -> bool:
+        """True when the source was processed with exactly this content."""
+        entry = self.get(operation, source, sheet)
+        return bool(entry and content_hash and entry["content_hash"] == content_hash)
+
+    # ---- writing ----
+    def update(self, operation: str, source: str = "", sheet: str = "", **fields) -> None:
+        """
+        Records a change (last_row, last_time, content_hash, detail); it is written by
+        commit(). Fields not given keep their stored value, so does a last_time that is
+        empty or not a time (no dated row in the output).
+        """
+        unknown = set(fields) - {"last_row", "last_time", "content_hash", "detail"}
+        if unknown:
+            raise TypeError(f"unknown state field(s): {', '.join(sorted(unknown))}")
+        if "last_time" in fields:
+            parsed = as_time(fields.pop("last_time"))
+            if parsed is not None:
+                fields["last_time"] = parsed.strftime(TIME_FORMAT)
+        self._pending.setdefault((operation, str(source), str(sheet)), {}).update(fields)
+
+    def commit(self) -> int:
+        """Writes all updates since the last commit in one transaction; returns their number."""
+        if not self._pending:
+            return 0
+        now = datetime.now().strftime(TIME_FORMAT)
+        with self._conn:
+            for (operation, source, sheet), fields in self._pending.items():
+                entry = self.get(operation, source, sheet) or {}
+                entry.update(fields)
+                detail = entry.get("detail")
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO source_state (operation, source, sheet, last_row, last_time,"
+                    " content_hash, detail, run_id, updated) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (operation, source, sheet, entry.get("last_row"), entry.get("last_time"),
+                     entry.get("content_hash"), json.dumps(detail, ensure_ascii=False) if detail else None,
+                     self.run_id, now))
+        count = len(self._pending)
+        self.committed += count
+        self._pending = {}
+        return count
+
+    def rollback(self) -> None:
+        """Drops the updates since the last commit."""
+        self._pending = {}
+
+    def forget(self, operation: str, source: str = "", sheet: str = "") -> None:
+        """Deletes the entry at once (the next read of the source starts over)."""
+        self._pending.pop((operation, source, sheet), None)
+        with self._conn:
+            self._conn.execute("DELETE FROM source_state WHERE operation = ? AND source = ? AND sheet = ?",
+                               (operation, source, sheet))
+
+    def backup(self, path: str) -> None:
+        """Consistent copy of the database (sqlite3 online backup)."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        target = sqlite3.connect(path)
+        try:
+            self._conn.backup(target)
+        finally:
+            target.close()
+
+    # ---- one-time import of the old records ----
+    def _import_once(self, path: str, operation: str, rows) -> int:
+        key = os.path.abspath(path)
+        if self._conn.execute("SELECT 1 FROM legacy_import WHERE path = ?", (key,)).fetchone():
+            return 0
+        now = datetime.now().strftime(TIME_FORMAT)
+        with self._conn:
+            cur = self._conn.executemany(
+                "INSERT OR IGNORE INTO source_state (operation, source, sheet, last_row, last_time,"
+                " content_hash, detail, run_id, updated) VALUES (?, ?, ?, ?, ?, NULL, ?, 'import', ?)",
+                [row + (now,) for row in rows])
+            self._conn.execute("INSERT INTO legacy_import (path, operation, imported) VALUES (?, ?, ?)",
+                               (key, operation, now))
+        count = max(cur.rowcount, 0)
+        if count:
+            logging.info(f"State store: imported {count} entr{'y' if count == 1 else 'ies'} from {path}")
+        return count
+
+    def import_running_rec(self, operation: str, path: Optional[str]) -> int:
+        """
+        Imports an old running record once: a date, a row number or a list of processed
+        file paths (Banchi-IV). Missing or empty files are only marked as imported.
+        """
+        if not path:
+            return 0
+        lines = []
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    lines = [line.strip() for line in f if line.strip()]
+            except (OSError, UnicodeDecodeError) as e:
+                logging.warning(f"State store: running record {path} unreadable, not imported: {e}")
+                return 0
+        rows = []
+        if len(lines) == 1 and lines[0].isdigit():
+            rows.append((operation, "", "", int(lines[0]), None, None))
+        elif len(lines) == 1 and as_time(lines[0]) is not None:
+            rows.append((operation, "", "", None, as_time(lines[0]).strftime(TIME_FORMAT), None))
+        else:
+            rows.extend((operation, line, "", None, None, None) for line in dict.fromkeys(lines))
+        return self._import_once(path, operation, rows)
+
+    def import_watermarks(self, path: Optional[str]) -> int:
+        """Imports an Incremental_State.json ('scope|workbook|sheet' -> watermark) once."""
+        if not path or not os.path.exists(path):
+            return 0
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"State store: {path} unreadable, not imported: {e}")
+            return 0
+        rows = []
+        for key, watermark in state.items():
+            scope, source, sheet = key.split("|", 2)
+            rows.append((scope, source, sheet, watermark.get("last_row"), None,
+                         json.dumps(watermark, ensure_ascii=False)))
+        return self._import_once(path, "", rows)
+
+    # ---- misc ----
+    def summary(self) -> str:
+        return (f"State store: {self.committed} entr{'y' if self.committed == 1 else 'ies'} committed, "
+                f"{len(self._pending)} not committed, run {self.run_id}")
+
+    def close(self) -> None:
+        if self._pending:
+            logging.warning(f"State store: {len(self._pending)} update(s) not committed, discarded")
+            self._pending = {}
+        self._conn.close()
+
+    def __enter__(self) -> "StateStore":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        # commit() is explicit (after the outputs were published); anything else is discarded
+        self.close()
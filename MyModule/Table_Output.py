@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Version: 1.0.0
+Last Modified: 2026-10-16
+
+Description:
+Table output for the per-row operations (Banchi-IV, LD-SPUT, EA-WG, Scriber ...).
+Instead of one XML per measurement row, the rows of a source file are collected
+and written as one CSV plus a single pointer XML (Data DataType="Table" -> CSV),
+the same form 051, 048, 049 C, 050 and Facet_Common upload.
+
+[Basic_info] output_mode of the operation ini selects the form:
+
+  - xml : one XML file per row (default for the per-row operations)
+  - csv : one table CSV per source file + its pointer XML ([Paths] CSV_path)
+
+CSV columns follow the other table uploads: Serial_Number, Part_Number,
+Start_Date_Time, Operation, TestStation, Site, then the measurement items with
+the names of their XML Data elements, STARTTIME_SORTED, SORTNUMBER.
+
+Usage:
+    table = Table_Output.from_config(config, site, product_family, operation, test_station,
+                                     stage=xml_pool.stage)   # None: output_mode = xml
+    table.add({"Serial_Number": sn, "Part_Number": pn, ..., "Current": 1.5})
+    csv_file, xml_file = table.write()      # None when no rows were added
+"""
+
+import os
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+import Xml_Writer
+
+OUTPUT_MODES = ("xml", "csv")
+LEADING_COLUMNS = ["Serial_Number", "Part_Number", "Start_Date_Time", "Operation", "TestStation", "Site"]
+TRAILING_COLUMNS = ["STARTTIME_SORTED", "SORTNUMBER"]
+
+
+def output_mode(config, default: str = "xml") -> str:
+    """[Basic_info] output_mode, 'xml' or 'csv'; unknown values fall back to default."""
+    mode = config.get("Basic_info", "output_mode", fallback=default).strip().lower() or default
+    if mode not in OUTPUT_MODES:
+        logging.warning(f"Unknown output_mode '{mode}', expected one of {', '.join(OUTPUT_MODES)}; using '{default}'")
+        return default
+    return mode
+
+
+def from_config(config, site: str, product_family: str, operation: str, test_station: str,
+                stage=None) -> Optional["TableOutput"]:
+    """TableOutput for output_mode = csv, None for one XML per row."""
+    if output_mode(config) != "csv":
+        return None
+    csv_dir = config.get("Paths", "CSV_path", fallback="").strip()
+    if not csv_dir:
+        logging.error("output_mode = csv needs [Paths] CSV_path; writing one XML per row instead")
+        return None
+    return TableOutput(csv_dir, config.get("Paths", "output_path"), site, product_family, operation,
+                       test_station, stage=stage)
+
+
+class TableOutput:
+    """Rows of one source file, written as <operation>_<time>.csv with its pointer XML."""
+
+    def __init__(self, csv_dir: str, xml_dir: str, site: str, product_family: str, operation: str,
+                 test_station: str, stage=None, table_name: Optional[str] = None):
+        self.csv_dir = csv_dir
+        self.xml_dir = xml_dir
+        self.site = site
+        self.product_family = product_family
+        self.operation = operation
+        self.test_station = test_station
+        self.stage = stage
+        self.table_name = table_name
+        self.rows: List[Dict[str, object]] = []
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def add(self, row: Dict[str, object]) -> None:
+        self.rows.append(row)
+
+    def _target(self, final: str, after: Optional[str] = None) -> str:
+        if self.stage is not None:
+            return self.stage.path(final, after=after)
+        os.makedirs(os.path.dirname(os.path.abspath(final)), exist_ok=True)
+        return final
+
+    def _columns(self) -> List[str]:
+        seen = dict.fromkeys(LEADING_COLUMNS)
+        for row in self.rows:
+            seen.update(dict.fromkeys(k for k in row if k not in TRAILING_COLUMNS))
+        seen.update(dict.fromkeys(TRAILING_COLUMNS))
+        present = {k for row in self.rows for k in row}
+        return [c for c in seen if c in present]
+
+    def write(self) -> Optional[Tuple[str, str]]:
+        """Writes the collected rows (then clears them); returns (csv path, xml path)."""
+        if not self.rows:
+            return None
+        now = datetime.now()
+        stamp = now.strftime("%Y_%m_%dT%H.%M.%S.%f")  # several source files can end in the same second
+        csv_file = os.path.join(self.csv_dir, f"{self.operation}_{stamp}.csv")
+        frame = pd.DataFrame(self.rows, columns=self._columns())
+        frame.to_csv(self._target(csv_file), index=False, encoding="utf-8-sig")
+
+        now_iso = now.strftime("%Y-%m-%dT%H:%M:%S")
+        serial_no = os.path.splitext(os.path.basename(csv_file))[0]
+        xml_file = os.path.join(self.xml_dir, (
+            f"Site={self.site},ProductFamily={self.product_family},Operation={self.operation},"
+            f"Partnumber=UNKNOWPN,Serialnumber={serial_no},Testdate={now_iso}").replace(":", ".") + ".xml")
+        header = {
+            "SerialNumber": serial_no, "PartNumber": "UNKNOWPN", "Operation": self.operation,
+            "TestStation": self.test_station, "Operator": "NA", "StartTime": now_iso,
+            "Site": self.site, "LotNumber": "",
+        }
+        Xml_Writer.write_file(self._target(xml_file, after=csv_file), Xml_Writer.pointer_document(
+            header, self.operation, csv_file, now_iso, table_name=self.table_name))
+        logging.info(f"Table output: {len(self.rows)} row(s) -> {csv_file}, pointer {xml_file}")
+        self.rows = []
+        return csv_file, xml_file
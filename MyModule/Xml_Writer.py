@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Version: 1.0.0
+Last Modified: 2026-10-16
+
+Description:
+Single-pass writer for the Results/Result/Header/TestStep XML the uploaders read.
+Lines are emitted while the document is described, with escaped attribute values
+and indentation, so there is no ElementTree build, tostring() and minidom
+re-parse/prettify (three passes) and no unescaped f-string templates.
+
+The output matches minidom.toprettyxml(indent=..., encoding="utf-8") for the same
+elements, so pointer XMLs keep their layout.
+
+  - pointer form : pointer_document(...)  (one TestStep, Data DataType="Table" -> CSV)
+  - per-row form : ResultsWriter with several test_step() calls, HeaderMisc,
+                   TestEquipment ...
+
+WriterPool writes finished documents from a few background threads, so the next
+rows are transformed while earlier files are still on their way to the XML share.
+
+Usage:
+    w = Xml_Writer.ResultsWriter(indent="    ")
+    w.result({"startDateTime": start, "Result": "Passed"})
+    w.header({"SerialNumber": sn, "PartNumber": pn, ...})
+    w.header_misc([{"Description": operation}])
+    w.test_step({"Name": operation, "startDateTime": start, "Status": "Passed"},
+                [{"DataType": "Numeric", "Name": "Current", "Units": "uA", "Value": 1.5}])
+    w.write(xml_path)
+
+    Xml_Writer.write_file(xml_path, Xml_Writer.pointer_document(header, operation, csv_path, now_iso))
+
+    with Xml_Writer.WriterPool(workers=4, max_pending=32) as pool:
+        pool.submit(xml_path, w.getvalue())   # blocks while 32 files are pending
+        ...
+        failures = pool.flush()                # barrier before the read position is saved
+    print(pool.summary())
+"""
+
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, Iterable, List, Optional, Tuple
+
+XML_DECLARATION = '<?xml version="1.0" encoding="utf-8"?>\n'
+XSI_NAMESPACES = {
+    "xmlns:xsi": "http://www.w3.org/2001/XMLSchema-instance",
+    "xmlns:xsd": "http://www.w3.org/2001/XMLSchema",
+}
+
+_ATTR_ESCAPES = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;"})
+
+Attrs = Optional[Dict[str, object]]
+
+
+def escape_attr(value) -> str:
+    """Attribute value as text; None becomes ''."""
+    return ("" if value is None else str(value)).translate(_ATTR_ESCAPES)
+
+
+def _attr_text(attrs: Attrs) -> str:
+    if not attrs:
+        return ""
+    return "".join(f' {name}="{escape_attr(value)}"' for name, value in attrs.items())
+
+
+class ResultsWriter:
+    """One <Results> document; elements are written in the order they are added."""
+
+    def __init__(self, indent: str = "  ", namespaces: bool = True, stream=None):
+        self.indent = indent
+        self._parts: List[str] = []
+        self._write = stream.write if stream is not None else self._parts.append
+        self._stack: List[str] = []
+        self._write(XML_DECLARATION)
+        self.start("Results", XSI_NAMESPACES if namespaces else None)
+
+    # ---- generic elements ----
+    def start(self, tag: str, attrs: Attrs = None) -> "ResultsWriter":
+        self._write(f"{self.indent * len(self._stack)}<{tag}{_attr_text(attrs)}>\n")
+        self._stack.append(tag)
+        return self
+
+    def leaf(self, tag: str, attrs: Attrs = None) -> "ResultsWriter":
+        self._write(f"{self.indent * len(self._stack)}<{tag}{_attr_text(attrs)}/>\n")
+        return self
+
+    def end(self) -> "ResultsWriter":
+        tag = self._stack.pop()
+        self._write(f"{self.indent * len(self._stack)}</{tag}>\n")
+        return self
+
+    def section(self, tag: str, attrs: Attrs, child_tag: str, children: Iterable[Attrs]) -> "ResultsWriter":
+        """<tag> with one <child_tag .../> per entry of children."""
+        self.start(tag, attrs)
+        for child in children:
+            self.leaf(child_tag, child)
+        return self.end()
+
+    # ---- Results vocabulary ----
+    def result(self, attrs: Attrs) -> "ResultsWriter":
+        """Opens <Result>; it is closed by close() / getvalue() / write()."""
+        return self.start("Result", attrs)
+
+    def header(self, attrs: Attrs) -> "ResultsWriter":
+        return self.leaf("Header", attrs)
+
+    def header_misc(self, items: Iterable[Attrs]) -> "ResultsWriter":
+        return self.section("HeaderMisc", None, "Item", items)
+
+    def test_step(self, attrs: Attrs, data: Iterable[Attrs]) -> "ResultsWriter":
+        return self.section("TestStep", attrs, "Data", data)
+
+    def test_equipment(self, items: Iterable[Attrs]) -> "ResultsWriter":
+        return self.section("TestEquipment", None, "Item", items)
+
+    # ---- output ----
+    def close(self) -> None:
+        while self._stack:
+            self.end()
+
+    def getvalue(self) -> bytes:
+        """The whole document as UTF-8 (only without a stream)."""
+        self.close()
+        return "".join(self._parts).encode("utf-8")
+
+    def write(self, path: str) -> str:
+        write_file(path, self.getvalue())
+        return path
+
+
+def pointer_document(header: Attrs, operation: str, csv_path, time_iso: str,
+                     result: str = "Passed", status: str = "Passed", table_name: Optional[str] = None,
+                     header_misc: Optional[Iterable[Attrs]] = None, namespaces: bool = True,
+                     indent: str = "  ") -> bytes:
+    """Pointer XML: one TestStep whose Data (DataType="Table") holds the CSV path."""
+    w = ResultsWriter(indent=indent, namespaces=namespaces)
+    w.result({"startDateTime": time_iso, "endDateTime": time_iso, "Result": result})
+    w.header(header)
+    if header_misc is not None:
+        w.header_misc(header_misc)
+    w.test_step({"Name": operation, "startDateTime": time_iso, "endDateTime": time_iso, "Status": status},
+                [{"DataType": "Table", "Name": table_name or f"tbl_{operation.upper()}",
+                  "Value": str(csv_path), "CompOperation": "LOG"}])
+    return w.getvalue()
+
+
+def write_file(path: str, content: bytes) -> None:
+    with open(path, "wb") as f:
+        f.write(content)
+
+
+class WriterPool:
+    """
+    Bounded background writer for finished documents.
+
+    submit() hands (path, content) to one of `workers` threads and returns at once;
+    when `max_pending` files are queued or being written it waits for a free slot
+    (backpressure, memory stays bounded). flush() is the barrier: it returns after
+    every submitted file is written, with the failures since the previous flush, so
+    state such as the next start row is only saved once the XMLs exist.
+    workers = 0 writes synchronously inside submit(). With an Output_Stage.OutputStage
+    the files are written to its staging folder and reach the share on stage.publish().
+    """
+
+    def __init__(self, workers: int = 4, max_pending: int = 32, stage=None):
+        self.workers = max(0, int(workers))
+        self.stage = stage
+        self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="xml-writer") if self.workers else None
+        self._slots = threading.BoundedSemaphore(max(1, int(max_pending)))
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._failures: List[Tuple[str, Exception]] = []
+        self.latencies: List[float] = []
+        self.failed = 0
+
+    def _write(self, path: str, content: bytes) -> None:
+        t0 = time.perf_counter()
+        try:
+            write_file(path, content)
+        except Exception as e:
+            with self._lock:
+                self._failures.append((path, e))
+                self.failed += 1
+            return
+        elapsed = time.perf_counter() - t0
+        with self._lock:
+            self.latencies.append(elapsed)
+
+    def _done(self, future) -> None:
+        with self._lock:
+            self._pending.discard(future)
+        self._slots.release()
+
+    def submit(self, path: str, content: bytes) -> None:
+        if self.stage is not None:
+            path = self.stage.path(path)
+        if self._executor is None:
+            self._write(path, content)
+            return
+        self._slots.acquire()
+        future = self._executor.submit(self._write, path, content)
+        with self._lock:
+            self._pending.add(future)
+        future.add_done_callback(self._done)
+
+    def flush(self) -> List[Tuple[str, Exception]]:
+        """Waits for all submitted files; returns (path, error) of the failed ones."""
+        with self._lock:
+            pending = list(self._pending)
+        wait(pending)
+        with self._lock:
+            failures, self._failures = self._failures, []
+        return failures
+
+    def close(self) -> List[Tuple[str, Exception]]:
+        failures = self.flush()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        return failures
+
+    def __enter__(self) -> "WriterPool":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def summary(self) -> str:
+        """Per-file write latency of the run."""
+        with self._lock:
+            times = sorted(self.latencies)
+            failed = self.failed
+        if not times:
+            return f"XML writes: 0 files, {failed} failed"
+        p50 = times[len(times) // 2] * 1000
+        p95 = times[min(len(times) - 1, int(len(times) * 0.95))] * 1000
+        return (f"XML writes: {len(times)} files, {failed} failed, {self.workers} writer thread(s), "
+                f"latency p50={p50:.1f}ms p95={p95:.1f}ms max={times[-1] * 1000:.1f}ms")
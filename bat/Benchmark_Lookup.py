@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: Prime lookup + enrichment (Prime_Lookup.bulk_select / enrich) against the
+local lookup backends, so the enrichment path can be profiled off-site.
+
+Writes a reproducible fixture (Lookup_Backend.write_fixture) as SQLite and CSV,
+builds a data frame with repeated serials and a share of unknown ones, and prints
+per backend: connect time, bulk lookup time, enrichment throughput (rows/s) and
+the latency of single-serial lookups (Prime_Lookup.select). The local backends
+must produce the same enrichment (odbc reads real Prime data, so it is not compared).
+
+Usage (from the bat folder):
+    python Benchmark_Lookup.py
+    python Benchmark_Lookup.py --serials 100000 --rows 200000 --miss-rate 0.05
+    python Benchmark_Lookup.py --backends sqlite,csv,odbc   # odbc needs Prime
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+from configparser import ConfigParser
+from datetime import datetime
+
+import pandas as pd
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.normpath(os.path.join(SCRIPT_DIR, "..", "MyModule")))
+
+import Lookup_Backend  # noqa: E402
+import Prime_Lookup  # noqa: E402
+
+
+def make_rows(serials, rows: int, miss_rate: float, seed: int) -> pd.DataFrame:
+    """Measurement rows: known serials with repeats plus unknown serials at miss_rate."""
+    rng = random.Random(seed)
+    data = []
+    for i in range(rows):
+        if rng.random() < miss_rate:
+            data.append(f"x{i % 10000:04d}")  # lower case: never a fixture serial
+        else:
+            data.append(rng.choice(serials))
+    return pd.DataFrame({"Serial_Number": data, "Value": range(rows)})
+
+
+def backend_config(kind: str, path: str, chunk_size: int) -> ConfigParser:
+    cfg = ConfigParser()
+    cfg.read_dict({"Database": {"lookup_backend": kind, "lookup_path": path or "",
+                                "bulk_chunk_size": str(chunk_size), "serial_cache": "false"}})
+    return cfg
+
+
+def run_backend(kind: str, path: str, frame: pd.DataFrame, args) -> dict:
+    Prime_Lookup.configure(backend_config(kind, path, args.chunk_size))
+    Prime_Lookup.preload()
+    result = {"backend": kind}
+
+    t0 = time.perf_counter()
+    conn, cursor = Prime_Lookup.connect()
+    result["connect_s"] = time.perf_counter() - t0
+    if conn is None:
+        raise ConnectionError(f"{kind} backend could not be opened")
+    try:
+        best_lookup, best_enrich = None, None
+        for _ in range(args.repeat):
+            df = frame.copy()
+            t0 = time.perf_counter()
+            lookup = Prime_Lookup.bulk_select(cursor, df["Serial_Number"])
+            t1 = time.perf_counter()
+            unmatched = Prime_Lookup.enrich(df, "Serial_Number", lookup)
+            t2 = time.perf_counter()
+            best_lookup = t1 - t0 if best_lookup is None else min(best_lookup, t1 - t0)
+            best_enrich = t2 - t1 if best_enrich is None else min(best_enrich, t2 - t1)
+        result.update(lookup_s=best_lookup, enrich_s=best_enrich, unmatched=len(unmatched), frame=df)
+
+        sample = frame["Serial_Number"].drop_duplicates().head(args.latency_samples).tolist()
+        latencies = []
+        for serial in sample:
+            t0 = time.perf_counter()
+            Prime_Lookup.select(cursor, serial)
+            latencies.append(time.perf_counter() - t0)
+        latencies = pd.Series(latencies) * 1000
+        result.update(p50_ms=latencies.quantile(0.5), p95_ms=latencies.quantile(0.95))
+    finally:
+        Prime_Lookup.disconnect(conn, cursor)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prime lookup / enrichment benchmark on local backends.")
+    parser.add_argument("--fixture-dir", default=os.path.join(SCRIPT_DIR, "..", "DataFile", "Lookup_Fixture"))
+    parser.add_argument("--serials", type=int, default=20000, help="serials in the fixture")
+    parser.add_argument("--rows", type=int, default=50000, help="measurement rows to enrich")
+    parser.add_argument("--miss-rate", type=float, default=0.02, help="share of rows with unknown serials")
+    parser.add_argument("--chunk-size", type=int, default=Prime_Lookup.DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--latency-samples", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--backends", default="sqlite,csv")
+    parser.add_argument("--regenerate", action="store_true", help="rewrite the fixture files")
+    args = parser.parse_args()
+
+    os.makedirs(args.fixture_dir, exist_ok=True)
+    paths = {"sqlite": os.path.join(args.fixture_dir, f"Prime_Fixture_{args.serials}.sqlite"),
+             "csv": os.path.join(args.fixture_dir, f"Prime_Fixture_{args.serials}.csv"),
+             "odbc": None}
+    serials = None
+    for kind in ("sqlite", "csv"):
+        if args.regenerate or not os.path.exists(paths[kind]):
+            serials = Lookup_Backend.write_fixture(paths[kind], args.serials, seed=args.seed)
+    if serials is None:
+        serials = pd.read_csv(paths["csv"], usecols=["Serial_Number"])["Serial_Number"].tolist()
+    frame = make_rows(serials, args.rows, args.miss_rate, args.seed)
+    print(f"Fixture: {args.serials} serials in {args.fixture_dir}")
+    print(f"Rows: {len(frame)}, unique serials: {frame['Serial_Number'].nunique()}, "
+          f"miss rate: {args.miss_rate:.1%}\n")
+
+    results = []
+    for kind in [k.strip().lower() for k in args.backends.split(",") if k.strip()]:
+        try:
+            results.append(run_backend(kind, paths.get(kind), frame, args))
+        except Exception as e:
+            print(f"{kind}: skipped ({e})")
+
+    print(f"{'Backend':<8}{'connect ms':>12}{'lookup ms':>12}{'enrich ms':>12}{'rows/s':>14}"
+          f"{'p50 ms':>10}{'p95 ms':>10}{'unmatched':>11}")
+    for r in results:
+        total = r["lookup_s"] + r["enrich_s"]
+        print(f"{r['backend']:<8}{r['connect_s'] * 1000:>12.1f}{r['lookup_s'] * 1000:>12.1f}"
+              f"{r['enrich_s'] * 1000:>12.1f}{len(frame) / total:>14,.0f}"
+              f"{r['p50_ms']:>10.3f}{r['p95_ms']:>10.3f}{r['unmatched']:>11}")
+    local = [r for r in results if r["backend"] != "odbc"]
+    for r in local[1:]:
+        assert r["frame"].equals(local[0]["frame"]), f"{r['backend']} enrichment differs"
+    if len(local) > 1:
+        print(f"\nEnrichment identical across {', '.join(r['backend'] for r in local)}.")
+    print(f"{datetime.now():%Y-%m-%d %H:%M:%S}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: XML generation throughput (documents/s) of the old ElementTree + minidom
+prettify path against the single-pass MyModule Xml_Writer, for both forms the
+operations write:
+
+  - pointer : Results/Result/Header/TestStep with one Data (DataType="Table") -> CSV
+  - per-row : Header, HeaderMisc, two TestSteps and TestEquipment (as Banchi-IV)
+
+The pointer documents must be byte-identical to the minidom output; the run stops
+with an AssertionError otherwise. Documents are built in memory by default; with
+--write they are also written to a temporary folder, to include the file I/O.
+
+Usage (from the bat folder):
+    python Benchmark_Xml.py
+    python Benchmark_Xml.py --docs 20000 --repeat 5 --write
+"""
+
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import xml.etree.ElementTree as ET
+from datetime import datetime, timedelta
+from xml.dom import minidom
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.normpath(os.path.join(SCRIPT_DIR, "..", "MyModule")))
+
+import Xml_Writer  # noqa: E402
+
+
+def make_rows(docs: int, seed: int) -> list:
+    """Field values shaped like a measurement row (serials, times, a few odd characters)."""
+    rng = random.Random(seed)
+    start = datetime(2026, 1, 1)
+    rows = []
+    for i in range(docs):
+        t = (start + timedelta(minutes=7 * i)).strftime("%Y-%m-%dT%H:%M:%S")
+        rows.append({
+            "serial": f"{rng.choice('ABCDEFGH')}{i % 10000:04d}",
+            "part": f"HL13B{i % 9}-BT2{i % 7}",
+            "lot_9": f"2{rng.randint(0, 6)}AK{i % 100000:05d}",
+            "operator": rng.choice(["0001", "0002", "A&B", ""]),
+            "time": t,
+            "banchi": f"B{rng.randint(1, 40)}",
+            "current": round(rng.uniform(0, 50), 3),
+            "voltage": round(rng.uniform(0, 3), 3),
+            "tool": rng.choice(["MOCVD-1", "MOCVD-2"]),
+            "csv": f"C:/Data/Output/PARTICLE_{i:06d}.csv",
+        })
+    return rows
+
+
+def pointer_header(row: dict) -> dict:
+    return {"SerialNumber": row["serial"], "PartNumber": row["part"], "Operation": "PARTICLE",
+            "TestStation": "PARTICLE", "Operator": row["operator"], "StartTime": row["time"],
+            "Site": "350", "LotNumber": row["serial"]}
+
+
+def pointer_minidom(row: dict) -> bytes:
+    """The ElementTree + tostring() + minidom.toprettyxml() path the operations used."""
+    results = ET.Element("Results", {"xmlns:xsi": "http://www.w3.org/2001/XMLSchema-instance",
+                                     "xmlns:xsd": "http://www.w3.org/2001/XMLSchema"})
+    result = ET.SubElement(results, "Result", startDateTime=row["time"], endDateTime=row["time"], Result="Passed")
+    ET.SubElement(result, "Header", pointer_header(row))
+    step = ET.SubElement(result, "TestStep", Name="PARTICLE", startDateTime=row["time"],
+                         endDateTime=row["time"], Status="Passed")
+    ET.SubElement(step, "Data", DataType="Table", Name="tbl_PARTICLE", Value=row["csv"], CompOperation="LOG")
+    return minidom.parseString(ET.tostring(results, "utf-8")).toprettyxml(indent="  ", encoding="utf-8")
+
+
+def pointer_writer(row: dict) -> bytes:
+    return Xml_Writer.pointer_document(pointer_header(row), "PARTICLE", row["csv"], row["time"])
+
+
+def per_row_minidom(row: dict) -> bytes:
+    results = ET.Element("Results", {"xmlns:xsi": "http://www.w3.org/2001/XMLSchema-instance",
+                                     "xmlns:xsd": "http://www.w3.org/2001/XMLSchema"})
+    result = ET.SubElement(results, "Result", startDateTime=row["time"], Result="Passed")
+    ET.SubElement(result, "Header", pointer_header(row))
+    misc = ET.SubElement(result, "HeaderMisc")
+    ET.SubElement(misc, "Item", Description="BANCHI-IV")
+    step = ET.SubElement(result, "TestStep", Name="BANCHI-IV", startDateTime=row["time"], Status="Passed")
+    ET.SubElement(step, "Data", DataType="String", Name="Banchi_ID", Value=row["banchi"])
+    ET.SubElement(step, "Data", DataType="Numeric", Name="Current", Units="uA", Value=str(row["current"]))
+    ET.SubElement(step, "Data", DataType="Numeric", Name="Voltage", Units="V", Value=str(row["voltage"]))
+    step = ET.SubElement(result, "TestStep", Name="SORTED_DATA", startDateTime=row["time"], Status="Passed")
+    ET.SubElement(step, "Data", DataType="String", Name="LotNumber_5", Value=row["serial"], CompOperation="LOG")
+    ET.SubElement(step, "Data", DataType="String", Name="LotNumber_9", Value=row["lot_9"], CompOperation="LOG")
+    equipment = ET.SubElement(result, "TestEquipment")
+    ET.SubElement(equipment, "Item", DeviceName="MOCVD", DeviceSerialNumber=row["tool"])
+    return minidom.parseString(ET.tostring(results, "utf-8")).toprettyxml(indent="    ", encoding="utf-8")
+
+
+def per_row_writer(row: dict) -> bytes:
+    w = Xml_Writer.ResultsWriter(indent="    ")
+    w.result({"startDateTime": row["time"], "Result": "Passed"})
+    w.header(pointer_header(row))
+    w.header_misc([{"Description": "BANCHI-IV"}])
+    w.test_step({"Name": "BANCHI-IV", "startDateTime": row["time"], "Status": "Passed"}, [
+        {"DataType": "String", "Name": "Banchi_ID", "Value": row["banchi"]},
+        {"DataType": "Numeric", "Name": "Current", "Units": "uA", "Value": row["current"]},
+        {"DataType": "Numeric", "Name": "Voltage", "Units": "V", "Value": row["voltage"]},
+    ])
+    w.test_step({"Name": "SORTED_DATA", "startDateTime": row["time"], "Status": "Passed"}, [
+        {"DataType": "String", "Name": "LotNumber_5", "Value": row["serial"], "CompOperation": "LOG"},
+        {"DataType": "String", "Name": "LotNumber_9", "Value": row["lot_9"], "CompOperation": "LOG"},
+    ])
+    w.test_equipment([{"DeviceName": "MOCVD", "DeviceSerialNumber": row["tool"]}])
+    return w.getvalue()
+
+
+def measure(build, rows: list, repeat: int, out_dir: str = None) -> float:
+    """Best documents/s over repeat runs."""
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for i, row in enumerate(rows):
+            content = build(row)
+            if out_dir:
+                Xml_Writer.write_file(os.path.join(out_dir, f"{i}.xml"), content)
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return len(rows) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="XML generation benchmark: ElementTree + minidom vs Xml_Writer.")
+    parser.add_argument("--docs", type=int, default=5000, help="documents per run")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--write", action="store_true", help="also write the documents to a temp folder")
+    args = parser.parse_args()
+
+    rows = make_rows(args.docs, args.seed)
+    for row in rows:
+        assert pointer_writer(row) == pointer_minidom(row), f"pointer XML differs for {row['serial']}"
+        assert per_row_writer(row) == per_row_minidom(row), f"per-row XML differs for {row['serial']}"
+    print(f"Documents: {len(rows)}, output identical to minidom for both forms.\n")
+
+    out_dir = tempfile.mkdtemp(prefix="xml_bench_") if args.write else None
+    try:
+        print(f"{'Form':<10}{'minidom docs/s':>16}{'Xml_Writer docs/s':>20}{'speed-up':>10}")
+        for form, old, new in (("pointer", pointer_minidom, pointer_writer),
+                               ("per-row", per_row_minidom, per_row_writer)):
+            old_rate = measure(old, rows, args.repeat, out_dir)
+            new_rate = measure(new, rows, args.repeat, out_dir)
+            print(f"{form:<10}{old_rate:>16,.0f}{new_rate:>20,.0f}{new_rate / old_rate:>9.1f}x")
+    finally:
+        if out_dir:
+            shutil.rmtree(out_dir, ignore_errors=True)
+    print(f"{datetime.now():%Y-%m-%d %H:%M:%S}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+@echo off
+
+if not "%1" == "1" (
+    start /min cmd /c call "%~f0" 1
+    exit
+)
+
+cd /d %~dp0
+
+python Daemon.py
+
+pause
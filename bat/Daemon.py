@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Version: 1.0.0
+Last Modified: 2026-10-16
+
+Description:
+Resident service mode for the operation scripts. Instead of starting a fresh
+interpreter per script (re-importing pandas / numpy / openpyxl / xlrd every time),
+this process imports them once and calls each operation's entry function
+(e.g. 051_Particle.main, Facet_Common.main, 050_TAK_MESA.run_process_from_ini)
+in-process on the schedule defined in Daemon_Jobs.ini.
+
+Each job run is isolated:
+  - the working directory is switched to the job's directory (scripts rely on
+    relative paths such as ../MyModule, ../Log, ./*.ini),
+  - root logging handlers installed by the job are closed and removed afterwards,
+    so the next job's setup_logging/basicConfig takes effect,
+  - stdout/stderr are captured to ../Log/<date>/Daemon/<job>.log.
+Because the working directory is process-wide, jobs run one at a time.
+
+A job module is loaded once and kept warm; it is re-loaded automatically when
+the script file changes on disk.
+
+With [Settings] prefetch = true every cycle starts with the prefetch phase of
+Prefetch.py: jobs that define 'prefetch' report their serials and these are
+resolved in one Prime lookup before the jobs run.
+
+Usage:
+    python Daemon.py            # run forever
+    python Daemon.py --once     # run every job once and exit
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+import traceback
+import contextlib
+import importlib.util
+from datetime import datetime, timedelta
+from configparser import ConfigParser
+from typing import List, Optional, Tuple
+
+# Heavy imports are done once here so every job starts warm.
+import pandas as pd  # noqa: F401
+import numpy as np  # noqa: F401
+import openpyxl  # noqa: F401
+try:
+    import xlrd  # noqa: F401  (only needed by .xls readers)
+except ImportError:
+    pass
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+daemon_log = logging.getLogger("Daemon")
+daemon_log.propagate = False  # jobs reset the root logger; keep our own handler
+
+# ---------------------------------------------------------------------------
+# Job definition
+# ---------------------------------------------------------------------------
+
+class DaemonJob:
+    """One callable operation from Daemon_Jobs.ini."""
+    def __init__(self, name: str, work_dir: str, script: str, entry: str,
+                 args: List[str], interval: timedelta, prefetch: Optional[str] = None):
+        self.name = name
+        self.work_dir = work_dir
+        self.script = script
+        self.entry = entry
+        self.args = args
+        self.interval = interval
+        self.prefetch = prefetch
+        self.next_due = datetime.now()
+        self.module = None
+        self.module_mtime: Optional[float] = None
+
+    @property
+    def script_path(self) -> str:
+        return os.path.join(self.work_dir, self.script)
+
+
+def load_jobs(manifest_path: str) -> Tuple[ConfigParser, List[DaemonJob]]:
+    """
+    Reads Daemon_Jobs.ini; 'args' is a comma separated list passed to the entry,
+    'prefetch' names the function returning the serials for the prefetch phase.
+    """
+    cfg = ConfigParser()
+    cfg.optionxform = str
+    cfg.read(manifest_path, encoding="utf-8")
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    default_interval = cfg.getfloat("Settings", "interval_minutes", fallback=60)
+
+    jobs = []
+    for name in cfg.sections():
+        if name in ("Settings", "Database"):
+            continue
+        jobs.append(DaemonJob(
+            name=name,
+            work_dir=os.path.normpath(os.path.join(base_dir, cfg.get(name, "dir"))),
+            script=cfg.get(name, "script"),
+            entry=cfg.get(name, "entry", fallback="main"),
+            args=[a.strip() for a in cfg.get(name, "args", fallback="").split(",") if a.strip()],
+            interval=timedelta(minutes=cfg.getfloat(name, "interval_minutes", fallback=default_interval)),
+            prefetch=cfg.get(name, "prefetch", fallback=None) or None,
+        ))
+    return cfg, jobs
+
+# ---------------------------------------------------------------------------
+# Isolation helpers
+# ---------------------------------------------------------------------------
+
+def _reset_root_logging() -> None:
+    """Closes and removes every root handler so the next job starts clean."""
+    root = logging.getLogger()
+    for h in root.handlers[:]:
+        root.removeHandler(h)
+        try:
+            h.close()
+        except Exception:
+            pass
+
+
+@contextlib.contextmanager
+def job_context(job: DaemonJob, out_path: str):
+    """Runs the body inside the job's directory with captured output and clean logging."""
+    prev_cwd = os.getcwd()
+    prev_sys_path = list(sys.path)
+    _reset_root_logging()
+    with open(out_path, "a", encoding="utf-8", errors="replace") as out, \
+            contextlib.redirect_stdout(out), contextlib.redirect_stderr(out):
+        print(f"\n===== {datetime.now():%Y-%m-%d %H:%M:%S} {job.name} =====")
+        os.chdir(job.work_dir)
+        try:
+            yield
+        finally:
+            os.chdir(prev_cwd)
+            sys.path[:] = prev_sys_path  # scripts append ../MyModule on every import
+            _reset_root_logging()
+
+
+def load_module(job: DaemonJob):
+    """Imports the job script once; re-imports it when the file has changed."""
+    mtime = os.path.getmtime(job.script_path)
+    if job.module is not None and job.module_mtime == mtime:
+        return job.module
+    module_name = "daemon_job_" + "".join(c if c.isalnum() else "_" for c in job.name)
+    spec = importlib.util.spec_from_file_location(module_name, job.script_path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)  # top-level code runs inside job_context
+    job.module, job.module_mtime = module, mtime
+    daemon_log.info(f"Loaded {job.script_path}")
+    return module
+
+# ---------------------------------------------------------------------------
+# Run loop
+# ---------------------------------------------------------------------------
+
+def run_job(job: DaemonJob, out_dir: str) -> bool:
+    out_path = os.path.join(out_dir, job.name.replace("/", "_").replace("\\", "_") + ".log")
+    t0 = time.perf_counter()
+    ok = True
+    try:
+        with job_context(job, out_path):
+            try:
+                module = load_module(job)
+                getattr(module, job.entry)(*job.args)
+            except SystemExit as e:
+                ok = e.code in (None, 0)
+            except Exception:
+                ok = False
+                traceback.print_exc()
+    except Exception:
+        ok = False
+        daemon_log.error(f"Job '{job.name}' could not be started: {traceback.format_exc()}")
+    wall = time.perf_counter() - t0
+    daemon_log.info(f"{'OK    ' if ok else 'FAILED'} {job.name} wall={wall:.1f}s")
+    return ok
+
+
+def setup_daemon_logging(log_path: str) -> str:
+    log_folder = os.path.join(log_path, datetime.today().strftime("%Y-%m-%d"))
+    out_dir = os.path.join(log_folder, "Daemon")
+    os.makedirs(out_dir, exist_ok=True)
+    for h in daemon_log.handlers[:]:
+        daemon_log.removeHandler(h)
+        h.close()
+    handler = logging.FileHandler(os.path.join(log_folder, "Daemon.log"), encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+    daemon_log.addHandler(handler)
+    daemon_log.setLevel(logging.INFO)
+    return out_dir
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run operation scripts in one warm process.")
+    parser.add_argument("--manifest", default=os.path.join(SCRIPT_DIR, "Daemon_Jobs.ini"))
+    parser.add_argument("--once", action="store_true", help="run every job once and exit")
+    args = parser.parse_args()
+
+    cfg, jobs = load_jobs(args.manifest)
+    log_path = os.path.join(SCRIPT_DIR, cfg.get("Settings", "log_path", fallback="../Log/"))
+    poll_seconds = cfg.getfloat("Settings", "poll_seconds", fallback=30)
+    prefetch = cfg.getboolean("Settings", "prefetch", fallback=False)
+
+    # Make the shared modules importable once, independent of the job's cwd.
+    my_module = os.path.normpath(os.path.join(SCRIPT_DIR, "..", "MyModule"))
+    if my_module not in sys.path:
+        sys.path.append(my_module)
+
+    today = datetime.today().date()
+    out_dir = setup_daemon_logging(log_path)
+    daemon_log.info(f"===== Daemon start: {len(jobs)} jobs =====")
+    while True:
+        if today != datetime.today().date():  # roll the log folder at midnight
+            today = datetime.today().date()
+            out_dir = setup_daemon_logging(log_path)
+
+        due = [job for job in jobs if args.once or datetime.now() >= job.next_due]
+        if prefetch and due:
+            from Prefetch import run_prefetch
+            run_prefetch(cfg, due, out_dir)
+        for job in due:
+            run_job(job, out_dir)
+            job.next_due = datetime.now() + job.interval
+
+        if args.once:
+            break
+        next_due = min(j.next_due for j in jobs) if jobs else datetime.now() + timedelta(seconds=poll_seconds)
+        time.sleep(max(1.0, min(poll_seconds, (next_due - datetime.now()).total_seconds())))
+    daemon_log.info("===== Daemon end =====")
+
+
+if __name__ == "__main__":
+    main()
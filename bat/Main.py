@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Version: 1.0.0
+Last Modified: 2026-10-16
+
+Description:
+Parallel replacement for Main.bat. Reads the job manifest (Main_Jobs.ini), builds
+the dependency graph and runs independent operation scripts concurrently in a
+bounded pool of child processes. Ordering is only enforced where it matters:
+  - jobs sharing the same working directory run one after another (manifest order),
+  - jobs with an explicit 'after' list wait for those jobs ('*' = all jobs above).
+
+Each job's stdout/stderr is written to ../Log/<date>/Main/<job>.log and a run
+summary (wall time, exit status, critical path) is written next to it.
+
+The prefetch phase (Prefetch.py) is daemon-only: the Main_Jobs.ini jobs define no
+'prefetch' function, so Main.py does not run it.
+
+Usage:
+    python Main.py                      # run the whole manifest
+    python Main.py --max-workers 4      # override [Settings] max_workers
+    python Main.py --dry-run            # print the execution plan only
+"""
+
+import os
+import sys
+import csv
+import time
+import logging
+import argparse
+import subprocess
+from datetime import datetime
+from configparser import ConfigParser
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, List, Optional, Tuple
+
+# ---------------------------------------------------------------------------
+# Manifest
+# ---------------------------------------------------------------------------
+
+class Job:
+    """One entry of the job manifest."""
+    def __init__(self, name: str, work_dir: str, script: str, after: List[str]):
+        self.name = name
+        self.work_dir = work_dir
+        self.script = script
+        self.after = after
+        self.deps: List[str] = []
+        # Filled in after the run
+        self.start: Optional[float] = None
+        self.end: Optional[float] = None
+        self.exit_code: Optional[int] = None
+        self.status = "pending"
+
+    @property
+    def wall_time(self) -> float:
+        if self.start is None or self.end is None:
+            return 0.0
+        return self.end - self.start
+
+
+def load_manifest(manifest_path: str) -> Tuple[ConfigParser, Dict[str, Job]]:
+    """Reads the manifest and resolves the dependency list of every job."""
+    cfg = ConfigParser()
+    cfg.optionxform = str
+    cfg.read(manifest_path, encoding="utf-8")
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+
+    jobs: Dict[str, Job] = {}
+    last_job_in_dir: Dict[str, str] = {}
+    for name in cfg.sections():
+        if name in ("Settings", "Database"):
+            continue
+        work_dir = os.path.normpath(os.path.join(base_dir, cfg.get(name, "dir")))
+        script = cfg.get(name, "script")
+        after = [a.strip() for a in cfg.get(name, "after", fallback="").split(",") if a.strip()]
+        job = Job(name, work_dir, script, after)
+
+        deps: List[str] = []
+        for a in after:
+            if a == "*":
+                deps.extend(jobs.keys())
+            elif a in jobs:
+                deps.append(a)
+            else:
+                raise ValueError(f"Job '{name}' depends on unknown or later job '{a}'")
+        # Jobs in the same directory share running records, keep them serial
+        key = os.path.normcase(work_dir)
+        if key in last_job_in_dir:
+            deps.append(last_job_in_dir[key])
+        last_job_in_dir[key] = name
+
+        job.deps = list(dict.fromkeys(deps))
+        jobs[name] = job
+    return cfg, jobs
+
+# ---------------------------------------------------------------------------
+# Execution
+# ---------------------------------------------------------------------------
+
+def run_job(job: Job, python_exe: str, job_log_dir: str) -> Job:
+    """Runs one script in its own directory and records wall time / exit code."""
+    out_path = os.path.join(job_log_dir, job.name.replace("/", "_").replace("\\", "_") + ".log")
+    job.start = time.perf_counter()
+    try:
+        if not os.path.isdir(job.work_dir):
+            raise FileNotFoundError(f"Working directory not found: {job.work_dir}")
+        with open(out_path, "w", encoding="utf-8", errors="replace") as out:
+            proc = subprocess.run([python_exe, job.script], cwd=job.work_dir,
+                                  stdout=out, stderr=subprocess.STDOUT)
+        job.exit_code = proc.returncode
+        job.status = "ok" if proc.returncode == 0 else "failed"
+    except Exception as e:
+        logging.error(f"Job '{job.name}' could not be started: {e}")
+        job.exit_code = -1
+        job.status = "failed"
+    finally:
+        job.end = time.perf_counter()
+    return job
+
+
+def run_all(jobs: Dict[str, Job], max_workers: int, python_exe: str,
+            job_log_dir: str, skip_on_failure: bool) -> None:
+    """Schedules every job as soon as all of its dependencies have finished."""
+    remaining = dict(jobs)
+    running = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while remaining or running:
+            for name in list(remaining):
+                job = remaining[name]
+                if any(jobs[d].status in ("pending", "running") for d in job.deps):
+                    continue
+                del remaining[name]
+                if skip_on_failure and any(jobs[d].status in ("failed", "skipped") for d in job.deps):
+                    job.status = "skipped"
+                    logging.info(f"SKIP  {name} (dependency failed)")
+                    continue
+                job.status = "running"
+                logging.info(f"START {name}")
+                running[pool.submit(run_job, job, python_exe, job_log_dir)] = name
+
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                job = jobs[running.pop(fut)]
+                logging.info(f"END   {job.name} status={job.status} exit={job.exit_code} "
+                             f"wall={job.wall_time:.1f}s")
+                print(f"[{job.status:>7}] {job.wall_time:8.1f}s  {job.name}")
+
+# ---------------------------------------------------------------------------
+# Reporting
+# ---------------------------------------------------------------------------
+
+def critical_path(jobs: Dict[str, Job]) -> Tuple[float, List[str]]:
+    """Longest chain of dependent wall times, i.e. the lower bound of the cycle time."""
+    best: Dict[str, float] = {}
+    prev: Dict[str, Optional[str]] = {}
+    for name, job in jobs.items():  # manifest order is a topological order
+        dep = max(job.deps, key=lambda d: best[d], default=None)
+        best[name] = job.wall_time + (best[dep] if dep else 0.0)
+        prev[name] = dep
+    if not best:
+        return 0.0, []
+    tail = max(best, key=best.get)
+    chain = []
+    while tail:
+        chain.append(tail)
+        tail = prev[tail]
+    return best[chain[0]], list(reversed(chain))
+
+
+def write_summary(jobs: Dict[str, Job], summary_csv: str, t0: float) -> None:
+    with open(summary_csv, "w", newline="", encoding="utf-8-sig") as f:
+        w = csv.writer(f)
+        w.writerow(["Job", "Dir", "Script", "Status", "Exit_Code", "Start_s", "End_s", "Wall_s", "After"])
+        for job in jobs.values():
+            w.writerow([
+                job.name, job.work_dir, job.script, job.status, job.exit_code,
+                f"{job.start - t0:.1f}" if job.start else "",
+                f"{job.end - t0:.1f}" if job.end else "",
+                f"{job.wall_time:.1f}", ";".join(job.deps),
+            ])
+
+# ---------------------------------------------------------------------------
+# Main
+# ---------------------------------------------------------------------------
+
+def main() -> None:
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Run the operation scripts in parallel.")
+    parser.add_argument("--manifest", default=os.path.join(script_dir, "Main_Jobs.ini"))
+    parser.add_argument("--max-workers", type=int, default=None)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    cfg, jobs = load_manifest(args.manifest)
+    max_workers = args.max_workers or cfg.getint("Settings", "max_workers", fallback=4)
+    skip_on_failure = cfg.getboolean("Settings", "skip_on_failure", fallback=False)
+    python_exe = cfg.get("Settings", "python", fallback=sys.executable)
+    log_path = os.path.join(script_dir, cfg.get("Settings", "log_path", fallback="../Log/"))
+
+    if args.dry_run:
+        for job in jobs.values():
+            print(f"{job.name:<50} after: {', '.join(job.deps) or '-'}")
+        return
+
+    run_stamp = datetime.now().strftime("%H%M%S")
+    log_folder = os.path.join(log_path, datetime.today().strftime("%Y-%m-%d"))
+    job_log_dir = os.path.join(log_folder, "Main")
+    os.makedirs(job_log_dir, exist_ok=True)
+    logging.basicConfig(filename=os.path.join(log_folder, "Main.log"), level=logging.INFO,
+                        format="%(asctime)s - %(levelname)s - %(message)s")
+    logging.info(f"===== Main start: {len(jobs)} jobs, max_workers={max_workers} =====")
+
+    t0 = time.perf_counter()
+    run_all(jobs, max_workers, python_exe, job_log_dir, skip_on_failure)
+    total = time.perf_counter() - t0
+
+    summary_csv = os.path.join(log_folder, f"Main_Summary_{run_stamp}.csv")
+    write_summary(jobs, summary_csv, t0)
+    cp_time, cp_chain = critical_path(jobs)
+    failed = [j.name for j in jobs.values() if j.status != "ok"]
+
+    logging.info(f"Cycle wall time: {total:.1f}s, critical path: {cp_time:.1f}s")
+    logging.info(f"Critical path: {' -> '.join(cp_chain)}")
+    if failed:
+        logging.error(f"Failed/skipped jobs: {', '.join(failed)}")
+    logging.info("===== Main end =====")
+
+    print(f"\nCycle wall time : {total:.1f}s")
+    print(f"Critical path   : {cp_time:.1f}s  ({' -> '.join(cp_chain)})")
+    print(f"Failed/skipped  : {len(failed)}")
+    print(f"Summary         : {summary_csv}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Version: 1.0.0
+Last Modified: 2026-10-16
+
+Description:
+Prefetch phase of Daemon.py (daemon-only; Main.py does not run it). Before a cycle, every
+job that names a prefetch function in its manifest section ('prefetch = prefetch_serials')
+is asked for the serial numbers its next run will look up in Prime, without
+writing anything. The union is resolved once over a single connection
+(Prime_Lookup.bulk_select, chunked IN-list queries) and handed to the jobs:
+  - in-process (Daemon.py) through Prime_Lookup.preload(),
+  - to a standalone run through the shared Serial_Cache, which
+    bulk_select fills as a side effect.
+The operations' own enrichment step then finds every serial already resolved
+and does not query Prime again.
+
+The lookup settings (bulk_select_sql, serial_cache ...) are taken from the
+manifest's [Database] section, with the same keys as an operation ini.
+
+Usage:
+    python Prefetch.py                                 # Daemon_Jobs.ini
+    python Prefetch.py --manifest <other manifest>
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+import traceback
+from datetime import datetime
+from typing import List
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+MY_MODULE = os.path.normpath(os.path.join(SCRIPT_DIR, "..", "MyModule"))
+if MY_MODULE not in sys.path:
+    sys.path.append(MY_MODULE)
+
+from Daemon import DaemonJob, daemon_log, job_context, load_jobs, load_module  # noqa: E402
+
+
+def collect_serials(jobs: List[DaemonJob], out_dir: str) -> List[str]:
+    """Calls each job's prefetch function inside the job's context; returns the union."""
+    serials = {}
+    for job in jobs:
+        if not job.prefetch:
+            continue
+        out_path = os.path.join(out_dir, job.name.replace("/", "_").replace("\\", "_") + ".log")
+        t0 = time.perf_counter()
+        found: list = []
+        try:
+            with job_context(job, out_path):
+                try:
+                    module = load_module(job)
+                    found = list(getattr(module, job.prefetch)() or [])
+                except Exception:
+                    traceback.print_exc()
+        except Exception:
+            daemon_log.error(f"Prefetch of '{job.name}' could not be started: {traceback.format_exc()}")
+        for serial in found:
+            key = str(serial).strip()
+            if key and key.lower() != "nan":
+                serials[key] = None
+        daemon_log.info(f"Prefetch {job.name}: {len(found)} serial(s) in "
+                        f"{time.perf_counter() - t0:.1f}s")
+    return list(serials)
+
+
+def resolve(serials: List[str], cfg) -> int:
+    """One connection, one bulk lookup for all jobs; returns the number of serials found."""
+    import Prime_Lookup
+
+    Prime_Lookup.configure(cfg)
+    Prime_Lookup.preload()  # results of the previous cycle must not be reused
+    if not serials:
+        return 0
+    conn, cursor = Prime_Lookup.connect()
+    if conn is None:
+        daemon_log.error("Prefetch: Prime connection failed, jobs will look up their own serials")
+        return 0
+    try:
+        lookup = Prime_Lookup.bulk_select(cursor, serials)
+    finally:
+        Prime_Lookup.disconnect(conn, cursor)
+    Prime_Lookup.preload(lookup, serials)
+    return len(lookup)
+
+
+def run_prefetch(cfg, jobs: List[DaemonJob], out_dir: str) -> None:
+    """The whole prefetch phase; errors are logged, the cycle runs in any case."""
+    t0 = time.perf_counter()
+    try:
+        serials = collect_serials(jobs, out_dir)
+        t1 = time.perf_counter()
+        found = resolve(serials, cfg)
+        daemon_log.info(f"Prefetch: {len(serials)} unique serial(s), {found} found, "
+                        f"collect={t1 - t0:.1f}s lookup={time.perf_counter() - t1:.1f}s")
+    except Exception:
+        daemon_log.error(f"Prefetch failed: {traceback.format_exc()}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Resolve the serials of all jobs in one Prime lookup.")
+    parser.add_argument("--manifest", default=os.path.join(SCRIPT_DIR, "Daemon_Jobs.ini"))
+    args = parser.parse_args()
+
+    cfg, jobs = load_jobs(args.manifest)
+    log_path = os.path.join(SCRIPT_DIR, cfg.get("Settings", "log_path", fallback="../Log/"))
+    log_folder = os.path.join(log_path, datetime.today().strftime("%Y-%m-%d"))
+    out_dir = os.path.join(log_folder, "Prefetch")
+    os.makedirs(out_dir, exist_ok=True)
+    handler = logging.FileHandler(os.path.join(log_folder, "Prefetch.log"), encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+    daemon_log.addHandler(handler)
+    daemon_log.setLevel(logging.INFO)
+    run_prefetch(cfg, jobs, out_dir)
+
+
+if __name__ == "__main__":
+    main()